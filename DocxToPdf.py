@@ -1,18 +1,312 @@
-from docx2pdf import convert  # Import the docx2pdf library to convert Word documents to PDF
-import os  # Import os module for folder operations
+"""
+DocxToPdf.py
+------------
+Converts the Word documents in a folder ('docs' by default) to PDFs ('final').
 
-# Input folder containing DOCX files
-input_folder = "docs"
+The default backend runs headless LibreOffice, so it works on Linux build hosts
+without Microsoft Word. Documents are split into batches and handed to a pool of
+soffice workers; each worker has its own user profile (so instances never hand
+files to each other or fight over a profile lock) and converts a whole batch per
+start, so the office startup cost is paid once per batch, not once per file.
 
-# Output folder where converted PDFs will be saved
-output_folder = "final"
+- PDFs newer than their .docx are skipped (pass --force to convert everything).
+- A batch that hangs is killed after --timeout seconds per file; files it did not
+  convert are retried one at a time (--retries) before being reported as failed.
+- --backend docx2pdf uses Microsoft Word through docx2pdf (Windows/macOS) instead.
+- The input can also be a .zip/.tar written by main.py or monograph.py --archive.
+  Both backends need files on disk, so its documents are unpacked into a temporary
+  folder (keeping their times, so up-to-date PDFs are still skipped).
 
-# Create the output folder if it doesn't exist
-os.makedirs(output_folder, exist_ok=True)
+    python DocxToPdf.py
+    python DocxToPdf.py docs final --workers 4 --timeout 120
+"""
+import argparse
+import glob
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from queue import Empty, Queue
 
-# Convert all DOCX files in the input folder to PDF
-# This will maintain the same file names but with .pdf extension
-convert(input_folder, output_folder)
+from docarchive import extract_documents, is_archive
 
-# Print a confirmation message after conversion
-print(f"✅ All Word files converted to PDF in '{output_folder}'")
\ No newline at end of file
+# Where LibreOffice is usually installed when soffice is not on PATH
+SOFFICE_CANDIDATES = (
+    "soffice",
+    "libreoffice",
+    "/usr/lib/libreoffice/program/soffice",
+    "/opt/libreoffice/program/soffice",
+    "/Applications/LibreOffice.app/Contents/MacOS/soffice",
+    r"C:\Program Files\LibreOffice\program\soffice.exe",
+)
+
+BACKENDS = ("auto", "libreoffice", "docx2pdf")
+
+
+def find_soffice():
+    """
+    Return the path of the LibreOffice executable ($SOFFICE_PATH first), or None.
+    """
+    for candidate in (os.environ.get("SOFFICE_PATH"),) + SOFFICE_CANDIDATES:
+        if not candidate:
+            continue
+        path = shutil.which(candidate) or (candidate if os.path.isfile(candidate) else None)
+        if path:
+            return path
+    return None
+
+
+def resolve_backend(backend="auto"):
+    """
+    Return the backend that will do the conversion, 'libreoffice' or 'docx2pdf'.
+    'auto' picks LibreOffice if installed, else docx2pdf if it can be imported.
+    Raises RuntimeError with what to install when the backend is not available.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid backend '{backend}'. Use one of: {', '.join(BACKENDS)}.")
+    if backend in ("auto", "libreoffice") and find_soffice():
+        return "libreoffice"
+    if backend == "libreoffice":
+        raise RuntimeError("LibreOffice (soffice) not found. Install it or set SOFFICE_PATH.")
+    from importlib.util import find_spec
+
+    if find_spec("docx2pdf") is not None:
+        return "docx2pdf"
+    if backend == "docx2pdf":
+        raise RuntimeError("docx2pdf is not installed (pip install docx2pdf; it also needs Microsoft Word).")
+    raise RuntimeError("No PDF converter found. Install LibreOffice or set SOFFICE_PATH "
+                       "(or, with Microsoft Word, pip install docx2pdf).")
+
+
+def pdf_path_for(docx_path, output_folder):
+    return os.path.join(output_folder, os.path.splitext(os.path.basename(docx_path))[0] + ".pdf")
+
+
+def is_up_to_date(docx_path, pdf_path):
+    """
+    True if pdf_path exists and is newer than docx_path.
+    """
+    return os.path.exists(pdf_path) and os.path.getmtime(pdf_path) >= os.path.getmtime(docx_path)
+
+
+def pending_files(input_folder, output_folder, force=False):
+    """
+    Return (files to convert, number skipped as up to date) for a folder of .docx files.
+    Word lock files (~$name.docx) are ignored.
+    """
+    files = sorted(
+        f for f in glob.glob(os.path.join(input_folder, "*.docx"))
+        if not os.path.basename(f).startswith("~$")
+    )
+    todo = [f for f in files if force or not is_up_to_date(f, pdf_path_for(f, output_folder))]
+    return todo, len(files) - len(todo)
+
+
+class SofficeWorker(object):
+    """
+    One headless LibreOffice instance slot with a private user profile.
+    """
+
+    def __init__(self, soffice, output_folder, timeout):
+        self.soffice = soffice
+        self.output_folder = output_folder
+        self.timeout = timeout
+        self.profile_dir = tempfile.mkdtemp(prefix="docxtopdf-profile-")
+
+    def convert(self, files):
+        """
+        Convert files in one soffice run. Returns the files that produced no
+        up-to-date PDF (all of them if the run timed out).
+        """
+        cmd = [
+            self.soffice,
+            "--headless", "--invisible", "--norestore", "--nologo", "--nolockcheck",
+            "-env:UserInstallation=" + Path(self.profile_dir).as_uri(),
+            "--convert-to", "pdf", "--outdir", self.output_folder,
+        ] + list(files)
+        # Own process group, so a hung soffice.bin is killed along with its launcher
+        popen_kwargs = {"start_new_session": True} if os.name == "posix" else {}
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, **popen_kwargs)
+        try:
+            proc.communicate(timeout=self.timeout * len(files))
+        except subprocess.TimeoutExpired:
+            self._kill(proc)
+        return [f for f in files if not is_up_to_date(f, pdf_path_for(f, self.output_folder))]
+
+    @staticmethod
+    def _kill(proc):
+        if os.name == "posix":
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        else:
+            proc.kill()
+        proc.communicate()
+
+    def close(self):
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+def convert_with_libreoffice(files, output_folder, workers=2, batch_size=10, timeout=120,
+                             retries=1, soffice=None):
+    """
+    Convert .docx files to PDFs in output_folder using a pool of headless LibreOffice workers.
+
+    Parameters:
+    - files (list): Paths of the .docx files to convert.
+    - output_folder (str): Folder for the PDFs (same base names).
+    - workers (int): Number of soffice instances running at once.
+    - batch_size (int): Files converted per soffice start.
+    - timeout (float): Seconds allowed per file before a run is killed.
+    - retries (int): Extra single-file attempts for files a batch did not convert.
+    - soffice (str): LibreOffice executable (default: find_soffice()).
+
+    Returns:
+    - list: Files that could not be converted.
+    """
+    soffice = soffice or find_soffice()
+    if not soffice:
+        raise RuntimeError("LibreOffice (soffice) not found. Install it or set SOFFICE_PATH.")
+
+    jobs = Queue()
+    for i in range(0, len(files), batch_size):
+        jobs.put((files[i:i + batch_size], 0))
+    failed = []
+    lock = threading.Lock()
+
+    def run_worker():
+        worker = SofficeWorker(soffice, output_folder, timeout)
+        try:
+            while True:
+                try:
+                    batch, attempt = jobs.get_nowait()
+                except Empty:
+                    return
+                left = worker.convert(batch)
+                with lock:
+                    for f in batch:
+                        if f not in left:
+                            print(f"Converted {f}")
+                    for f in left:
+                        # Retry leftovers one by one so a single bad file cannot sink a batch
+                        if attempt < retries:
+                            jobs.put(([f], attempt + 1))
+                        else:
+                            failed.append(f)
+                            print(f"❌ Failed to convert {f}")
+        finally:
+            worker.close()
+
+    threads = [threading.Thread(target=run_worker) for _ in range(max(1, min(workers, jobs.qsize())))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sorted(failed)
+
+
+def convert_with_docx2pdf(files, output_folder):
+    """
+    Convert .docx files with Microsoft Word through docx2pdf. Returns the files that failed.
+    """
+    from docx2pdf import convert  # Needs Word; only imported for this backend
+
+    failed = []
+    for f in files:
+        try:
+            convert(f, pdf_path_for(f, output_folder))
+            print(f"Converted {f}")
+        except Exception as e:
+            failed.append(f)
+            print(f"❌ Failed to convert {f}: {e}")
+    return failed
+
+
+def convert_files(files, output_folder="final", workers=2, backend="auto", batch_size=10,
+                  timeout=120, retries=1):
+    """
+    Convert the given .docx files to PDFs in output_folder (e.g. a main.py --book
+    document). Returns the files that failed. Raises RuntimeError when no converter
+    is available (see resolve_backend).
+    """
+    backend = resolve_backend(backend)
+
+    # Create the output folder if it doesn't exist
+    os.makedirs(output_folder, exist_ok=True)
+
+    if backend == "libreoffice":
+        return convert_with_libreoffice(files, output_folder, workers, batch_size, timeout, retries)
+    return convert_with_docx2pdf(files, output_folder)
+
+
+def convert_folder(input_folder="docs", output_folder="final", workers=2, backend="auto",
+                   force=False, batch_size=10, timeout=120, retries=1):
+    """
+    Convert every out-of-date .docx in input_folder to a PDF in output_folder.
+    input_folder can be an archive written with --archive (see docarchive.py).
+    Returns (converted, skipped, failed files).
+    """
+    backend = resolve_backend(backend)
+    if is_archive(input_folder):
+        with tempfile.TemporaryDirectory(prefix="docxtopdf-archive-") as folder:
+            extract_documents(input_folder, folder)
+            converted, skipped, failed = convert_folder(folder, output_folder, workers, backend, force,
+                                                        batch_size, timeout, retries)
+        # Report failures by archive member, not by the deleted temporary file
+        return converted, skipped, [f"{input_folder}:{os.path.basename(f)}" for f in failed]
+    files, skipped = pending_files(input_folder, output_folder, force)
+    if not files:
+        os.makedirs(output_folder, exist_ok=True)
+        return 0, skipped, []
+
+    failed = convert_files(files, output_folder, workers, backend, batch_size, timeout, retries)
+    return len(files) - len(failed), skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the Word documents in a folder to PDF.")
+    parser.add_argument("input_folder", nargs="?", default="docs",
+                        help="Folder with .docx files, or a .zip/.tar written with --archive (default: docs)")
+    parser.add_argument("output_folder", nargs="?", default="final", help="Folder for the PDFs (default: final)")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="LibreOffice instances running at once (default: CPU count, at most 4)")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto",
+                        help="'libreoffice', 'docx2pdf' (Microsoft Word) or 'auto' (LibreOffice if installed)")
+    parser.add_argument("--batch-size", type=int, default=10, help="Files converted per LibreOffice start")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds allowed per file before a hung run is killed")
+    parser.add_argument("--retries", type=int, default=1, help="Single-file retries for files that failed in a batch")
+    parser.add_argument("--force", action="store_true", help="Convert even if the PDF is newer than the .docx")
+    args = parser.parse_args()
+
+    if not (os.path.isdir(args.input_folder)
+            or (is_archive(args.input_folder) and os.path.isfile(args.input_folder))):
+        print(f"Error: {args.input_folder} is not a valid folder or archive")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    try:
+        converted, skipped, failed = convert_folder(
+            args.input_folder, args.output_folder, args.workers, args.backend,
+            args.force, args.batch_size, args.timeout, args.retries,
+        )
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    # Print a confirmation message after conversion
+    print(f"✅ Word files converted to PDF in '{args.output_folder}': {converted} converted, "
+          f"{skipped} up to date, {len(failed)} failed ({time.perf_counter() - start:.1f}s)")
+    for f in failed:
+        print(f"  {f}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+"""
+benchmark.py
+------------
+Benchmarks for every stage of the pipeline, on synthetic CSV files.
+
+Stages:
+- qr        : generate_jignasa_qr for each URL
+- fill      : main.py's row rendering (QR code + Word template) and writing the .docx
+- monograph : monograph.py's template fill for each row
+- combine   : combinedocx.py on the generated monographs
+- convert   : DocxToPdf.py on the generated monographs (skipped without LibreOffice)
+- startup   : cold start of qrtool.py commands (--help, and rendering one QR code);
+              besides the wall time, the time spent importing the project and its
+              dependencies is measured with `python -X importtime`, and a --help run
+              importing for longer than --startup-target-ms counts as a failure
+
+Each stage runs in a fresh process per case (row count x short/long URLs or
+with/without images), so timings include nothing from other stages and the peak
+RSS is the stage's own. For every case the wall time, throughput, p50/p95 latency
+per item and peak RSS are reported and written to a JSON file, which can be
+compared against a stored baseline:
+
+    python benchmark.py --sizes 1,100 --output bench.json
+    python benchmark.py --baseline bench.json --max-slowdown 15 --max-rss-growth 25
+
+The exit status is 1 if any case regressed beyond the thresholds.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import random
+import shutil
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("qr", "fill", "monograph", "combine", "convert", "startup")
+URL_VARIANTS = ("short-urls", "long-urls")
+IMAGE_VARIANTS = ("with-images", "without-images")
+RESULTS_VERSION = 1
+STAGE_TIMEOUT_S = 3600.0
+
+# qrtool.py arguments timed by the startup stage; --help runs are held to the target
+STARTUP_COMMANDS = {
+    "help": ["--help"],
+    "qr-help": ["qr", "--help"],
+    "batch-help": ["batch", "--help"],
+    "monograph-help": ["monograph", "--help"],
+    "combine-help": ["combine", "--help"],
+    "convert-help": ["convert", "--help"],
+    "labels-help": ["labels", "--help"],
+    "qr-render": ["qr", "jignasa", "{workdir}/startup-qr", "https://ex.am/startup", "--render", "direct"],
+}
+STARTUP_RUNS = 5
+
+FILL_TEMPLATE = os.path.join(REPO_DIR, "qrcodetemp.docx")
+MONOGRAPH_TEMPLATE = os.path.join(REPO_DIR, "MonographTemplate.docx")
+MONOGRAPH_COLUMNS = (
+    "filename", "sanskritname", "image", "botanicalname", "familyname", "tamilname",
+    "malayalamname", "hindiname", "englishname", "description", "usefulpart", "benefit",
+    "action", "rasa", "guna", "virya", "vipaka", "karma", "shortdesc",
+)
+
+
+# ----------------------------------------------------------------------------
+# Synthetic data
+# ----------------------------------------------------------------------------
+
+def synthetic_url(rng, variant):
+    """
+    A short URL, or a long Google Drive share link like the ones in books.csv.
+    """
+    if variant == "short-urls":
+        return "https://ex.am/" + "".join(rng.choices(string.ascii_lowercase, k=6))
+    file_id = "".join(rng.choices(string.ascii_letters + string.digits + "-_", k=33))
+    return f"https://drive.google.com/file/d/{file_id}/view?usp=drivesdk"
+
+
+def synthetic_words(rng, count):
+    return " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+                    for _ in range(count))
+
+
+def write_fill_csv(path, rows, variant, seed=1):
+    """
+    Write a main.py CSV (name, url and the qrcodetemp.docx placeholders).
+    """
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["name", "url", "title", "author", "year", "description"])
+        for i in range(rows):
+            writer.writerow([f"row{i:05d}", synthetic_url(rng, variant), synthetic_words(rng, 4),
+                             synthetic_words(rng, 2), 1900 + i % 120, synthetic_words(rng, 40)])
+
+
+def write_monograph_csv(path, rows, variant, seed=1):
+    """
+    Write a monograph.py CSV; the 'with-images' variant cycles through images/.
+    """
+    rng = random.Random(seed)
+    images = []
+    if variant == "with-images":
+        images = sorted(f for f in os.listdir(os.path.join(REPO_DIR, "images"))
+                        if os.path.isfile(os.path.join(REPO_DIR, "images", f)))
+    columns = [c for c in MONOGRAPH_COLUMNS if images or c != "image"]
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        for i in range(rows):
+            row = {c: synthetic_words(rng, 30 if c == "description" else 3) for c in columns}
+            row["filename"] = f"row{i:05d}"
+            if images:
+                row["image"] = images[i % len(images)]
+            writer.writerow([row[c] for c in columns])
+
+
+# ----------------------------------------------------------------------------
+# Stages (each runs in its own process, with the repository as working directory)
+# ----------------------------------------------------------------------------
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_monographs(csv_path, folder):
+    """
+    Fill the monograph template for every row; returns per-row latencies.
+    """
+    from csvrows import read_rows
+    from monograph import MonographTemplate
+
+    os.makedirs(folder, exist_ok=True)
+    template = MonographTemplate(MONOGRAPH_TEMPLATE)
+    latencies = []
+    for row in read_rows(csv_path):
+        start = time.perf_counter()
+        template.fill(row, os.path.join(folder, row["filename"] + ".docx"))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_stage(stage, csv_path, workdir, options):
+    """
+    Run one stage and return (number of items, per-item latencies or None, extra info).
+    """
+    from csvrows import read_rows
+
+    if stage == "qr":
+        from jignasaQR import generate_jignasa_qr
+
+        latencies = []
+        for row in read_rows(csv_path):
+            start = time.perf_counter()
+            generate_jignasa_qr(row["url"], render=options["render"])
+            latencies.append(time.perf_counter() - start)
+        return len(latencies), latencies, {}
+
+    if stage == "fill":
+        import main
+
+        docs = os.path.join(workdir, "docs")
+        os.makedirs(docs, exist_ok=True)
+        main.init_worker(FILL_TEMPLATE, "jignasa", options["render"], options["engine"])
+        latencies = []
+        for index, row in enumerate(read_rows(csv_path)):
+            start = time.perf_counter()
+            _, name, data, error, _, _ = main.render_row((index, row))
+            if error:
+                raise RuntimeError(f"Row {index + 1} ({name}): {error}")
+            with open(os.path.join(docs, f"{name}.docx"), "wb") as fh:
+                fh.write(data)
+            latencies.append(time.perf_counter() - start)
+        return len(latencies), latencies, {}
+
+    monographs = os.path.join(workdir, "monographs")
+    if stage == "monograph":
+        latencies = make_monographs(csv_path, monographs)
+        return len(latencies), latencies, {}
+
+    # combine and convert work on the monographs; build them (untimed) if needed
+    if not os.path.isdir(monographs):
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                make_monographs(csv_path, monographs)
+            finally:
+                sys.stdout = stdout
+    count = len([f for f in os.listdir(monographs) if f.endswith(".docx")])
+
+    if stage == "combine":
+        from combinedocx import combine_docx_from_folder
+
+        output = os.path.join(workdir, "combined.docx")
+        combine_docx_from_folder(monographs, output)
+        return count, None, {"output_mb": round(os.path.getsize(output) / (1024 * 1024), 2)}
+
+    if stage == "convert":
+        import DocxToPdf
+
+        if not DocxToPdf.find_soffice():
+            return count, None, {"skipped": "LibreOffice (soffice) not found"}
+        converted, _, failed = DocxToPdf.convert_folder(
+            monographs, os.path.join(workdir, "pdf"), workers=options["workers"],
+            backend="libreoffice", force=True)
+        return count, None, {"converted": converted, "failed": len(failed)}
+
+    raise ValueError(f"Unknown stage '{stage}'")
+
+
+def stage_process(stage, csv_path, workdir, options, queue):
+    """
+    Entry point of the child process for one stage.
+    """
+    os.chdir(REPO_DIR)  # logos, images/ and templates are found relative to the repo
+    os.environ["IMAGE_CACHE_DIR"] = os.path.join(workdir, "imagecache")
+    sys.path.insert(0, REPO_DIR)
+    try:
+        with open(os.path.join(workdir, f"{stage}.log"), "w", encoding="utf-8") as log:
+            stdout, sys.stdout = sys.stdout, log
+            try:
+                start = time.perf_counter()
+                items, latencies, extra = run_stage(stage, csv_path, workdir, options)
+                seconds = time.perf_counter() - start
+            finally:
+                sys.stdout = stdout
+        queue.put({"items": items, "seconds": seconds, "latencies": latencies,
+                   "peak_rss_mb": peak_rss_mb(), "extra": extra})
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def parse_importtime(stderr):
+    """
+    Return {top-level module: cumulative microseconds} from `python -X importtime` output.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        # Top-level imports are indented by exactly one space
+        if name.startswith(" ") and not name.startswith("  ") and cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def run_startup(workdir, target_ms):
+    """
+    Time qrtool.py cold starts. Returns ({case: result}, [messages of runs over target_ms]).
+    """
+    env = dict(os.environ, QR_SERVER="off", QR_CACHE_DIR="")
+    # Modules the interpreter imports before any script runs are not counted
+    interpreter = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], env=env,
+                                 capture_output=True, text=True).stderr
+    baseline = set(parse_importtime(interpreter))
+
+    cases, over = {}, []
+    for name, command in STARTUP_COMMANDS.items():
+        argv = [arg.format(workdir=workdir) for arg in command]
+        walls, imports = [], []
+        for _ in range(STARTUP_RUNS):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-X", "importtime", os.path.join(REPO_DIR, "qrtool.py")] + argv,
+                                  cwd=REPO_DIR, env=env, capture_output=True, text=True)
+            walls.append(time.perf_counter() - start)
+            if proc.returncode != 0:
+                cases[f"startup/{name}"] = {"error": proc.stdout.strip().splitlines()[-1:] or proc.returncode}
+                break
+            modules = parse_importtime(proc.stderr)
+            imports.append(sum(us for module, us in modules.items() if module not in baseline) / 1000.0)
+        else:
+            result = summarize({"items": len(walls), "seconds": sum(walls), "latencies": walls,
+                                "peak_rss_mb": None, "extra": {"import_ms": round(statistics.median(imports), 1)}})
+            cases[f"startup/{name}"] = result
+            if "--help" in command and result["import_ms"] > target_ms:
+                over.append(f"startup/{name}: imports take {result['import_ms']} ms "
+                            f"(target {target_ms:g} ms)")
+        case = f"startup/{name}"
+        print(format_result(case, cases[case]), flush=True)
+    return cases, over
+
+
+# ----------------------------------------------------------------------------
+# Measurements and baseline comparison
+# ----------------------------------------------------------------------------
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5 - 1e-9)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(raw):
+    """
+    Turn a stage process's raw result into the metrics stored in the JSON file.
+    """
+    if "error" in raw:
+        return {"error": raw["error"]}
+    if raw["extra"].get("skipped"):
+        return {"skipped": raw["extra"]["skipped"]}
+    result = {
+        "items": raw["items"],
+        "seconds": round(raw["seconds"], 4),
+        "throughput_per_s": round(raw["items"] / raw["seconds"], 2) if raw["seconds"] else None,
+        "p50_ms": None,
+        "p95_ms": None,
+        "peak_rss_mb": round(raw["peak_rss_mb"], 1) if raw["peak_rss_mb"] is not None else None,
+    }
+    if raw["latencies"]:
+        result["p50_ms"] = round(percentile(raw["latencies"], 50) * 1000, 3)
+        result["p95_ms"] = round(percentile(raw["latencies"], 95) * 1000, 3)
+    result.update(raw["extra"])
+    return result
+
+
+def compare(results, baseline, max_slowdown, max_rss_growth, noise_ms):
+    """
+    Return a list of regression messages for cases present in both result sets.
+
+    A time metric regresses if it exceeds the baseline by more than max_slowdown
+    percent plus noise_ms; peak RSS by more than max_rss_growth percent.
+    """
+    regressions = []
+    for case, current in results["cases"].items():
+        base = baseline.get("cases", {}).get(case)
+        if not base or "seconds" not in base or "seconds" not in current:
+            continue
+        checks = [("seconds", 1000.0, max_slowdown), ("p50_ms", 1.0, max_slowdown),
+                  ("p95_ms", 1.0, max_slowdown), ("peak_rss_mb", None, max_rss_growth)]
+        for metric, to_ms, limit in checks:
+            old, new = base.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            slack = noise_ms / to_ms if to_ms else 0
+            if new > old * (1 + limit / 100.0) + slack:
+                change = 100.0 * (new - old) / old if old else float("inf")
+                regressions.append(f"{case}: {metric} {old} -> {new} (+{change:.0f}%, limit {limit:g}%)")
+    return regressions
+
+
+def wait_for_stage(proc, queue, timeout):
+    """
+    Return the raw result of a stage process, or {"error": ...} when the process
+    died without sending one (crash, out of memory, os._exit) or ran past timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            # The result is read before join(): a child blocks on exit until its queue is drained
+            return queue.get(timeout=1.0)
+        except queue_module.Empty:
+            pass
+        if not proc.is_alive():
+            try:
+                return queue.get(timeout=1.0)  # sent just before exiting
+            except queue_module.Empty:
+                return {"error": f"stage process exited with code {proc.exitcode} without a result"}
+        if time.monotonic() > deadline:
+            proc.terminate()
+            return {"error": f"stage timed out after {timeout:g} s"}
+
+
+def case_variants(stage):
+    return URL_VARIANTS if stage in ("qr", "fill") else IMAGE_VARIANTS
+
+
+def run_benchmarks(sizes, stages, options, workdir):
+    """
+    Run every (stage, size, variant) case and return the results dict (and the
+    startup cases over their import target, as messages).
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "cases": {},
+    }
+    over_target = []
+    if "startup" in stages:
+        cases, over_target = run_startup(workdir, options["startup_target_ms"])
+        results["cases"].update(cases)
+    for size in sizes:
+        for variant in URL_VARIANTS + IMAGE_VARIANTS:
+            case_dir = os.path.join(workdir, f"{size}-{variant}")
+            os.makedirs(case_dir, exist_ok=True)
+            csv_path = os.path.join(case_dir, "data.csv")
+            if variant in URL_VARIANTS:
+                write_fill_csv(csv_path, size, variant)
+            else:
+                write_monograph_csv(csv_path, size, variant)
+
+            for stage in stages:
+                if stage == "startup" or variant not in case_variants(stage):
+                    continue
+                case = f"{stage}/{size}/{variant}"
+                queue = ctx.Queue()
+                proc = ctx.Process(target=stage_process, args=(stage, csv_path, case_dir, options, queue))
+                proc.start()
+                raw = wait_for_stage(proc, queue, options.get("stage_timeout", STAGE_TIMEOUT_S))
+                proc.join()
+                result = summarize(raw)
+                results["cases"][case] = result
+                print(format_result(case, result), flush=True)
+    return results, over_target
+
+
+def format_result(case, result):
+    if "error" in result:
+        return f"{case:<36} ERROR {result['error']}"
+    if "skipped" in result:
+        return f"{case:<36} skipped ({result['skipped']})"
+    latency = ""
+    if result["p50_ms"] is not None:
+        latency = f"p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+    rss = f"{result['peak_rss_mb']:.0f} MB" if result["peak_rss_mb"] is not None else "n/a"
+    if "import_ms" in result:
+        rss = f"n/a  imports {result['import_ms']:.1f} ms"
+    return (f"{case:<36} {result['seconds']:9.2f} s  {result['throughput_per_s']:9.1f}/s  "
+            f"{latency:<36}peak RSS {rss}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark QR generation, template fill, combine and conversion.")
+    parser.add_argument("--sizes", default="1,100,10000", help="Comma-separated CSV row counts (default 1,100,10000)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated stages (default {','.join(STAGES)})")
+    parser.add_argument("--render", default="legacy", help="QR render mode for qr and fill (legacy or direct)")
+    parser.add_argument("--engine", default="docxtpl", help="Template engine for fill (docxtpl or compiled)")
+    parser.add_argument("--workers", type=int, default=2, help="LibreOffice workers for convert")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--max-slowdown", type=float, default=10.0,
+                        help="Allowed increase of time and latency metrics over the baseline, in percent")
+    parser.add_argument("--max-rss-growth", type=float, default=20.0,
+                        help="Allowed increase of peak RSS over the baseline, in percent")
+    parser.add_argument("--noise-ms", type=float, default=5.0,
+                        help="Absolute slack added to time thresholds, in milliseconds")
+    parser.add_argument("--startup-target-ms", type=float, default=50.0,
+                        help="Longest allowed import time of a qrtool.py --help run, in milliseconds")
+    parser.add_argument("--stage-timeout", type=float, default=STAGE_TIMEOUT_S,
+                        help=f"Seconds before a stage process is stopped and its case fails (default {STAGE_TIMEOUT_S:g})")
+    parser.add_argument("--workdir", help="Keep the generated CSVs and documents in this folder")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+    options = {"render": args.render, "engine": args.engine, "workers": args.workers,
+               "startup_target_ms": args.startup_target_ms, "stage_timeout": args.stage_timeout}
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="qrbench-")
+    try:
+        results, over_target = run_benchmarks(sizes, stages, options, os.path.abspath(workdir))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=1, sort_keys=True)
+    print(f"Results saved to {args.output}")
+
+    failed = [case for case, result in results["cases"].items() if "error" in result]
+    for message in over_target:
+        print(f"❌ Cold start: {message}")
+    failed += over_target
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressions = compare(results, baseline, args.max_slowdown, args.max_rss_growth, args.noise_ms)
+        for message in regressions:
+            print(f"❌ Regression: {message}")
+        if not regressions:
+            print(f"✅ No regressions against {args.baseline}")
+        failed += regressions
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
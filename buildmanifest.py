@@ -0,0 +1,87 @@
+"""
+buildmanifest.py
+----------------
+Per-output fingerprints for incremental rebuilds of main.py and monograph.py.
+
+A manifest file in the output folder maps each generated document to a hash of
+everything it was built from (row values, template, images, logo, QR style). On the
+next run only rows whose fingerprint changed are rendered again, and documents whose
+rows disappeared from the CSV are deleted. Files the manifest does not know about are
+never touched.
+"""
+import hashlib
+import json
+import os
+
+from qrcache import file_hash
+
+MANIFEST_NAME = ".build-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def fingerprint(*parts):
+    """
+    Return a stable SHA-256 hex digest of JSON-serialisable parts
+    (values that are not JSON types, e.g. NaN or numpy scalars, are hashed via str()).
+    """
+    blob = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def optional_file_hash(path):
+    """
+    Return file_hash(path), or None if the file does not exist.
+    """
+    if path and os.path.isfile(path):
+        return file_hash(path)
+    return None
+
+
+class BuildManifest(object):
+    """
+    Fingerprints of the documents in one output folder.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self.outputs = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            if data.get("version") == MANIFEST_VERSION:
+                self.outputs = data.get("outputs", {})
+
+    def is_current(self, output_name, fp):
+        """
+        True if output_name was built from fingerprint fp and still exists.
+        """
+        return (self.outputs.get(output_name) == fp
+                and os.path.exists(os.path.join(self.folder, output_name)))
+
+    def record(self, output_name, fp):
+        self.outputs[output_name] = fp
+
+    def forget(self, output_name):
+        self.outputs.pop(output_name, None)
+
+    def remove_stale(self, current_names):
+        """
+        Delete outputs recorded in the manifest that are not in current_names.
+        Returns the list of removed file names.
+        """
+        removed = []
+        for name in sorted(set(self.outputs) - set(current_names)):
+            path = os.path.join(self.folder, name)
+            if os.path.exists(path):
+                os.remove(path)
+            del self.outputs[name]
+            removed.append(name)
+        return removed
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"version": MANIFEST_VERSION, "outputs": self.outputs}, fh,
+                      indent=1, sort_keys=True, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -1,49 +1,120 @@
-from docx import Document
-from docxcompose.composer import Composer
-from docx.enum.text import WD_BREAK
+import argparse
 import sys, os
 import glob
+import tracing
+from tracing import span
+from docarchive import is_archive, iter_documents, read_manifest
 
-def combine_docx_from_folder(folder, output_file="combined.docx"):
+def list_docx_files(folder):
     """
-    Combine all .docx files from a folder into a single Word document.
-    Files are combined in alphabetical order.
+    Return the .docx files in a folder in alphabetical order, skipping Word lock files.
     """
-    files = sorted(
+    return sorted(
         f for f in glob.glob(os.path.join(folder, "*.docx"))
         if not os.path.basename(f).startswith("~$")
     )
-    
-    if not files:
+
+
+def list_archive_documents(archive):
+    """
+    Return the .docx names in an archive written with --archive (see docarchive.py),
+    in the order they were written.
+    """
+    return [doc["name"] for doc in read_manifest(archive)["documents"]
+            if doc["name"].lower().endswith(".docx")]
+
+
+def combine_docx_from_folder(folder, output_file="combined.docx", engine="stream"):
+    """
+    Combine all .docx files from a folder into a single Word document.
+    Files are combined in alphabetical order.
+
+    folder can also be a .zip/.tar archive written by main.py or monograph.py
+    --archive: its documents are read from the archive one at a time and combined
+    in the order they were written (the CSV order).
+
+    engine="stream" merges the zip packages directly (docxmerge.py): identical images
+    are stored once and memory stays flat. engine="composer" uses docxcompose.
+    """
+    if is_archive(folder):
+        count = len(list_archive_documents(folder))
+        # (name, bytes) pairs, read one at a time
+        files = ((name, data) for name, data, _ in iter_documents(folder))
+    else:
+        files = list_docx_files(folder)
+        count = len(files)
+
+    if not count:
         raise ValueError(f"No .docx files found in {folder}")
 
-    print(f"Found {len(files)} files. Combining into {output_file}...")
+    print(f"Found {count} files. Combining into {output_file}...")
+
+    if engine == "stream":
+        from docxmerge import merge_docx
+
+        stats = merge_docx(
+            files, output_file,
+            on_error=lambda path, e: print(f"⚠️ Skipping {path} due to error: {e}")
+        )
+        print(f"✅ Combined document saved as {output_file}")
+        print(f"   {stats['documents']} documents in {stats['seconds']:.2f}s, "
+              f"{stats['media_deduplicated']} duplicate images stored once "
+              f"({stats['bytes_saved'] / 1024:.0f} KB saved), "
+              f"output {os.path.getsize(output_file) / 1024:.0f} KB")
+        if stats["style_conflicts"]:
+            print(f"⚠️ {stats['style_conflicts']} style(s) defined differently in later documents; "
+                  f"the first document's definitions were used")
+        return
+    if engine != "composer":
+        raise ValueError("Invalid engine. Use 'stream' or 'composer'.")
+
+    from io import BytesIO
+    from docx import Document
+    from docx.enum.text import WD_BREAK
+    from docxcompose.composer import Composer
+
+    # Paths, or (name, bytes) pairs read from an archive
+    sources = ((f, f) if isinstance(f, str) else (f[0], BytesIO(f[1])) for f in files)
 
     # Start with the first document
-    master = Document(files[0])
+    master = Document(next(sources)[1])
     composer = Composer(master)
 
-    for idx, file in enumerate(files[1:], start=2):
-        try:
-            sub_doc = Document(file)
-        except Exception as e:
-            print(f"⚠️ Skipping {file} due to error: {e}")
-            continue
-        master.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
-        composer.append(sub_doc)
-    composer.save(output_file)
+    for file, source in sources:
+        with tracing.row(file):
+            try:
+                with span("load"):
+                    sub_doc = Document(source)
+            except Exception as e:
+                print(f"⚠️ Skipping {file} due to error: {e}")
+                continue
+            with span("append"):
+                master.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+                composer.append(sub_doc)
+    with span("save"):
+        composer.save(output_file)
     print(f"✅ Combined document saved as {output_file}")
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python combine_docx.py <folder_path>")
-        sys.exit(1)
+def main():
+    parser = argparse.ArgumentParser(description="Combine all .docx files of a folder into combined.docx.")
+    parser.add_argument("folder_path", help="Folder with the .docx files, or a .zip/.tar written with --archive")
+    parser.add_argument("--composer", action="store_true",
+                        help="Merge with docxcompose instead of the streaming merger")
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
 
-    folder_path = sys.argv[1]
+    folder_path = args.folder_path
 
-    if not os.path.isdir(folder_path):
-        print(f"Error: {folder_path} is not a valid folder")
+    if not (os.path.isdir(folder_path) or (is_archive(folder_path) and os.path.isfile(folder_path))):
+        print(f"Error: {folder_path} is not a valid folder or archive")
         sys.exit(1)
 
-    combine_docx_from_folder(folder_path, "combined.docx")
\ No newline at end of file
+    engine = "composer" if args.composer else "stream"
+    tracing.configure(args.profile, args.profile_format)
+    combine_docx_from_folder(folder_path, "combined.docx", engine)
+    tracing.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+csvrows.py
+----------
+Streaming CSV reader shared by main.py and monograph.py.
+
+Rows are yielded one at a time as plain dicts while the file is read, so memory
+stays flat for any CSV size and the first document can be written before the whole
+file has been parsed. Quoted cells spanning several lines (as in monographData.csv)
+are handled by the csv module. pandas is only imported when the "pandas" backend is
+asked for explicitly.
+"""
+import csv
+
+
+def read_rows(csv_path, backend="csv", encoding="utf-8-sig", chunksize=1000):
+    """
+    Yield each data row of csv_path as a dict of column name -> value.
+
+    Parameters:
+    - csv_path (str): Path to the CSV file (first line is the header).
+    - backend (str): 'csv' (default, values are strings, empty cells are '') or
+      'pandas' (values typed by pandas, empty cells are NaN; read in chunks).
+    - encoding (str): File encoding; the default also strips a UTF-8 BOM.
+    - chunksize (int): Rows per chunk for the pandas backend.
+    """
+    if backend == "pandas":
+        import pandas as pd
+
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, encoding=encoding):
+            for row in chunk.to_dict("records"):
+                yield row
+    elif backend == "csv":
+        with open(csv_path, newline="", encoding=encoding) as fh:
+            for row in csv.DictReader(fh):
+                # Short rows leave missing columns as None; treat them as empty cells
+                yield {k: ("" if v is None else v) for k, v in row.items() if k is not None}
+    else:
+        raise ValueError(f"Invalid CSV backend '{backend}'. Use 'csv' or 'pandas'.")
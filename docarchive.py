@@ -0,0 +1,179 @@
+"""
+docarchive.py
+-------------
+Single-file output for batch runs: main.py and monograph.py --archive out.zip (or
+.tar, .tar.gz) write each rendered document from memory straight into one archive as
+it is produced, without temporary files in docs/.
+
+The last member, manifest.json, lists every document in the order it was written:
+
+    {"version": 1, "complete": true, "documents": [
+        {"name": "Alice.docx", "key": "Alice", "size": 31250, "sha256": "..."}, ...]}
+
+key is the CSV row key (the 'name' column for main.py, the output name for
+monograph.py). combinedocx.py and DocxToPdf.py accept such an archive in place of
+a folder.
+
+Zip members are stored, not compressed again: a .docx is already a zip file.
+zipfile and tarfile are imported on first use, so the CLIs can check for an archive
+path without loading them.
+"""
+import hashlib
+import json
+import os
+import time
+from io import BytesIO
+
+from outputnames import NameAllocator
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def is_archive(path):
+    """
+    True if path names an archive this module reads and writes (by extension).
+    """
+    return str(path).lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _is_zip(path):
+    return str(path).lower().endswith(".zip")
+
+
+class ArchiveWriter(object):
+    """
+    Streams documents into a .zip or .tar archive and records the manifest.
+
+    Use as a context manager; the manifest is written when the archive is closed,
+    with "complete": false if the run stopped early.
+    """
+
+    def __init__(self, path):
+        if not is_archive(path):
+            raise ValueError(f"Unsupported archive type: {path} (use {', '.join(ARCHIVE_EXTENSIONS)})")
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.documents = []
+        self.names = NameAllocator(taken={MANIFEST_NAME})
+        if _is_zip(path):
+            import zipfile
+
+            self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED)
+            self._tar = None
+        else:
+            import tarfile
+
+            self._zip = None
+            self._tar = tarfile.open(path, "w" if path.lower().endswith(".tar") else "w:gz")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(completed=exc_type is None)
+
+    def _write(self, name, data):
+        if self._zip is not None:
+            import zipfile
+
+            zinfo = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            zinfo.compress_type = zipfile.ZIP_STORED
+            zinfo.external_attr = 0o644 << 16
+            self._zip.writestr(zinfo, data)
+        else:
+            import tarfile
+
+            tinfo = tarfile.TarInfo(name)
+            tinfo.size = len(data)
+            tinfo.mtime = time.time()
+            tinfo.mode = 0o644
+            self._tar.addfile(tinfo, BytesIO(data))
+
+    def add(self, name, data, key=None):
+        """
+        Write one document. A name already in the archive gets a '(1)', '(2)' ...
+        suffix like files in docs/. Returns the member name used.
+        """
+        name = self.names.allocate(name)
+        self._write(name, data)
+        self.documents.append({"name": name, "key": key, "size": len(data),
+                               "sha256": hashlib.sha256(data).hexdigest()})
+        return name
+
+    def close(self, completed=True):
+        """
+        Write manifest.json and close the archive.
+        """
+        if self._zip is None and self._tar is None:
+            return
+        manifest = {"version": MANIFEST_VERSION, "complete": bool(completed), "documents": self.documents}
+        self._write(MANIFEST_NAME, json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        else:
+            self._tar.close()
+            self._tar = None
+
+
+def read_manifest(path):
+    """
+    Return the manifest of an archive as a dict ({"documents": []} if it has none).
+    """
+    import tarfile
+    import zipfile
+
+    if _is_zip(path):
+        with zipfile.ZipFile(path) as zin:
+            if MANIFEST_NAME not in zin.NameToInfo:
+                return {"documents": []}
+            data = zin.read(MANIFEST_NAME)
+    else:
+        with tarfile.open(path) as tin:
+            try:
+                data = tin.extractfile(MANIFEST_NAME).read()
+            except KeyError:
+                return {"documents": []}
+    return json.loads(data)
+
+
+def iter_documents(path, extension=".docx"):
+    """
+    Yield (name, bytes, mtime) for each member ending in extension, in archive order
+    (the order the documents were written). Only one document is held in memory at a time.
+    """
+    import tarfile
+    import zipfile
+
+    if _is_zip(path):
+        with zipfile.ZipFile(path) as zin:
+            for info in zin.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(extension):
+                    continue
+                yield info.filename, zin.read(info), time.mktime(info.date_time + (0, 0, -1))
+    else:
+        with tarfile.open(path) as tin:
+            for info in tin:
+                if not info.isfile() or not info.name.lower().endswith(extension):
+                    continue
+                yield info.name, tin.extractfile(info).read(), info.mtime
+
+
+def extract_documents(path, folder, extension=".docx"):
+    """
+    Write the documents of an archive into folder, keeping their modification times
+    (member paths are flattened to their base names). Returns the paths written.
+    """
+    os.makedirs(folder, exist_ok=True)
+    written = []
+    for name, data, mtime in iter_documents(path, extension):
+        target = os.path.join(folder, os.path.basename(name))
+        with open(target, "wb") as fh:
+            fh.write(data)
+        os.utime(target, (mtime, mtime))
+        written.append(target)
+    return written
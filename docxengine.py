@@ -0,0 +1,293 @@
+"""
+docxengine.py
+-------------
+Parse-once template engine for batch filling of docxtpl-style Word templates.
+
+DocxTemplate unzips and reparses the whole .docx for every row and zips it all up
+again on save. CompiledTemplate does that work once: it keeps the raw (still
+compressed) zip entries in memory, runs docxtpl's XML clean-up on the parts that
+contain Jinja tags and compiles them. Rendering a row then only evaluates the
+compiled templates and writes the changed XML parts and new images into the output
+zip; every other entry is copied byte-for-byte without being recompressed.
+"""
+import re
+import zipfile
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from docx.image.image import Image as DocxImage
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.part import Part
+from docx.oxml.shape import CT_Inline
+from docxtpl import DocxTemplate, InlineImage
+from jinja2 import Environment
+from lxml import etree
+from docxzip import XML_DECLARATION, copy_raw_entry, read_raw_entries, rels_name, zip_info
+
+IMAGE_RELTYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+SVG_CONTENT_TYPE = "image/svg+xml"
+
+# Office 2016 extension that puts an SVG behind a picture's PNG blip
+SVG_BLIP_EXT = (
+    '<a:extLst><a:ext uri="{96DAC541-7B7A-43D3-8B79-37D633B846F1}">'
+    '<asvg:svgBlip xmlns:asvg="http://schemas.microsoft.com/office/drawing/2016/SVG/main" '
+    'r:embed="%s"/></a:ext></a:extLst>'
+)
+
+# Parts rendered by DocxTemplate.render: body, headers, footers and footnotes
+TEMPLATED_CONTENT_TYPES = (
+    "document.main+xml",
+    "template.main+xml",
+    "header+xml",
+    "footer+xml",
+    "footnotes+xml",
+)
+
+
+def xml_finalize(value):
+    """
+    Jinja finalize hook: escape plain values (&, <, >) so CSV text cannot break the
+    XML of a part. Markup objects (CompiledImage, docxtpl RichText, jinja2.Markup)
+    are written as they are.
+    """
+    if hasattr(value, "__html__"):
+        return value.__html__()
+    return escape(str(value))
+
+
+def add_svg_blip(pic_xml, svg_rid):
+    """
+    Return the picture XML with the SVG relationship svg_rid attached to its blip.
+    Word 2016+ and LibreOffice draw the SVG; older readers use the bitmap.
+    """
+    return re.sub(
+        r"(<a:blip\b[^>]*?)\s*/>",
+        lambda m: m.group(1) + ">" + SVG_BLIP_EXT % svg_rid + "</a:blip>",
+        pic_xml,
+        count=1,
+    )
+
+
+class SvgInlineImage(InlineImage):
+    """
+    docxtpl InlineImage of a bitmap with an SVG version of the same picture.
+    """
+
+    def __init__(self, tpl, image_descriptor, width=None, height=None, svg=None):
+        super(SvgInlineImage, self).__init__(tpl, image_descriptor, width, height)
+        self.svg = svg
+
+    def _insert_image(self):
+        xml = super(SvgInlineImage, self)._insert_image()
+        if not self.svg:
+            return xml
+        part = self.tpl.current_rendering_part
+        package = part.package
+        svg_part = Part(package.next_partname("/word/media/image%d.svg"), SVG_CONTENT_TYPE,
+                        self.svg, package)
+        return add_svg_blip(xml, part.relate_to(svg_part, RT.IMAGE))
+
+
+class CompiledImage(object):
+    """
+    Image placed in a CompiledTemplate context; the counterpart of docxtpl's
+    InlineImage. Rendering it registers the image with the part being rendered.
+    An optional SVG (bytes) is stored with it as the vector version.
+    """
+
+    def __init__(self, tpl, image_descriptor, width=None, height=None, svg=None):
+        self.tpl = tpl
+        if hasattr(image_descriptor, "read"):
+            self.blob = image_descriptor.read()
+        else:
+            with open(image_descriptor, "rb") as fh:
+                self.blob = fh.read()
+        self.width, self.height = width, height
+        self.svg = svg
+
+    def __str__(self):
+        return self.tpl._insert_image(self)
+
+    __html__ = __str__
+
+
+class CompiledTemplate(object):
+    """
+    A Word template loaded and compiled once, rendered many times.
+
+    Usage:
+        tpl = CompiledTemplate("template.docx")
+        for row in rows:
+            context["qrcode"] = tpl.inline_image(png_buffer, width=Mm(20))
+            tpl.render_to(f"docs/{name}.docx", context)
+    """
+
+    def __init__(self, template_file, jinja_env=None):
+        self.template_file = template_file
+        self.jinja_env = jinja_env or Environment(finalize=xml_finalize)
+        self._entries = read_raw_entries(template_file)
+
+        # docxtpl is only used for its XML clean-up helpers, the .docx is never loaded by it
+        self._docxtpl = DocxTemplate(template_file)
+        self._rels = {}
+        self._templates = {}
+        with zipfile.ZipFile(template_file) as zin:
+            self._content_types = zin.read("[Content_Types].xml").decode("utf-8")
+            overrides = {
+                elt.get("PartName").lstrip("/"): elt.get("ContentType")
+                for elt in etree.fromstring(self._content_types.encode("utf-8"))
+                if elt.tag.endswith("Override")
+            }
+            for info, _ in self._entries:
+                name = info.filename
+                if name.endswith(".rels"):
+                    self._rels[name] = zin.read(name).decode("utf-8")
+                elif overrides.get(name, "").endswith(TEMPLATED_CONTENT_TYPES):
+                    xml = zin.read(name)
+                    if b"{" in xml:
+                        self._templates[name] = self._compile_part(xml)
+        self._rendering = None
+
+    def _compile_part(self, blob):
+        """
+        Apply docxtpl's clean-up to one XML part and compile it as a Jinja template.
+        Returns (template, whether the part uses {%tc %} cell loops).
+        """
+        xml = self._docxtpl.xml_to_string(etree.fromstring(blob))
+        has_tc = bool(re.search(r"\{[%{]-?tc\s", re.sub(r"<[^>]+>", "", xml)))
+        xml = self._docxtpl.patch_xml(xml)
+        xml = re.sub(r"<w:p([ >])", r"\n<w:p\1", xml)
+        return self.jinja_env.from_string(xml), has_tc
+
+    def inline_image(self, image_descriptor, width=None, height=None, svg=None):
+        """
+        Return an image object to put in the render context (like docxtpl's InlineImage).
+        """
+        return CompiledImage(self, image_descriptor, width, height, svg)
+
+    def _insert_image(self, image):
+        state = self._rendering
+        if state is None:
+            raise RuntimeError("Images can only be rendered inside CompiledTemplate.render_to")
+
+        docx_image = DocxImage.from_blob(image.blob)
+        cx, cy = docx_image.scaled_dimensions(image.width, image.height)
+        number = len(state["media"]) + 1
+        ext = docx_image.ext.lower()
+        filename = f"compiled_image{number}.{ext}"
+        r_id = f"rIdCompiled{number}"
+
+        state["media"].append((f"word/media/{filename}", image.blob, ext, docx_image.content_type))
+        state["rels"].setdefault(rels_name(state["part"]), []).append(
+            f'<Relationship Id="{r_id}" Type="{IMAGE_RELTYPE}" Target="media/{filename}"/>'
+        )
+
+        pic = CT_Inline.new_pic_inline(0, r_id, filename, cx, cy).xml
+        pic = re.sub(r"^<\?xml[^>]*\?>\s*", "", pic)
+        if image.svg:
+            svg_name = f"compiled_image{number}.svg"
+            svg_rid = f"rIdCompiled{number}s"
+            state["media"].append((f"word/media/{svg_name}", image.svg, "svg", SVG_CONTENT_TYPE))
+            state["rels"][rels_name(state["part"])].append(
+                f'<Relationship Id="{svg_rid}" Type="{IMAGE_RELTYPE}" Target="media/{svg_name}"/>'
+            )
+            pic = add_svg_blip(pic, svg_rid)
+        return (
+            "</w:t></w:r><w:r><w:drawing>%s</w:drawing></w:r><w:r>"
+            '<w:t xml:space="preserve">' % pic
+        )
+
+    def _render_part(self, name, context):
+        template, has_tc = self._templates[name]
+        self._rendering["part"] = name
+        xml = template.render(context)
+        xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", xml)
+        xml = (
+            xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        xml = self._docxtpl.resolve_listing(xml)
+        if has_tc:
+            xml = etree.tostring(self._docxtpl.fix_tables(xml), encoding="unicode")
+        return xml
+
+    def render(self, context):
+        """
+        Render the template with context and return the .docx file as bytes.
+        """
+        out = BytesIO()
+        self.render_to(out, context)
+        return out.getvalue()
+
+    def render_to(self, output, context):
+        """
+        Render the template with context and write the .docx to output (path or file object).
+        """
+        self.write_parts(output, self.render_parts(context))
+
+    def render_parts(self, context):
+        """
+        Render the template with context and return the parts that differ from the
+        template, as {zip name: bytes}: the rendered XML parts, changed or new
+        relationship parts, the content types if they changed, and new images.
+        docxzip.PackageParts(parts, ZipFile(template)) is then the whole document.
+        """
+        self._rendering = {"part": None, "media": [], "rels": {}}
+        try:
+            parts = {name: self._render_part(name, context) for name in self._templates}
+            media = self._rendering["media"]
+            new_rels = self._rendering["rels"]
+        finally:
+            self._rendering = None
+
+        # Renumber drawing ids so inserted images never collide (as docxtpl does)
+        counter = iter(range(1001, 1 << 31))
+        for name, xml in parts.items():
+            parts[name] = (XML_DECLARATION + re.sub(
+                r'(<wp:docPr\b[^>]*?\bid=")\d+', lambda m: f"{m.group(1)}{next(counter)}", xml
+            )).encode("utf-8")
+            # A broken part fails the row here instead of producing a corrupt document
+            etree.fromstring(parts[name])
+
+        content_types = self._content_types
+        for _, _, ext, content_type in media:
+            if f'Extension="{ext}"' not in content_types:
+                content_types = content_types.replace(
+                    "</Types>", f'<Default Extension="{ext}" ContentType="{content_type}"/></Types>'
+                )
+        if content_types is not self._content_types:
+            parts["[Content_Types].xml"] = content_types.encode("utf-8")
+
+        for name, rels in new_rels.items():
+            if name in self._rels:
+                xml = self._rels[name].replace("</Relationships>", "".join(rels) + "</Relationships>")
+            else:
+                # Relationship parts the template did not have yet
+                xml = (XML_DECLARATION + '<Relationships xmlns="http://schemas.openxmlformats.org/'
+                       'package/2006/relationships">' + "".join(rels) + "</Relationships>")
+            parts[name] = xml.encode("utf-8")
+        for media_name, blob, _, _ in media:
+            parts[media_name] = blob
+        return parts
+
+    def write_parts(self, output, parts):
+        """
+        Write the template with the rendered parts (from render_parts) to output as a .docx.
+        Unchanged entries are copied without being recompressed.
+        """
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info, raw in self._entries:
+                name = info.filename
+                if name in parts:
+                    zout.writestr(zip_info(name), parts[name])
+                else:
+                    copy_raw_entry(zout, info, raw)
+
+            # New relationship parts, then the new images (bitmaps stored: already compressed)
+            template_names = {info.filename for info, _ in self._entries}
+            for name, data in parts.items():
+                if name not in template_names:
+                    compress_type = zipfile.ZIP_DEFLATED if name.endswith((".rels", ".svg")) else zipfile.ZIP_STORED
+                    zout.writestr(zip_info(name, compress_type), data)
@@ -0,0 +1,603 @@
+"""
+docxmerge.py
+------------
+Streaming package-level merge of many .docx files into one.
+
+docxcompose's Composer appends each document through python-docx, which keeps the
+whole growing result in memory and stores a new copy of every image. DocxMerger
+works directly on the zip packages instead:
+
+- the first document is the master: its parts are copied byte-for-byte and its
+  final section properties (page size, headers, footers) apply to the result;
+- the body of each further document is parsed on its own, its relationship ids
+  are remapped, and it is written to a spooled temporary file after a page break,
+  so only one input document is in memory at a time;
+- media parts are deduplicated by SHA-256, so the same logo or template image is
+  stored once however many documents use it;
+- styles and numbering definitions are merged once per distinct styles.xml /
+  numbering.xml, not once per document.
+
+A style ID the master already defines keeps the master's definition, so a later
+document with its own "Heading1" is shown with the master's Heading1. IDs whose
+definitions differ are listed in merger.style_conflicts and counted in
+stats["style_conflicts"]; the CLIs print a warning for them. Numbering is never
+shared this way: each document's lists are renumbered and keep their own format.
+
+Each document is read and checked completely before anything of it is written, so
+a broken file (DOCUMENT_ERRORS) can be skipped without leaving parts of it behind;
+if the first file is broken, the next one becomes the master.
+
+Footnotes, comments and headers of the appended documents are not carried over
+(the master's headers and footers are used for every page).
+"""
+import hashlib
+import os
+import posixpath
+import shutil
+import tempfile
+import time
+import zipfile
+from copy import deepcopy
+from io import BytesIO
+
+from lxml import etree
+import tracing
+from tracing import span
+from docxzip import XML_DECLARATION, PackageParts, copy_raw_entry, read_raw_entries, rels_name, zip_info
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+WP_NS = "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+
+IMAGE_RELTYPE = R_NS + "/image"
+NUMBERING_RELTYPE = R_NS + "/numbering"
+STYLES_RELTYPE = R_NS + "/styles"
+NUMBERING_CT = "application/vnd.openxmlformats-officedocument.wordprocessingml.numbering+xml"
+
+PAGE_BREAK = '<w:p xmlns:w="%s"><w:r><w:br w:type="page"/></w:r></w:p>' % W_NS
+
+# Relationship types of parts that belong to the master only and are never imported
+MASTER_ONLY_RELTYPES = tuple(R_NS + "/" + t for t in (
+    "styles", "numbering", "settings", "webSettings", "fontTable", "theme",
+    "header", "footer", "footnotes", "endnotes", "comments",
+))
+
+# Children of w:style that do not change how styled text looks
+STYLE_METADATA = tuple("{%s}%s" % (W_NS, t) for t in (
+    "rsid", "uiPriority", "semiHidden", "unhideWhenUsed", "qFormat", "locked", "autoRedefine",
+))
+
+# Errors of a broken input document; it can be skipped and the output stays valid
+DOCUMENT_ERRORS = (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError)
+
+
+def _w(tag):
+    return "{%s}%s" % (W_NS, tag)
+
+
+def _style_definition(style):
+    """
+    Canonical bytes of what a style looks like: exclusive C14N without the revision
+    id and the gallery/visibility settings, which differ between saves of the same style.
+    """
+    style = deepcopy(style)
+    for child in list(style):
+        if child.tag in STYLE_METADATA:
+            style.remove(child)
+    return etree.tostring(style, method="c14n", exclusive=True, with_comments=False)
+
+
+def _main_part(zin):
+    """
+    Return the zip name of the main document part of a package.
+    """
+    root = etree.fromstring(zin.read("_rels/.rels"))
+    for rel in root:
+        if rel.get("Type", "").endswith("/officeDocument"):
+            return rel.get("Target").lstrip("/")
+    return "word/document.xml"
+
+
+def _read_rels(zin, part_name):
+    """
+    Return {rId: (type, target, target_mode)} for part_name ({} if it has no rels).
+    """
+    try:
+        root = etree.fromstring(zin.read(rels_name(part_name)))
+    except KeyError:
+        return {}
+    return {rel.get("Id"): (rel.get("Type"), rel.get("Target"), rel.get("TargetMode"))
+            for rel in root}
+
+
+def _resolve(part_name, target):
+    """
+    Return the zip name a relationship target of part_name points to.
+    """
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part_name), target))
+
+
+def _content_types(zin):
+    """
+    Return ({extension: content type}, {part name: content type}) of a package.
+    """
+    root = etree.fromstring(zin.read("[Content_Types].xml"))
+    defaults, overrides = {}, {}
+    for elt in root:
+        if elt.tag == "{%s}Default" % CT_NS:
+            defaults[elt.get("Extension").lower()] = elt.get("ContentType")
+        elif elt.tag == "{%s}Override" % CT_NS:
+            overrides[elt.get("PartName").lstrip("/")] = elt.get("ContentType")
+    return defaults, overrides
+
+
+def _fetch_parts(zin, main, rels, rids):
+    """
+    Read the parts that the relationships rids of main point to, and the parts
+    those link to in turn, as {zip name: bytes}. A missing part raises KeyError
+    here, before the document is merged.
+    """
+    parts = {}
+    todo = [_resolve(main, rels[rid][1]) for rid in rids
+            if rid in rels and rels[rid][2] != "External" and rels[rid][0] not in MASTER_ONLY_RELTYPES]
+    while todo:
+        name = todo.pop()
+        if name in parts:
+            continue
+        parts[name] = zin.read(name)
+        try:
+            parts[rels_name(name)] = zin.read(rels_name(name))
+        except KeyError:
+            continue
+        for reltype, target, mode in _read_rels(zin, name).values():
+            if mode != "External":
+                todo.append(_resolve(name, target))
+    return parts
+
+
+class DocxMerger(object):
+    """
+    Merge .docx files into output_file, one document at a time.
+
+    Usage:
+        with DocxMerger("combined.docx") as merger:
+            for path in files:
+                merger.append(path)
+        print(merger.stats)
+    """
+
+    def __init__(self, output_file, page_breaks=True):
+        self.output_file = output_file
+        self.page_breaks = page_breaks
+        self.stats = {"documents": 0, "media_parts": 0, "media_deduplicated": 0,
+                      "bytes_saved": 0, "style_conflicts": 0, "seconds": 0.0}
+        self.style_conflicts = set()  # style IDs defined differently than in the master
+        self._started = time.perf_counter()
+        self._zout = zipfile.ZipFile(output_file, "w", zipfile.ZIP_DEFLATED)
+        self._body = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024, mode="w+b")
+        self._master = None
+        self._written = set()
+        self._next_rid = 1
+        self._next_media = 1
+        self._next_docpr = 10000  # clear of the ids used in the master's headers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def abort(self):
+        """
+        Stop without writing the merged document; the partly written file is removed.
+        """
+        # Do not leave a half-written file behind
+        self._zout.close()
+        self._body.close()
+        if os.path.exists(self.output_file):
+            os.remove(self.output_file)
+
+    # ------------------------------------------------------------------ master
+
+    def _load_master(self, path, zin, data=None, raw=True):
+        # Everything is read and parsed first: a broken document leaves the merger
+        # untouched, so the next document can become the master instead
+        main = _main_part(zin)
+        defaults, overrides = _content_types(zin)
+        rels = _read_rels(zin, main)
+        master = {
+            "main": main,
+            "defaults": defaults,
+            "overrides": overrides,
+            "rels": rels,
+            "styles": None,
+            "styles_part": None,
+            "numbering": None,
+            "numbering_part": None,
+            "merged_hashes": set(),
+            "numbering_maps": {},
+        }
+        media_by_hash = {}   # sha256 -> zip name in output
+        rid_by_target = {}   # zip name -> rId in the master document rels
+
+        for rid, (reltype, target, mode) in rels.items():
+            if mode == "External":
+                continue
+            name = _resolve(main, target)
+            rid_by_target.setdefault(name, rid)
+            if reltype == STYLES_RELTYPE:
+                master["styles_part"] = name
+            elif reltype == NUMBERING_RELTYPE:
+                master["numbering_part"] = name
+            elif reltype == IMAGE_RELTYPE:
+                media_by_hash.setdefault(hashlib.sha256(zin.read(name)).digest(), name)
+
+        for part in ("styles", "numbering"):
+            name = master[part + "_part"]
+            if name:
+                part_data = zin.read(name)
+                master[part] = etree.fromstring(part_data)
+                master["merged_hashes"].add(hashlib.sha256(part_data).digest())
+
+        # Split the master document around its body content
+        root = etree.fromstring(zin.read(main))
+        nsmap = dict(root.nsmap)
+        body = root.find(_w("body"))
+        # The final sectPr stays in the tail, after all appended bodies
+        children = [c for c in body if c.tag != _w("sectPr") or c is not body[-1]]
+        for child in children:
+            body.remove(child)
+        marker = etree.Comment("DOCXMERGE-BODY")
+        body.insert(0, marker)
+        head, tail = etree.tostring(root, encoding="unicode").split("<!--DOCXMERGE-BODY-->")
+
+        # Parts rewritten at close time; everything else is copied as it is
+        rewritten = {main, rels_name(main), "[Content_Types].xml",
+                     master["styles_part"], master["numbering_part"]}
+        if raw:
+            entries = [(info, raw_bytes) for info, raw_bytes in read_raw_entries(path, data)
+                       if info.filename not in rewritten]
+        else:
+            # Unzipped package (PackageParts): its parts are compressed on writing
+            entries = [(name, zin.read(name)) for name in zin.namelist() if name not in rewritten]
+
+        # Commit: the master is valid, write its parts and body
+        self._master = master
+        self._nsmap = nsmap
+        self._head, self._tail = head, tail
+        self._media_by_hash = media_by_hash
+        self._rid_by_target = rid_by_target
+        for entry, content in entries:
+            if raw:
+                copy_raw_entry(self._zout, entry, content)
+                self._written.add(entry.filename)
+            else:
+                self._zout.writestr(zip_info(entry), content)
+                self._written.add(entry)
+        self._body.write(b"".join(self._serialize(child, {}) for child in children))
+
+    # ---------------------------------------------------------------- appending
+
+    def append(self, path, data=None):
+        """
+        Append the body of the .docx at path (the first file becomes the master).
+        data is the document's content when it is already in memory, e.g. read from
+        an archive (path is then only its name).
+        """
+        with tracing.row(path), zipfile.ZipFile(path if data is None else BytesIO(data)) as zin:
+            if self._master is None:
+                with span("load_master"):
+                    self._load_master(path, zin, data)
+            else:
+                self._append_document(zin)
+        self.stats["documents"] += 1
+
+    def append_package(self, name, package):
+        """
+        Append the body of an unzipped document (docxzip.PackageParts, or anything
+        with read(part name) and namelist()); name is only used in profiles. This
+        skips zipping each rendered document and reading it back.
+        """
+        with tracing.row(name):
+            if self._master is None:
+                with span("load_master"):
+                    self._load_master(name, package, raw=False)
+            else:
+                self._append_document(package)
+        self.stats["documents"] += 1
+
+    def _append_document(self, zin):
+        # Read, parse and check everything first; the merger is only changed once
+        # the document is known to be complete
+        main = _main_part(zin)
+        rels = _read_rels(zin, main)
+        defaults, overrides = _content_types(zin)
+
+        definitions = []
+        for rid, (reltype, target, mode) in rels.items():
+            if mode != "External" and reltype in (STYLES_RELTYPE, NUMBERING_RELTYPE):
+                definitions.append((reltype, self._definition(zin.read(_resolve(main, target)))))
+
+        with span("parse_body"):
+            root = etree.fromstring(zin.read(main))
+        body = root.find(_w("body"))
+        children = [c for c in body if c.tag != _w("sectPr")]
+        references = []  # (element, attribute, rId) to remap
+        for child in children:
+            # Section breaks inside appended documents use the master's headers and footers
+            for sect_pr in child.iter(_w("sectPr")):
+                for ref in sect_pr.findall(_w("headerReference")) + sect_pr.findall(_w("footerReference")):
+                    sect_pr.remove(ref)
+            for elt in child.iter():
+                for attr, value in elt.attrib.items():
+                    if attr.startswith("{%s}" % R_NS):
+                        references.append((elt, attr, value))
+        package = PackageParts(_fetch_parts(zin, main, rels, {value for _, _, value in references}))
+
+        # Commit: merge the definitions, import the parts and spool the body
+        numbering_map = {}
+        with span("merge_definitions"):
+            for reltype, definition in definitions:
+                if reltype == STYLES_RELTYPE:
+                    self._merge_styles(*definition)
+                else:
+                    numbering_map = self._merge_numbering(*definition)
+        rid_map = {}
+        with span("write_body") as ev:
+            for elt, attr, value in references:
+                if value not in rid_map:
+                    rid_map[value] = self._import_rel(package, main, rels, value, defaults, overrides)
+                elt.set(attr, rid_map[value])
+            chunks = [PAGE_BREAK.encode("utf-8")] if self.page_breaks else []
+            chunks.extend(self._serialize(child, numbering_map) for child in children)
+            data = b"".join(chunks)
+            self._body.write(data)
+            ev["bytes"] = len(data)
+
+    def _serialize(self, elt, numbering_map):
+        """
+        Renumber drawing ids and list ids in one top-level body element and return
+        its XML (bytes) for the body spool.
+        """
+        for node in elt.iter(_w("numId"), "{%s}docPr" % WP_NS):
+            if node.tag == _w("numId"):
+                value = node.get(_w("val"))
+                if value in numbering_map:
+                    node.set(_w("val"), numbering_map[value])
+            else:
+                node.set("id", str(self._next_docpr))
+                self._next_docpr += 1
+        xml = etree.tostring(elt, encoding="unicode")
+        # Drop namespace declarations the master root already makes
+        end = xml.index(">")
+        start_tag = xml[:end]
+        for prefix, uri in self._nsmap.items():
+            if prefix:
+                start_tag = start_tag.replace(' xmlns:%s="%s"' % (prefix, uri), "")
+        return (start_tag + xml[end:]).encode("utf-8")
+
+    def _add_rel(self, reltype, target, mode=None):
+        while f"rIdM{self._next_rid}" in self._master["rels"]:
+            self._next_rid += 1
+        rid = f"rIdM{self._next_rid}"
+        self._master["rels"][rid] = (reltype, target, mode)
+        return rid
+
+    def _import_rel(self, zin, main, rels, rid, defaults, overrides):
+        """
+        Make the relationship rid of an appended document available in the master
+        and return its id there.
+        """
+        if rid not in rels:
+            return rid
+        reltype, target, mode = rels[rid]
+        if mode == "External":
+            return self._add_rel(reltype, target, mode)
+        if reltype in MASTER_ONLY_RELTYPES:
+            return rid
+
+        name = _resolve(main, target)
+        data = zin.read(name)
+        digest = hashlib.sha256(data).digest()
+        existing = self._media_by_hash.get(digest)
+        if existing and reltype == IMAGE_RELTYPE:
+            self.stats["media_deduplicated"] += 1
+            self.stats["bytes_saved"] += len(data)
+            if existing in self._rid_by_target:
+                return self._rid_by_target[existing]
+        else:
+            existing = self._copy_part(zin, name, data, defaults, overrides)
+            if reltype == IMAGE_RELTYPE:
+                self._media_by_hash[digest] = existing
+                self.stats["media_parts"] += 1
+
+        new_rid = self._add_rel(reltype, posixpath.relpath(existing, posixpath.dirname(self._master["main"])))
+        self._rid_by_target[existing] = new_rid
+        return new_rid
+
+    def _copy_part(self, zin, name, data, defaults, overrides):
+        """
+        Store a part of an appended document under a new unique name.
+        """
+        folder, base = posixpath.split(name)
+        stem, ext = posixpath.splitext(base)
+        new_name = f"{folder}/merged{self._next_media}{ext}"
+        while new_name in self._written:
+            self._next_media += 1
+            new_name = f"{folder}/merged{self._next_media}{ext}"
+        self._next_media += 1
+        self._zout.writestr(zip_info(new_name), data)
+        self._written.add(new_name)
+
+        ext_key = ext.lstrip(".").lower()
+        content_type = overrides.get(name) or defaults.get(ext_key)
+        if name in overrides:
+            self._master["overrides"][new_name] = content_type
+        elif ext_key not in self._master["defaults"] and content_type:
+            self._master["defaults"][ext_key] = content_type
+
+        # Parts with their own relationships (charts, diagrams) keep their targets
+        part_rels = _read_rels(zin, name)
+        if part_rels:
+            rels_root = etree.Element("{%s}Relationships" % PKG_REL_NS, nsmap={None: PKG_REL_NS})
+            for rid, (reltype, target, mode) in part_rels.items():
+                if mode != "External":
+                    target_name = _resolve(name, target)
+                    copied = self._copy_part(zin, target_name, zin.read(target_name), defaults, overrides)
+                    target = posixpath.relpath(copied, folder)
+                attrs = {"Id": rid, "Type": reltype, "Target": target}
+                if mode:
+                    attrs["TargetMode"] = mode
+                etree.SubElement(rels_root, "{%s}Relationship" % PKG_REL_NS, attrs)
+            self._zout.writestr(zip_info(rels_name(new_name)),
+                                XML_DECLARATION + etree.tostring(rels_root, encoding="unicode"))
+        return new_name
+
+    # ------------------------------------------------------- styles / numbering
+
+    def _definition(self, data):
+        """
+        Return (digest, parsed root) of a styles or numbering part; the root is None
+        when a part with the same content was merged already.
+        """
+        digest = hashlib.sha256(data).digest()
+        if digest in self._master["merged_hashes"] or digest in self._master["numbering_maps"]:
+            return digest, None
+        return digest, etree.fromstring(data)
+
+    def _merge_styles(self, digest, source):
+        if digest in self._master["merged_hashes"] or self._master["styles"] is None:
+            return
+        self._master["merged_hashes"].add(digest)
+        master = self._master["styles"]
+        known = {s.get(_w("styleId")): s for s in master.iter(_w("style"))}
+        for style in source.iter(_w("style")):
+            style_id = style.get(_w("styleId"))
+            if style_id not in known:
+                master.append(style)
+            elif style_id not in self.style_conflicts and _style_definition(style) != _style_definition(known[style_id]):
+                # The master's definition wins; report that this document looks different
+                self.style_conflicts.add(style_id)
+                self.stats["style_conflicts"] += 1
+
+    def _merge_numbering(self, digest, source):
+        """
+        Merge a numbering part and return {old numId: new numId} for bodies using it.
+        """
+        maps = self._master["numbering_maps"]
+        if digest in maps:
+            return maps[digest]
+        if digest in self._master["merged_hashes"]:
+            maps[digest] = {}
+            return {}
+        self._master["merged_hashes"].add(digest)
+
+        master = self._master["numbering"]
+        if master is None:
+            master = self._master["numbering"] = etree.Element(_w("numbering"), nsmap={"w": W_NS})
+            self._master["numbering_part"] = posixpath.join(posixpath.dirname(self._master["main"]),
+                                                            "numbering.xml")
+            self._master["overrides"][self._master["numbering_part"]] = NUMBERING_CT
+            self._add_rel(NUMBERING_RELTYPE, "numbering.xml")
+
+        abstract_ids = [int(a.get(_w("abstractNumId"))) for a in master.findall(_w("abstractNum"))]
+        num_ids = [int(n.get(_w("numId"))) for n in master.findall(_w("num"))]
+        abstract_offset = max(abstract_ids, default=-1) + 1
+        num_offset = max(num_ids, default=0)
+
+        first_num = next(iter(master.findall(_w("num"))), None)
+        for abstract in source.findall(_w("abstractNum")):
+            abstract.set(_w("abstractNumId"), str(int(abstract.get(_w("abstractNumId"))) + abstract_offset))
+            # abstractNum elements must come before num elements
+            if first_num is not None:
+                first_num.addprevious(abstract)
+            else:
+                master.append(abstract)
+        mapping = {}
+        for num in source.findall(_w("num")):
+            old = num.get(_w("numId"))
+            new = str(int(old) + num_offset)
+            num.set(_w("numId"), new)
+            ref = num.find(_w("abstractNumId"))
+            ref.set(_w("val"), str(int(ref.get(_w("val"))) + abstract_offset))
+            master.append(num)
+            mapping[old] = new
+        maps[digest] = mapping
+        return mapping
+
+    # ------------------------------------------------------------------ output
+
+    def close(self):
+        """
+        Write the merged document part, relationships, content types, styles and
+        numbering, and finish the output file.
+        """
+        if self._master is None:
+            self._zout.close()
+            raise ValueError("No documents were appended")
+        master = self._master
+        z = self._zout
+
+        for part in ("styles", "numbering"):
+            if master[part] is not None:
+                z.writestr(zip_info(master[part + "_part"]),
+                           XML_DECLARATION + etree.tostring(master[part], encoding="unicode"))
+
+        rels_root = etree.Element("{%s}Relationships" % PKG_REL_NS, nsmap={None: PKG_REL_NS})
+        for rid, (reltype, target, mode) in master["rels"].items():
+            attrs = {"Id": rid, "Type": reltype, "Target": target}
+            if mode:
+                attrs["TargetMode"] = mode
+            etree.SubElement(rels_root, "{%s}Relationship" % PKG_REL_NS, attrs)
+        z.writestr(zip_info(rels_name(master["main"])),
+                   XML_DECLARATION + etree.tostring(rels_root, encoding="unicode"))
+
+        types = etree.Element("{%s}Types" % CT_NS, nsmap={None: CT_NS})
+        for ext, content_type in sorted(master["defaults"].items()):
+            etree.SubElement(types, "{%s}Default" % CT_NS, Extension=ext, ContentType=content_type)
+        for name, content_type in sorted(master["overrides"].items()):
+            etree.SubElement(types, "{%s}Override" % CT_NS, PartName="/" + name, ContentType=content_type)
+        z.writestr(zip_info("[Content_Types].xml"),
+                   XML_DECLARATION + etree.tostring(types, encoding="unicode"))
+
+        # Stream the spooled body into the document part
+        head = (XML_DECLARATION + self._head).encode("utf-8")
+        tail = self._tail.encode("utf-8")
+        info = zip_info(master["main"])
+        info.file_size = len(head) + self._body.tell() + len(tail)  # lets zipfile pick zip64
+        self._body.seek(0)
+        with span("write_document") as ev, z.open(info, "w") as dest:
+            dest.write(head)
+            shutil.copyfileobj(self._body, dest, 1024 * 1024)
+            dest.write(tail)
+            ev["bytes"] = info.file_size
+        self._body.close()
+        z.close()
+        self.stats["seconds"] = time.perf_counter() - self._started
+
+
+def merge_docx(files, output_file, page_breaks=True, on_error=None):
+    """
+    Merge the .docx files (in the given order) into output_file and return the stats.
+    Items of files are paths, or (name, bytes) pairs for documents already in memory.
+
+    on_error(path, exception) is called for documents that cannot be read; they are
+    skipped. Without it, errors are raised.
+    """
+    with DocxMerger(output_file, page_breaks=page_breaks) as merger:
+        for item in files:
+            path, data = item if isinstance(item, tuple) else (item, None)
+            try:
+                merger.append(path, data)
+            except DOCUMENT_ERRORS as e:
+                if on_error is None:
+                    raise
+                on_error(path, e)
+    return merger.stats
@@ -0,0 +1,102 @@
+"""
+docxzip.py
+----------
+Low-level zip helpers shared by the .docx writers (docxengine.py, docxmerge.py):
+reading entries without decompressing them, copying them into another zip
+byte-for-byte, deterministic entry headers, and unzipped packages (PackageParts)
+that are handed from the renderers to the merger without being zipped at all.
+"""
+import struct
+import zipfile
+from io import BytesIO
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+
+def rels_name(part_name):
+    """
+    Return the zip name of the relationships part for part_name
+    (word/document.xml -> word/_rels/document.xml.rels).
+    """
+    folder, _, base = part_name.rpartition("/")
+    return f"{folder}/_rels/{base}.rels" if folder else f"_rels/{base}.rels"
+
+
+def read_raw_entries(zip_path, data=None):
+    """
+    Return [(ZipInfo, raw compressed bytes)] for every entry in the zip, in order.
+    data is the zip file's content when it is already in memory (zip_path is unused then).
+    """
+    if data is None:
+        with open(zip_path, "rb") as fh:
+            data = fh.read()
+    entries = []
+    with zipfile.ZipFile(BytesIO(data)) as zin:
+        for info in zin.infolist():
+            header = _LOCAL_HEADER.unpack_from(data, info.header_offset)
+            start = info.header_offset + _LOCAL_HEADER.size + header[-2] + header[-1]
+            entries.append((info, data[start:start + info.compress_size]))
+    return entries
+
+
+def zip_info(name, compress_type=zipfile.ZIP_DEFLATED):
+    """
+    Return a ZipInfo with a fixed timestamp, so rendering the same row twice
+    produces byte-identical files.
+    """
+    zinfo = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    zinfo.compress_type = compress_type
+    return zinfo
+
+
+def copy_raw_entry(zout, info, raw):
+    """
+    Append an already-compressed entry to zout without decompressing it.
+    """
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.external_attr = info.external_attr
+    zinfo.create_system = info.create_system
+    zinfo.flag_bits = info.flag_bits & ~0x08  # sizes go in the local header, no data descriptor
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.header_offset = zout.fp.tell()
+
+    zout.fp.write(zinfo.FileHeader())
+    zout.fp.write(raw)
+    zout.start_dir = zout.fp.tell()
+    zout.filelist.append(zinfo)
+    zout.NameToInfo[zinfo.filename] = zinfo
+    zout._didModify = True
+
+
+class PackageParts(object):
+    """
+    A .docx package held as unzipped parts: {zip name: bytes}, optionally on top of
+    a base package (a ZipFile or another PackageParts) for the parts that did not
+    change. Offers the read()/namelist() subset of ZipFile that DocxMerger uses, so a
+    rendered document can be merged without being zipped and read back.
+    """
+
+    def __init__(self, parts, base=None):
+        self.parts = parts
+        self.base = base
+
+    def read(self, name):
+        """
+        Return the bytes of a part; raises KeyError if the package has no such part.
+        """
+        data = self.parts.get(name)
+        if data is not None:
+            return data
+        if self.base is None:
+            raise KeyError(name)
+        return self.base.read(name)
+
+    def namelist(self):
+        names = list(self.base.namelist()) if self.base is not None else []
+        known = set(names)
+        return names + [name for name in self.parts if name not in known]
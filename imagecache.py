@@ -0,0 +1,153 @@
+"""
+imagecache.py
+-------------
+Print-size copies of the plant images used by monograph.py.
+
+Photos in images/ are often several megapixels, but a monograph shows them 1.5
+inches wide. Each source image is converted once to that box at 300 DPI (only ever
+downscaled), JPEG for photos (transparent areas made white) and PNG for lossless
+sources, and the result is kept on disk for later runs and, for the most recently
+used images, in memory. Entries are keyed by the SHA-256 of the source file and the target size,
+so an edited image is converted again automatically.
+
+The on-disk cache lives in .imagecache/ (set IMAGE_CACHE_DIR to move it, or to an
+empty string to keep it in memory only).
+"""
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from io import BytesIO
+
+from qrcache import file_hash
+
+TARGET_WIDTH_IN = 1.5
+TARGET_DPI = 300
+JPEG_QUALITY = 90
+DEFAULT_DIR = ".imagecache"
+CACHE_VERSION = 2  # bump when the conversion itself changes
+
+# Lossy sources stay lossy (transparency flattened onto white); everything else
+# keeps exact pixels as PNG
+JPEG_SOURCES = ("JPEG", "MPO", "WEBP")
+JPEG_BACKGROUND = (255, 255, 255)
+
+# Normalized images kept in memory per process (least recently used are dropped;
+# older ones are read back from the disk cache)
+MAX_ENTRIES = 64
+
+_default_cache = None
+
+
+def normalize_image(img_path, width_px):
+    """
+    Return (bytes, extension) of img_path scaled down to at most width_px wide.
+
+    Raises an exception if the file is not a valid image.
+    """
+    from PIL import Image
+
+    with Image.open(img_path) as im:
+        im.verify()
+    with Image.open(img_path) as im:
+        source_format = im.format
+        if im.width > width_px:
+            height_px = max(1, round(im.height * width_px / im.width))
+            im = im.resize((width_px, height_px), Image.LANCZOS)
+        else:
+            im.load()
+        buf = BytesIO()
+        has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+        if source_format in JPEG_SOURCES:
+            if source_format == "WEBP":
+                print(f"🔄 Converting unsupported format to JPEG: {img_path}")
+            if has_alpha:
+                # The page is white: flatten instead of keeping a much larger PNG
+                im = im.convert("RGBA")
+                flat = Image.new("RGB", im.size, JPEG_BACKGROUND)
+                flat.paste(im, mask=im.getchannel("A"))
+                im = flat
+            im.convert("RGB").save(buf, format="JPEG", quality=JPEG_QUALITY,
+                                   dpi=(TARGET_DPI, TARGET_DPI))
+            return buf.getvalue(), "jpg"
+        if im.mode not in ("1", "L", "P", "RGB", "RGBA", "LA"):
+            im = im.convert("RGBA" if has_alpha else "RGB")
+        im.save(buf, format="PNG", dpi=(TARGET_DPI, TARGET_DPI))
+        return buf.getvalue(), "png"
+
+
+class ImageCache(object):
+    """
+    Normalized image bytes by (source file hash, target width), in memory and on disk.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, width_in=TARGET_WIDTH_IN, dpi=TARGET_DPI):
+        self.directory = directory
+        self.width_px = int(round(width_in * dpi))
+        self.stats = {"hits": 0, "misses": 0}
+        self._memory = OrderedDict()
+
+    def key(self, img_path):
+        fields = (file_hash(img_path), str(self.width_px), str(CACHE_VERSION))
+        return hashlib.sha256("\0".join(fields).encode("utf-8")).hexdigest()
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, key[:2], f"{key}.{ext}")
+
+    def get(self, img_path):
+        """
+        Return the normalized bytes of img_path, converting it on the first use.
+        """
+        key = self.key(img_path)
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+        elif self.directory:
+            for ext in ("jpg", "png"):
+                try:
+                    with open(self._path(key, ext), "rb") as fh:
+                        data = fh.read()
+                    break
+                except OSError:
+                    continue
+        if data is not None:
+            self.stats["hits"] += 1
+            self._remember(key, data)
+            return data
+
+        self.stats["misses"] += 1
+        data, ext = normalize_image(img_path, self.width_px)
+        self._remember(key, data)
+        if self.directory:
+            path = self._path(key, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        return data
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        while len(self._memory) > MAX_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def summary(self):
+        return format_stats(self.stats)
+
+
+def format_stats(stats):
+    """
+    Return a one-line summary of image cache hit/conversion counts.
+    """
+    return f"Image cache: {stats['hits']} hits, {stats['misses']} converted"
+
+
+def get_cache():
+    """
+    Return the default cache, in $IMAGE_CACHE_DIR (default .imagecache).
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ImageCache(os.environ.get("IMAGE_CACHE_DIR", DEFAULT_DIR))
+    return _default_cache
@@ -1,70 +1,39 @@
-import qrcode
-from qrcode import constants
-from qrcode.image.styledpil import StyledPilImage
-from qrcode.image.styles.moduledrawers import CircleModuleDrawer
-from qrcode.image.styles.colormasks import SolidFillColorMask
-from PIL import Image
-import os, sys
+"""
+jignasaQR.py
+------------
+Jignasa-styled QR code with the logo at the centre. The style itself (colors, logo,
+size) is registered in styles.py; this module keeps the original functions and CLI.
+"""
+import sys
 
+from styles import generate_qr, generate_svg, get_style, write_qr
 
-def generate_jignasa_qr(url, logo_path="assets/jignasa.png", scale_factor=4):
+STYLE = get_style("jignasa")
+LOGO_PATH = STYLE.logo_path
+FRONT_COLOR = STYLE.front_color
+BACK_COLOR = STYLE.back_color
+FINAL_SIZE = STYLE.final_size
+
+
+def generate_jignasa_qr(url, logo_path=LOGO_PATH, scale_factor=4,
+                        render="legacy", supersample=2, version=None, ecl="H"):
     """
     Generate a high-resolution Jignasa-styled QR code with logo at center.
     Returns a PIL.Image object.
-    """
-    if not os.path.exists(logo_path):
-        raise FileNotFoundError(f"Logo file not found at {logo_path}")
-
-    # Load logo
-    logo = Image.open(logo_path).convert("RGBA")
-
-    # Create QR
-    qr = qrcode.QRCode(
-        version=None,
-        error_correction=constants.ERROR_CORRECT_H,
-        box_size=25,
-        border=4,
-    )
-    qr.add_data(url)
-    qr.make(fit=True)
-
-    # Base QR image with rounded dots + colors
-    img = qr.make_image(
-        image_factory=StyledPilImage,
-        module_drawer=CircleModuleDrawer(),
-        color_mask=SolidFillColorMask(
-            front_color=(131, 174, 69),
-            back_color=(254, 252, 222)
-        )
-    ).convert("RGBA")
-
-    # Upscale for high-res
-    high_res = img.resize(
-        (img.size[0] * scale_factor, img.size[1] * scale_factor),
-        Image.Resampling.LANCZOS
-    )
 
-    # Resize logo
-    max_logo_size = high_res.size[0] // 5
-    logo.thumbnail((max_logo_size, max_logo_size), Image.Resampling.LANCZOS)
-
-    # Make white background transparent
-    datas = logo.getdata()
-    newData = [
-        (255, 255, 255, 0) if (r > 240 and g > 240 and b > 240) else (r, g, b, a)
-        for r, g, b, a in datas
-    ]
-    logo.putdata(newData)
+    render="direct" draws the code at supersample x the final size instead of
+    upscaling a box_size=25 render (see qrrender.py). version and ecl set the
+    smallest QR version and the error correction level (see qrplan.py).
+    """
+    return generate_qr(url, STYLE, logo_path, scale_factor, render, supersample, version, ecl)
 
-    # Center logo on QR
-    pos = ((high_res.size[0] - logo.size[0]) // 2,
-           (high_res.size[1] - logo.size[1]) // 2)
-    high_res.paste(logo, pos, mask=logo)
-    
-    final_size = 300  # pixels for 1 inch at 300 dpi
-    high_res = high_res.resize((final_size, final_size), Image.Resampling.LANCZOS)
 
-    return high_res
+def generate_jignasa_svg(url, logo_path=LOGO_PATH, version=None, ecl="H"):
+    """
+    Generate the Jignasa-styled QR code as vector graphics (see qrvector.py).
+    Returns the SVG document as bytes.
+    """
+    return generate_svg(url, STYLE, logo_path, version, ecl)
 
 
 # Keep CLI support
@@ -73,13 +42,13 @@ def main():
         print("Usage: python jignasaQR.py <output_file_name> <URL>")
         sys.exit(1)
 
-    output_file = sys.argv[1] + ".png"
-    url = sys.argv[2]
-
-    img = generate_jignasa_qr(url)
-    img.save(output_file, dpi=(300, 300))
-    print(f"High-resolution QR code saved to {output_file}")
+    try:
+        output_file = write_qr(sys.argv[2], STYLE, sys.argv[1])
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"High-resolution QR code saved to {output_file} at 300 DPI")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,322 @@
+"""
+labelsheet.py
+-------------
+Label-sheet imposition: tiles the QR codes of a CSV onto 300 DPI print sheets and
+writes a multi-page PDF (or one PNG per page) directly, instead of one Word document
+per row that then has to be combined and converted.
+
+    python labelsheet.py data.csv labels.pdf --style jignasa --size-mm 20 --caption name
+    python labelsheet.py data.csv labels.png --paper letter --rows 8 --cols 6 --style plain
+
+The sheet is A4 or Letter with the given margins. Without --rows/--cols as many
+codes (plus caption) as fit are placed; with them the usable area is split into that
+grid and each code is centred in its cell. Style 'plain' is the black, logo-free
+code of qr.py; the other styles are the branded ones registered in styles.py.
+
+Pages are composed and written one at a time (PDF pages are appended to the file
+as they are finished), so memory stays at one sheet however long the CSV is.
+"""
+import argparse
+import os
+import sys
+from collections import namedtuple
+
+import styles
+import tracing
+from tracing import span
+from csvrows import read_rows
+from qrplan import COMPACT_RULES, ECL_LEVELS, QRPlan, compact_url, parse_rules
+
+DPI = 300
+# Paper width and height in millimetres
+PAPER_SIZES = {
+    "a4": (210.0, 297.0),
+    "letter": (215.9, 279.4),
+}
+PLAIN_STYLE = "plain"  # qr.generate_simple_qr: black circles on white, no logo
+CAPTION_LINE = 1.25    # caption line height as a multiple of the font size
+
+# Pixel geometry of a sheet: page size, grid, top-left corner of the grid, cell
+# size, space between cells, QR code size and caption height
+SheetLayout = namedtuple("SheetLayout", "page_px rows cols origin_px cell_px gap_px code_px caption_px")
+
+
+def mm_to_px(mm):
+    """
+    Convert millimetres to pixels at 300 DPI.
+    """
+    return int(round(mm / 25.4 * DPI))
+
+
+def plan_layout(paper="a4", rows=None, cols=None, margin_mm=10, gap_mm=3, size_mm=20, caption_pt=0):
+    """
+    Work out where the codes go on a sheet.
+
+    Parameters:
+    - paper (str): 'a4' or 'letter'.
+    - rows, cols (int): Grid size (None = as many as fit).
+    - margin_mm (float): Empty border around the grid.
+    - gap_mm (float): Space between neighbouring cells.
+    - size_mm (float): Printed width of each QR code.
+    - caption_pt (float): Caption font size in points (0 = no caption).
+
+    Returns:
+    - SheetLayout. Raises ValueError if the codes do not fit.
+    """
+    if paper not in PAPER_SIZES:
+        raise ValueError(f"Invalid paper '{paper}'. Use one of: {', '.join(PAPER_SIZES)}.")
+    width_mm, height_mm = PAPER_SIZES[paper]
+    page = (mm_to_px(width_mm), mm_to_px(height_mm))
+    margin, gap, code = mm_to_px(margin_mm), mm_to_px(gap_mm), mm_to_px(size_mm)
+    caption = int(round(caption_pt / 72 * DPI * CAPTION_LINE)) if caption_pt else 0
+    usable = (page[0] - 2 * margin, page[1] - 2 * margin)
+
+    # By default as many cells of code + caption as fit across and down
+    cols = cols or max(0, (usable[0] + gap) // (code + gap))
+    rows = rows or max(0, (usable[1] + gap) // (code + caption + gap))
+    cell = ((usable[0] - (cols - 1) * gap) // cols if cols > 0 else 0,
+            (usable[1] - (rows - 1) * gap) // rows if rows > 0 else 0)
+    if rows < 1 or cols < 1 or cell[0] < code or cell[1] < code + caption:
+        raise ValueError(f"{size_mm:g} mm codes{' with captions' if caption else ''} do not fit "
+                         f"{rows or '?'} x {cols or '?'} on {paper.upper()} with {margin_mm:g} mm margins; "
+                         "use fewer rows/columns, smaller margins or a smaller --size-mm")
+    return SheetLayout(page, rows, cols, (margin, margin), cell, gap, code, caption)
+
+
+def code_renderer(style, size_px, render="direct", version=None, ecl="H"):
+    """
+    Return a function url -> RGB PIL.Image of size_px x size_px for the given style
+    ('plain' or a style registered in styles.py).
+    """
+    from PIL import Image
+
+    if style == PLAIN_STYLE:
+        from qr import generate_simple_qr
+
+        size_cm = size_px / DPI * 2.54
+
+        def render_code(url):
+            img = generate_simple_qr(url, size_cm, version, ecl)
+            if img.size[0] != size_px:
+                img = img.resize((size_px, size_px), Image.Resampling.NEAREST)
+            return img
+        return render_code
+
+    # A registered style drawn at the label size instead of its own print size
+    sized = styles.get_style(style)._replace(final_size=size_px)
+
+    def render_code(url):
+        return styles.generate_qr(url, sized, render=render, version=version, ecl=ecl).convert("RGB")
+    return render_code
+
+
+def caption_font(caption_pt):
+    """
+    Return a font for captions of caption_pt points at 300 DPI.
+    """
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.load_default(size=caption_pt / 72 * DPI)
+    except TypeError:  # Pillow < 10.1 only has the small bitmap font
+        return ImageFont.load_default()
+
+
+def fit_caption(draw, text, font, width):
+    """
+    Shorten text with an ellipsis until it fits in width pixels.
+    """
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+# Code renderer of the current process, set up once by init_worker
+_render_code = None
+
+
+def init_worker(style, size_px, render="direct", version=None, ecl="H", profile=False):
+    """
+    Set up the code renderer in the current process (a pool worker, or the main
+    process for serial runs). With profile=True (workers of a --profile run) stage
+    timings are buffered and returned with each label.
+    """
+    global _render_code
+    if profile:
+        tracing.start_buffer()
+    _render_code = code_renderer(style, size_px, render, version, ecl)
+
+
+def render_label(item):
+    """
+    Render the QR code of one label.
+
+    Parameters:
+    - item (tuple): (label number, url, caption).
+
+    Returns:
+    - tuple: (label number, caption, (mode, size, raw pixels) of the code, profile events).
+      Raw pixels rather than an Image, so results from pool workers pickle cheaply.
+    """
+    index, url, caption = item
+    with tracing.row(caption or index + 1):
+        with span("qr_render"):
+            code = _render_code(url)
+    return index, caption, (code.mode, code.size, code.tobytes()), tracing.take_events()
+
+
+def iter_pages(codes, layout, caption_pt=0):
+    """
+    Yield one RGB sheet (PIL.Image) per page for an iterable of render_label results.
+    Only the current sheet is kept in memory.
+    """
+    from PIL import Image, ImageDraw
+
+    font = caption_font(caption_pt) if layout.caption_px else None
+    per_page = layout.rows * layout.cols
+    page = draw = None
+    slot = 0
+    for index, caption, (mode, size, pixels), events in codes:
+        tracing.add_events(events)
+        if page is None:
+            page = Image.new("RGB", layout.page_px, (255, 255, 255))
+            draw = ImageDraw.Draw(page)
+            slot = 0
+
+        # Centre the code (and its caption) in the cell
+        row, col = divmod(slot, layout.cols)
+        cell_x = layout.origin_px[0] + col * (layout.cell_px[0] + layout.gap_px)
+        cell_y = layout.origin_px[1] + row * (layout.cell_px[1] + layout.gap_px)
+        x = cell_x + (layout.cell_px[0] - layout.code_px) // 2
+        y = cell_y + (layout.cell_px[1] - layout.code_px - layout.caption_px) // 2
+        with span("paste", caption or index + 1):
+            page.paste(Image.frombytes(mode, size, pixels), (x, y))
+            if font and caption:
+                text = fit_caption(draw, str(caption), font, layout.cell_px[0])
+                draw.text((cell_x + layout.cell_px[0] // 2, y + layout.code_px + layout.caption_px // 2),
+                          text, fill=(0, 0, 0), font=font, anchor="mm")
+        slot += 1
+        if slot == per_page:
+            yield page
+            page = None
+    if page is not None:
+        yield page
+
+
+def write_sheets(pages, output_file, quality=95):
+    """
+    Write the sheets to output_file as they are produced: a .pdf gets one page per
+    sheet, a .png becomes output-001.png, output-002.png, ... Returns the paths written.
+    """
+    base, ext = os.path.splitext(output_file)
+    ext = ext.lower()
+    if ext not in (".pdf", ".png"):
+        raise ValueError("Invalid output file. Use a .pdf or .png name.")
+    folder = os.path.dirname(output_file)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    written = []
+    for number, page in enumerate(pages, start=1):
+        with span("page_write", number) as ev:
+            if ext == ".pdf":
+                # Later pages are appended to the PDF already on disk
+                page.save(output_file, "PDF", resolution=DPI, quality=quality, append=number > 1)
+                if number == 1:
+                    written.append(output_file)
+            else:
+                path = f"{base}-{number:03d}.png"
+                page.save(path, "PNG", dpi=(DPI, DPI))
+                written.append(path)
+            ev["bytes"] = os.path.getsize(written[-1])
+        print(f"Sheet {number} done")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tile the QR codes of a CSV onto printable label sheets.")
+    parser.add_argument("csv_file", help="CSV file with a 'url' column")
+    parser.add_argument("output_file", help="labels.pdf (multi-page) or labels.png (one file per page)")
+    parser.add_argument("--style", type=str.lower, choices=(PLAIN_STYLE,) + tuple(styles.STYLES),
+                        default=PLAIN_STYLE, help="QR style ('plain' = black, no logo; default)")
+    parser.add_argument("--render", choices=styles.RENDER_MODES, default="direct",
+                        help="Render mode of the branded styles (default direct)")
+    parser.add_argument("--paper", choices=tuple(PAPER_SIZES), default="a4", help="Sheet size (default a4)")
+    parser.add_argument("--rows", type=int, help="Rows of labels per sheet (default: as many as fit)")
+    parser.add_argument("--cols", type=int, help="Columns of labels per sheet (default: as many as fit)")
+    parser.add_argument("--margin-mm", type=float, default=10, help="Sheet margin in mm (default 10)")
+    parser.add_argument("--gap-mm", type=float, default=3, help="Space between labels in mm (default 3)")
+    parser.add_argument("--size-mm", type=float, default=20, help="Printed QR code width in mm (default 20)")
+    parser.add_argument("--caption", metavar="COLUMN", help="CSV column printed under each code")
+    parser.add_argument("--caption-pt", type=float, default=8, help="Caption font size in points (default 8)")
+    parser.add_argument("--url-column", default="url", help="CSV column with the data to encode (default url)")
+    parser.add_argument("--compact-urls", nargs="?", const="strip-tracking", default="", metavar="RULES",
+                        help=f"Shorten URLs before encoding; comma-separated rules from {', '.join(COMPACT_RULES)}")
+    parser.add_argument("--qr-version", metavar="N|auto",
+                        help="Same QR version for every code (1-40), or 'auto' for the smallest that fits all")
+    parser.add_argument("--qr-ecl", choices=tuple(ECL_LEVELS), default="H",
+                        help="QR error correction level (default H)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes rendering codes in parallel (default 1)")
+    parser.add_argument("--csv-backend", choices=("csv", "pandas"), default="csv",
+                        help="CSV reader: 'csv' (streaming, default) or 'pandas' (typed values)")
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        layout = plan_layout(args.paper, args.rows, args.cols, args.margin_mm, args.gap_mm, args.size_mm,
+                             args.caption_pt if args.caption else 0)
+        rules = parse_rules(args.compact_urls)
+        version = None
+        if args.qr_version:
+            # Same QR plan pre-pass as main.py, so every code on the sheets has the same module size
+            qr_plan = QRPlan(rules, args.qr_ecl, args.qr_version)
+            for index, row in enumerate(read_rows(args.csv_file, args.csv_backend)):
+                qr_plan.add(row.get(args.caption or "name", index + 1), row[args.url_column])
+            print(qr_plan.report(args.size_mm))
+            version = qr_plan.version
+    except (ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"{layout.rows} x {layout.cols} labels of {args.size_mm:g} mm per {args.paper.upper()} sheet")
+
+    # Stream the rows straight onto the sheets
+    labels = ((index, compact_url(row[args.url_column], rules), row.get(args.caption) if args.caption else None)
+              for index, row in enumerate(read_rows(args.csv_file, args.csv_backend)))
+    init_args = (args.style, layout.code_px, args.render, version, args.qr_ecl)
+
+    # Codes are rendered in worker processes but pasted here, in CSV order
+    pool = None
+    if args.workers > 1:
+        from multiprocessing import Pool
+
+        pool = Pool(args.workers, initializer=init_worker, initargs=init_args + (bool(args.profile),))
+        codes = pool.imap(render_label, labels, chunksize=8)
+    else:
+        init_worker(*init_args)
+        codes = map(render_label, labels)
+
+    # --profile: opened after the pool is started so workers do not inherit the file
+    tracing.configure(args.profile, args.profile_format)
+    try:
+        written = write_sheets(iter_pages(codes, layout, args.caption_pt), args.output_file)
+    except (ValueError, KeyError, FileNotFoundError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+    tracing.finish()
+    if not written:
+        print("No rows in the CSV, nothing written")
+    elif len(written) == 1:
+        print(f"✅ Label sheets saved to {written[0]}")
+    else:
+        print(f"✅ Label sheets saved to {written[0]} ... {written[-1]}")
+
+
+if __name__ == "__main__":
+    main()
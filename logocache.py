@@ -0,0 +1,69 @@
+"""
+logocache.py
+------------
+Prepares the logos pasted at the centre of the branded QR codes and keeps the
+prepared images in memory, so a batch run opens, thumbnails and masks each logo
+only once instead of once per QR code.
+"""
+from collections import OrderedDict
+import os
+
+import numpy as np
+from PIL import Image
+
+# Maximum number of prepared logos kept in memory (least recently used are dropped)
+MAX_ENTRIES = 16
+
+_cache = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+def prepare_logo(logo_path, max_size, threshold=240):
+    """
+    Return the logo at logo_path as an RGBA image that fits in max_size x max_size,
+    with near-white pixels (all channels above threshold) made transparent.
+
+    The result is cached on (path, mtime, max_size, threshold); editing the logo
+    file invalidates the entry. The returned image is shared between callers and
+    must not be modified in place.
+    """
+    key = (os.path.abspath(logo_path), os.path.getmtime(logo_path), max_size, threshold)
+
+    logo = _cache.get(key)
+    if logo is not None:
+        _cache.move_to_end(key)
+        _stats["hits"] += 1
+        return logo
+    _stats["misses"] += 1
+
+    # Load and resize logo while keeping aspect ratio
+    with Image.open(logo_path) as src:
+        logo = src.convert("RGBA")
+    logo.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+    # Make white background transparent in one array operation
+    pixels = np.array(logo)
+    white = (pixels[..., :3] > threshold).all(axis=-1)
+    pixels[white] = (255, 255, 255, 0)
+    logo = Image.fromarray(pixels, "RGBA")
+
+    _cache[key] = logo
+    while len(_cache) > MAX_ENTRIES:
+        _cache.popitem(last=False)
+    return logo
+
+
+def cache_info():
+    """
+    Return a dict with the cache hit/miss counters and the number of cached logos.
+    """
+    return {"hits": _stats["hits"], "misses": _stats["misses"], "size": len(_cache)}
+
+
+def clear_cache():
+    """
+    Drop all prepared logos and reset the hit/miss counters.
+    """
+    _cache.clear()
+    _stats["hits"] = 0
+    _stats["misses"] = 0
@@ -2,91 +2,537 @@
 main.py
 --------
 Generates QR codes for each URL in a CSV file and inserts them into a Word template
-along with other placeholders from the CSV. The filled documents are saved into the 'docs' folder.
+along with other placeholders from the CSV. The filled documents are saved into the 'docs' folder,
+or with --archive into a single .zip/.tar file (see docarchive.py), or with --book
+appended one after another to a single .docx (see docxmerge.py).
 """
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="docxcompose")
-import pandas as pd
-from jignasaQR import generate_jignasa_qr
-from vishwanathQR import generate_vishwanath_qr
 from io import BytesIO
-import sys
+import argparse
 import os
-from docxtpl import DocxTemplate, InlineImage
-from docx.shared import Mm
+import sys
+from functools import partial
+import qrcache
+import qrclient
+import styles
+import tracing
+from tracing import span
+from csvrows import read_rows
+from qrplan import COMPACT_RULES, ECL_LEVELS, QRPlan, compact_url, parse_rules
+from buildmanifest import BuildManifest, fingerprint, optional_file_hash
+from docarchive import ARCHIVE_EXTENSIONS, ArchiveWriter, is_archive
+
+# docx, docxtpl, PIL and qrcode are imported in the functions that render, so that
+# parsing the command line (and --help or --plan-only) does not pay for them
 
+QR_FORMATS = ("png", "svg")
 
-def generate_qr_image(url, doc, style="jignasa", width_mm=20):
+
+def generate_qr_image(url, doc, style="jignasa", width_mm=20, render="legacy", qr_format="png",
+                      version=None, ecl="H"):
     """
     Generate a QR code for the given URL and return an InlineImage compatible with docxtpl.
     
     Parameters:
     - url (str): The data or URL to encode in the QR code.
-    - doc (DocxTemplate): The Word template object, required for InlineImage.
-    - style (str): 'jignasa' or 'vishwanath' (QR style).
+    - doc (DocxTemplate or CompiledTemplate): The Word template object, required for InlineImage.
+    - style (str): A style registered in styles.py ('jignasa' or 'vishwanath').
     - width_mm (float): Width of the QR code image in millimeters (default 20mm).
+    - render (str): 'legacy' (box_size=25 + 4x upscale) or 'direct' (render at print size).
+    - qr_format (str): 'png' (bitmap) or 'svg' (vector QR with a small PNG fallback for
+      old Word versions, see styles.generate_svg_with_fallback).
+    - version (int): Smallest QR version (None = best fit per URL, see qrplan.py).
+    - ecl (str): Error correction level, 'L', 'M', 'Q' or 'H' (default).
     
     Returns:
     - InlineImage: QR code image ready to insert into the template.
     """
-    if style == "jignasa":
-        img = generate_jignasa_qr(url)
-    elif style == "vishwanath":
-        img = generate_vishwanath_qr(url)
+    from docxtpl import InlineImage
+    from docx.shared import Mm
+    from docxengine import CompiledTemplate, SvgInlineImage
+
+    style = styles.get_style(style)
+    if qr_format not in QR_FORMATS:
+        raise ValueError("Invalid QR format. Use 'png' or 'svg'.")
+
+    svg = None
+    if qr_format == "svg":
+        with span("qr_svg") as ev:
+            svg, png = styles.generate_svg_with_fallback(url, style, version=version, ecl=ecl)
+            ev["bytes"] = len(svg) + len(png)
     else:
-        raise ValueError("Invalid QR style. Use 'jignasa' or 'vishwanath'.")
+        # Render the PNG, or reuse it from the on-disk QR cache if enabled
+        png = styles.cached_qr_png(url, style, render, version, ecl)
 
     # Create a fresh buffer each time
-    byte_io = BytesIO()
-    img.save(byte_io, format="PNG")
-    byte_io.seek(0)
+    byte_io = BytesIO(png)
 
     # IMPORTANT: wrap a *new* InlineImage object per call
+    if isinstance(doc, CompiledTemplate):
+        return doc.inline_image(BytesIO(byte_io.read()), width=Mm(width_mm), svg=svg)
+    if svg:
+        return SvgInlineImage(doc, BytesIO(byte_io.read()), width=Mm(width_mm), svg=svg)
     return InlineImage(doc, BytesIO(byte_io.read()), width=Mm(width_mm))
 
-def main():
-    # Check command-line arguments
-    # Expecting: python main.py <CSV file> <Word template> <style>
-    if len(sys.argv) < 4:
-        print("Usage: python main.py yourfile.csv template.docx <jignasa|vishwanath>")
-        sys.exit(1)
+def parse_args(argv=None):
+    """
+    Parse command-line arguments.
+    Expecting: python main.py <CSV file> <Word template> <style> [options]
+    """
+    parser = argparse.ArgumentParser(
+        description="Fill a Word template with QR codes and values from a CSV file."
+    )
+    parser.add_argument("csv_file", help="Path to input CSV file")
+    parser.add_argument("template_file", help="Path to Word template")
+    parser.add_argument("style", type=str.lower, choices=tuple(styles.STYLES), help="QR style")
+    parser.add_argument("--render", choices=styles.RENDER_MODES, default="legacy",
+                        help="QR render mode: 'legacy' (upscale) or 'direct' (render at print size)")
+    parser.add_argument("--qr-format", choices=QR_FORMATS, default="png",
+                        help="QR image in the documents: 'png' (bitmap) or 'svg' (vector, sharp at any size, "
+                             "with a small PNG fallback for old Word versions)")
+    parser.add_argument("--compact-urls", nargs="?", const="strip-tracking", default="", metavar="RULES",
+                        help="Shorten URLs before encoding; comma-separated rules from "
+                             f"{', '.join(COMPACT_RULES)} (default when given: strip-tracking)")
+    parser.add_argument("--qr-version", metavar="N|auto",
+                        help="Encode every code with the same QR version (1-40), or 'auto' for the "
+                             "smallest version that fits all rows (default: best fit per row)")
+    parser.add_argument("--qr-ecl", choices=tuple(ECL_LEVELS), default="H",
+                        help="QR error correction level (default H)")
+    parser.add_argument("--plan-only", action="store_true",
+                        help="Print the QR version report for the CSV and exit without rendering")
+    parser.add_argument("--engine", choices=("docxtpl", "compiled"), default="docxtpl",
+                        help="Template engine: 'docxtpl' (reload per row) or 'compiled' (parse once per batch)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes rendering rows in parallel (default 1)")
+    parser.add_argument("--cache-dir", default=os.environ.get("QR_CACHE_DIR"),
+                        help="Directory of the on-disk QR image cache (default: $QR_CACHE_DIR, off if unset)")
+    parser.add_argument("--cache-max-mb", type=float,
+                        default=float(os.environ.get("QR_CACHE_MAX_MB", qrcache.DEFAULT_MAX_MB)),
+                        help="Size cap of the QR cache in MB (least recently used entries are evicted)")
+    parser.add_argument("--csv-backend", choices=("csv", "pandas"), default="csv",
+                        help="CSV reader: 'csv' (streaming, default) or 'pandas' (typed values)")
+    parser.add_argument("--no-server", action="store_true",
+                        help="Render here even if a qrserver.py is running (see $QR_SERVER)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only rebuild documents whose row, template, logo or style changed")
+    parser.add_argument("--book", metavar="FILE",
+                        help="Write all rows into one .docx, a page break between rows, instead of one file per row")
+    parser.add_argument("--pdf", action="store_true",
+                        help="With --book: also convert the book to PDF in the 'final' folder")
+    parser.add_argument("--archive", metavar="FILE",
+                        help="Write the documents into one .zip or .tar archive (with a manifest) "
+                             "instead of the docs folder")
+    tracing.add_arguments(parser)
+    return parser.parse_args(argv)
 
-    csv_file = sys.argv[1]       # Path to input CSV file
-    template_file = sys.argv[2]  # Path to Word template
-    style = sys.argv[3].lower()  # QR style
 
-    if style not in ("jignasa", "vishwanath"):
-        print("Error: style must be 'jignasa' or 'vishwanath'")
+# Per-process state set up once by init_worker (templates, style and render options)
+_worker_state = {}
+
+
+def init_worker(template_file, style, render="legacy", engine="docxtpl",
+                cache_dir=None, cache_max_mb=qrcache.DEFAULT_MAX_MB, profile=False, qr_format="png",
+                url_rules=(), qr_version=None, qr_ecl="H", book=False):
+    """
+    Prepare the current process for render_row: the compiled template is parsed
+    here once, and logos are cached by logocache on first use. With profile=True
+    (worker processes of a --profile run) stage timings are buffered and returned
+    with each row. url_rules, qr_version and qr_ecl come from the QR plan (see
+    qrplan.py). With book=True compiled rows are returned as unzipped parts (--book).
+    """
+    from docxengine import CompiledTemplate
+
+    qrcache.configure(cache_dir, cache_max_mb)
+    if profile:
+        tracing.start_buffer()
+    _worker_state.clear()
+    _worker_state.update(
+        template_file=template_file,
+        style=style,
+        render=render,
+        qr_format=qr_format,
+        url_rules=tuple(url_rules),
+        qr_version=qr_version,
+        qr_ecl=qr_ecl,
+        book=book,
+        compiled=CompiledTemplate(template_file) if engine == "compiled" else None,
+    )
+
+
+def render_document(template_file, row, style="jignasa", compiled=None, render="legacy",
+                    qr_format="png", url_rules=(), qr_version=None, qr_ecl="H", parts=False):
+    """
+    Fill the Word template for one CSV row and return the document as bytes.
+
+    Parameters:
+    - template_file (str): Path to the Word template (loaded here unless compiled is given).
+    - row (dict): Row with 'url' and the placeholder values ('name' is not used).
+    - compiled (CompiledTemplate): Parsed template to reuse, or None for docxtpl.
+    - render, qr_format, url_rules, qr_version, qr_ecl: QR options (see generate_qr_image
+      and qrplan.py).
+    - parts (bool): With a compiled template, return only the rendered parts as
+      {zip name: bytes} instead of a zipped file (see CompiledTemplate.render_parts).
+
+    Returns:
+    - bytes: The filled .docx file (or the dict of parts).
+    """
+    from docxtpl import DocxTemplate
+
+    # Load Word template
+    with span("template_load"):
+        doc = compiled or DocxTemplate(template_file)
+
+    # Generate QR code based on chosen style
+    with span("qr_image"):
+        qr_image = generate_qr_image(compact_url(row["url"], url_rules), doc, style,
+                                     render=render, qr_format=qr_format,
+                                     version=qr_version, ecl=qr_ecl)
+
+    # Build context dictionary
+    context = {k: v for k, v in row.items() if k not in ("name", "url")}
+    context["qrcode"] = qr_image
+
+    # Render into memory
+    if compiled and parts:
+        with span("template_render"):
+            return compiled.render_parts(context)
+    if compiled:
+        with span("template_render") as ev:
+            data = compiled.render(context)
+            ev["bytes"] = len(data)
+        return data
+    with span("template_render"):
+        doc.render(context)
+    with span("docx_save") as ev:
+        buf = BytesIO()
+        doc.save(buf)
+        data = buf.getvalue()
+        ev["bytes"] = len(data)
+    return data
+
+
+def render_row(item):
+    """
+    Render one CSV row into a Word document in memory.
+
+    Parameters:
+    - item (tuple): (row index, row dict with 'name', 'url' and placeholder values).
+
+    Returns:
+    - tuple: (index, name, docx bytes or None, error message or None, QR cache stats,
+      profile events). Errors are returned instead of raised so one bad row does
+      not stop the batch.
+    """
+    index, row = item
+    name = row.get("name")
+    cache = qrcache.get_cache()
+    before = dict(cache.stats) if cache else {}
+    with tracing.row(name):
+        try:
+            state = _worker_state
+            data = render_document(state["template_file"], row, state["style"], state["compiled"],
+                                   state["render"], state["qr_format"], state["url_rules"],
+                                   state["qr_version"], state["qr_ecl"], state["book"])
+            error = None
+        except Exception as e:
+            data, error = None, f"{type(e).__name__}: {e}"
+    stats = {k: v - before[k] for k, v in cache.stats.items()} if cache else {}
+    return index, name, data, error, stats, tracing.take_events()
+
+
+def forward_row(item, template_file, style, engine, render, qr_format, url_rules, qr_version, qr_ecl):
+    """
+    Like render_row, but the document is rendered by a running qrserver.py.
+    """
+    index, row = item
+    name = row.get("name")
+    try:
+        data = qrclient.render_document(template_file, row, style, engine, render, qr_format,
+                                        qr_version, qr_ecl, ",".join(url_rules))
+        error = None
+    except Exception as e:  # ServerError, OSError, http.client.HTTPException (server died mid-response) ...
+        data, error = None, f"{type(e).__name__}: {e}"
+    return index, name, data, error, {}, []
+
+
+class IncrementalPlan(object):
+    """
+    Keeps the manifest in docs/ in step with the documents written there.
+
+    With --incremental it filters the rows: rows whose document is up to date are
+    skipped, and documents of rows no longer in the CSV are deleted. Other runs
+    that write docs/ render every row but still record what each document was
+    built from, so a later --incremental run never keeps a document built from
+    other inputs. Works on a stream of rows, so it does not need the whole CSV in
+    memory.
+    """
+
+    def __init__(self, template_file, style, args, qr_plan=None):
+        self.incremental = args.incremental
+        self.manifest = BuildManifest("docs")
+        self.inputs = (optional_file_hash(template_file), optional_file_hash(styles.get_style(style).logo_path),
+                       style, args.render, args.engine, args.qr_format)
+        if qr_plan:
+            self.inputs += (qr_plan.rules, qr_plan.version, qr_plan.ecl)
+        self.fingerprints = {}  # row index -> fingerprint, until the row is written
+        self.seen = set()
+        self.scheduled = set()
+        self.total = 0
+
+    def filter(self, rows):
+        """
+        Yield the (index, row) pairs that need rendering.
+        """
+        for index, row in rows:
+            output_name = f"{row['name']}.docx"
+            fp = fingerprint(row, *self.inputs)
+            self.total += 1
+            self.seen.add(output_name)
+            # Once a name is rebuilt, later rows with the same name must be rebuilt
+            # too, since the last one is what ends up on disk
+            if (self.incremental and output_name not in self.scheduled
+                    and self.manifest.is_current(output_name, fp)):
+                continue
+            self.scheduled.add(output_name)
+            self.fingerprints[index] = fp
+            yield index, row
+
+    def record(self, index, name):
+        self.manifest.record(f"{name}.docx", self.fingerprints.pop(index))
+
+    def forget(self, index, name):
+        self.fingerprints.pop(index, None)
+        self.manifest.forget(f"{name}.docx")
+
+    def finish(self, completed=True):
+        """
+        Save the manifest. With --incremental, first delete stale documents (only
+        after a full pass over the CSV).
+        """
+        if not self.incremental:
+            self.manifest.save()
+            return
+        removed = self.manifest.remove_stale(self.seen) if completed else []
+        for output_name in removed:
+            print(f"Removed docs/{output_name}")
+        self.manifest.save()
+        print(f"Incremental build: {len(self.scheduled)} of {self.total} rows changed, "
+              f"{len(removed)} removed")
+
+
+def main():
+    args = parse_args()
+    csv_file = args.csv_file            # Path to input CSV file
+    template_file = args.template_file  # Path to Word template
+    style = args.style                  # QR style
+
+    if args.archive and not is_archive(args.archive):
+        print(f"Error: --archive must end in {', '.join(ARCHIVE_EXTENSIONS)}")
+        sys.exit(1)
+    if args.archive and args.incremental:
+        print("Error: --incremental works on the docs folder and cannot be combined with --archive")
         sys.exit(1)
+    if args.book and (args.archive or args.incremental or not args.book.lower().endswith(".docx")):
+        print("Error: --book needs a .docx file name and cannot be combined with --archive or --incremental")
+        sys.exit(1)
+    if args.pdf and not args.book:
+        print("Error: --pdf converts the --book document; use DocxToPdf.py for the docs folder")
+        sys.exit(1)
+    if args.pdf:
+        # Check for a PDF converter before rendering, not after the book is written
+        from DocxToPdf import resolve_backend
+
+        try:
+            resolve_backend()
+        except RuntimeError as e:
+            print(f"Error: --pdf: {e}")
+            sys.exit(1)
 
     # Ensure output folder exists
-    if not os.path.exists("docs"):
+    if not args.archive and not args.book and not os.path.exists("docs"):
         os.makedirs("docs")
 
-    # Read the CSV into a DataFrame
-    df = pd.read_csv(csv_file)
+    # QR plan: one pass over the CSV to find the QR version every row needs
+    qr_plan = None
+    if args.compact_urls or args.qr_version or args.qr_ecl != "H" or args.plan_only:
+        try:
+            qr_plan = QRPlan(parse_rules(args.compact_urls), args.qr_ecl, args.qr_version)
+            for index, row in enumerate(read_rows(csv_file, args.csv_backend)):
+                qr_plan.add(row.get("name", index + 1), row["url"])
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        except KeyError as e:
+            print(f"Error: {csv_file} has no {e} column")
+            sys.exit(1)
+        print(qr_plan.report())
+        if args.plan_only:
+            return
+    qr_args = ((qr_plan.rules, qr_plan.version, qr_plan.ecl) if qr_plan else ((), None, "H"))
 
-    # Process each row in the CSV
-    for _, row in df.iterrows():
-        name = row["name"]  # File name for the generated Word document
-        url = row["url"]    # URL/data to encode as QR code
+    # Stream the CSV rows; nothing is read ahead of the rows being rendered
+    rows = enumerate(read_rows(csv_file, args.csv_backend))
 
-        # Load Word template
-        doc = DocxTemplate(template_file)
+    # Incremental mode: skip rows whose document is up to date, drop deleted rows.
+    # Every run that writes docs/ updates the manifest, incremental or not.
+    plan = None
+    if not args.archive and not args.book:
+        plan = IncrementalPlan(template_file, style, args, qr_plan)
+        rows = plan.filter(rows)
+    init_args = (template_file, style, args.render, args.engine, args.cache_dir, args.cache_max_mb)
 
-        # Generate QR code based on chosen style
-        qr_image = generate_qr_image(url, doc, style)
+    # Rows are rendered in worker processes but always written here, in CSV order,
+    # so the docs folder ends up exactly as after a serial run
+    failures = []
+    saved = 0
+    cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+    pool = None
+    server = not args.no_server and not args.profile and qrclient.available()
+    if server and args.cache_dir and args.cache_dir != os.environ.get("QR_CACHE_DIR"):
+        # The server renders with its own QR cache; honour the one passed on the command line
+        print(f"QR server running, but --cache-dir is set: rendering locally with the cache in {args.cache_dir}")
+        server = False
+    if server:
+        # A qrserver.py is running: send the rows there, several at a time
+        workers = max(args.workers, qrclient.health().get("workers", 1))
+        host, port = qrclient.server_address()
+        print(f"Forwarding rows to the QR server at {host}:{port} ({workers} at a time); "
+              f"pass --no-server to render locally")
+        from multiprocessing.pool import ThreadPool
 
-        # Build context dictionary
-        context = {k: v for k, v in row.items() if k not in ("name", "url")}
-        context["qrcode"] = qr_image
+        pool = ThreadPool(workers)
+        forward = partial(forward_row, template_file=template_file, style=style, engine=args.engine,
+                          render=args.render, qr_format=args.qr_format, url_rules=qr_args[0],
+                          qr_version=qr_args[1], qr_ecl=qr_args[2])
+        results = pool.imap(forward, rows)
+    elif args.workers > 1:
+        # Workers buffer their stage timings and send them back with each row
+        from multiprocessing import Pool
 
-        # Render and save
-        doc.render(context)
-        output_doc = f"docs/{name}.docx"
-        doc.save(output_doc)
-        print(f"Saved {output_doc}")
+        pool = Pool(args.workers, initializer=init_worker,
+                    initargs=init_args + (bool(args.profile), args.qr_format) + qr_args + (bool(args.book),))
+        results = pool.imap(render_row, rows, chunksize=4)
+    else:
+        init_worker(*init_args, False, args.qr_format, *qr_args, bool(args.book))
+        results = map(render_row, rows)
+
+    # --profile: opened after the pool is started so workers do not inherit the file
+    tracing.configure(args.profile, args.profile_format)
+
+    # --archive: documents go from memory into the archive, in CSV order
+    archive = ArchiveWriter(args.archive) if args.archive else None
+
+    # --book: every row is appended to one document as it arrives, in CSV order;
+    # compiled rows come as unzipped parts over the template package
+    book = template_zip = None
+    if args.book:
+        import zipfile
+        from docxmerge import DOCUMENT_ERRORS, DocxMerger
+        from docxzip import PackageParts
+
+        template_zip = zipfile.ZipFile(template_file)
+        book = DocxMerger(args.book)
+
+    completed = False
+    try:
+        for index, name, data, error, stats, events in results:
+            for k, v in stats.items():
+                cache_stats[k] += v
+            tracing.add_events(events)
+            if error:
+                failures.append((index, name, error))
+                print(f"❌ Row {index + 1} ({name}): {error}")
+                if plan:
+                    plan.forget(index, name)
+                continue
+            if book:
+                try:
+                    with span("book_append", name):
+                        if isinstance(data, dict):
+                            book.append_package(name, PackageParts(data, template_zip))
+                        else:
+                            book.append(f"{name}.docx", data)
+                except DOCUMENT_ERRORS as e:
+                    # The row rendered to a broken document; leave it out of the book
+                    failures.append((index, name, f"{type(e).__name__}: {e}"))
+                    print(f"❌ Row {index + 1} ({name}): {type(e).__name__}: {e}")
+                    continue
+                saved += 1
+                print(f"Added {name} to {args.book}")
+                continue
+            with span("write", name) as ev:
+                if archive:
+                    output_doc = f"{args.archive}:{archive.add(f'{name}.docx', data, key=name)}"
+                else:
+                    output_doc = f"docs/{name}.docx"
+                    with open(output_doc, "wb") as fh:
+                        fh.write(data)
+                ev["bytes"] = len(data)
+            saved += 1
+            if plan:
+                plan.record(index, name)
+            print(f"Saved {output_doc}")
+        completed = True
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if plan:
+            plan.finish(completed)
+        if archive:
+            archive.close(completed)
+        if book:
+            template_zip.close()
+            if completed and saved:
+                book.close()
+            else:
+                book.abort()
+
+    # --book: the single output document, optionally converted to PDF
+    pdf_failed = False
+    if book and completed and saved:
+        stats = book.stats
+        print(f"✅ Book saved as {args.book}: {stats['documents']} rows, "
+              f"{stats['media_deduplicated']} duplicate images stored once, "
+              f"{os.path.getsize(args.book) / 1024:.0f} KB")
+        if book.style_conflicts:
+            print(f"⚠️ Styles defined differently by later rows, first row's kept: "
+                  f"{', '.join(sorted(book.style_conflicts))}")
+        if args.pdf:
+            from DocxToPdf import convert_files
+
+            try:
+                pdf_failed = bool(convert_files([args.book], "final"))
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                pdf_failed = True
+            if not pdf_failed:
+                print(f"✅ PDF saved as final/{os.path.splitext(os.path.basename(args.book))[0]}.pdf")
+
+    # Report how often the prepared logo was reused (workers keep their own caches)
+    if not pool:
+        from logocache import cache_info
+
+        info = cache_info()
+        print(f"Logo cache: {info['hits']} hits, {info['misses']} misses")
+
+    # Report QR cache effectiveness across all workers
+    if args.cache_dir:
+        print(qrcache.format_stats(cache_stats))
+
+    # Slowest stages and rows of a --profile run
+    tracing.finish()
+
+    # Summary of failed rows
+    print(f"Done: {saved} saved, {len(failures)} failed")
+    for index, name, error in failures:
+        print(f"  Row {index + 1} ({name}): {error}")
+    if pdf_failed:
+        print(f"  PDF conversion of {args.book} failed")
+    if failures or pdf_failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
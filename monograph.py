@@ -1,12 +1,18 @@
 import sys
 import os
-import pandas as pd
-import requests
-from io import BytesIO
-from docx import Document
-from docx.shared import Inches
-from PIL import Image
+import re
+from copy import deepcopy
 from io import BytesIO
+import argparse
+import imagecache
+import tracing
+from tracing import span
+from csvrows import read_rows
+from buildmanifest import BuildManifest, fingerprint, optional_file_hash
+from outputnames import NameAllocator
+from docarchive import ARCHIVE_EXTENSIONS, ArchiveWriter, is_archive
+
+PLACEHOLDER_RE = re.compile(r"\{\{.+?\}\}")
 
 
 def get_unique_folder(base_folder):
@@ -24,23 +30,6 @@ def get_unique_folder(base_folder):
     return folder
 
 
-def get_unique_filename(folder, filename):
-    """
-    Ensure the file name is unique within the output folder.
-    If 'file.docx' exists, save as 'file(1).docx', then 'file(2).docx', etc.
-    """
-    base, ext = os.path.splitext(filename)
-    if not ext:  # If no extension is given, default to .docx
-        ext = ".docx"
-    unique_name = base + ext
-    counter = 1
-    # Keep checking until a free name is available
-    while os.path.exists(os.path.join(folder, unique_name)):
-        unique_name = f"{base}({counter}){ext}"
-        counter += 1
-    return unique_name
-
-
 def fetch_image(filename, image_folder="images"):
     """
     Fetch an image from a local folder by filename.
@@ -54,147 +43,473 @@ def fetch_image(filename, image_folder="images"):
         return None
 
 
+def add_image(paragraph, value):
+    """
+    Append the image named in the 'image' column to a paragraph.
+    Returns None on success, or the text to show instead of the image.
+    """
+    img_path = fetch_image(str(value).strip())
+    if not img_path:
+        return "[Image fetch failed]"
+    valid_exts = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+    if not img_path.lower().endswith(valid_exts):
+        print(f"❌ Skipping unsupported image format: {img_path}")
+        return "[Unsupported image format]"
+    try:
+        print(f"👉 Checking image: {img_path}")
+        # Converted once per source file to the 1.5 in box at 300 DPI (see imagecache.py)
+        with span("image_prepare") as ev:
+            data = imagecache.get_cache().get(img_path)
+            ev["bytes"] = len(data)
+        with span("image_embed"):
+            from docx.shared import Inches
+
+            run = paragraph.add_run()
+            run.add_picture(BytesIO(data), width=Inches(imagecache.TARGET_WIDTH_IN))
+    except Exception as e:
+        print(f"❌ Invalid image file skipped: {img_path}")
+        import traceback
+        traceback.print_exc()
+        return "[Invalid image file]"
+    return None
+
+
+def replace_in_cell(cell, row_data):
+    """
+    Replace the placeholders of one table cell.
+    Placeholders are written like {{column_name}} in the template.
+
+    - For text columns: replace {{col}} with the value.
+    - For 'image' column: insert the image from the images folder.
+    """
+    text = cell.text  # Joining the runs is costly; only re-read after a change
+    for col, value in row_data.items():
+        placeholder = f"{{{{{col}}}}}"  # Placeholder format e.g. {{name}}
+        if placeholder in text:
+            if col.lower() == "image":
+                cell.text = ""  # Clear placeholder text
+                error = add_image(cell.paragraphs[0], value)
+                if error:
+                    cell.text = error
+            else:
+                # Replace text placeholders
+                cell.text = text.replace(placeholder, str(value))
+            text = cell.text
+
+
+def replace_in_paragraph(para, row_data):
+    """
+    Replace the placeholders of one paragraph (outside of tables).
+    """
+    text = para.text
+    for col, value in row_data.items():
+        placeholder = f"{{{{{col}}}}}"
+        if placeholder in text:
+            if col.lower() == "image":
+                # Insert image inline instead of text
+                para.clear()  # Clear existing text
+                error = add_image(para, value)
+                if error:
+                    para.add_run(error)
+            else:
+                para.text = text.replace(placeholder, str(value))
+            text = para.text
+
+
 def replace_placeholders_in_table(doc, row_data):
     """
     Replace placeholders inside all tables of the document.
-    Placeholders are written like {column_name} in the template.
-    
-    - For text columns: replace {col} with the value.
-    - For 'image' column: fetch the image from Google Drive and insert it.
     """
     for table in doc.tables:
         for row in table.rows:
             for cell in row.cells:
-                for col, value in row_data.items():
-                    placeholder = f"{{{{{col}}}}}"  # Placeholder format e.g. {{name}}
-                    if placeholder in cell.text:
-                        if col.lower() == "image":
-                            # Replace with image from Drive
-                            img_path = fetch_image(str(value).strip())
-                            cell.text = ""  # Clear placeholder text
-                            if img_path:
-                                valid_exts = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
-                                if img_path.lower().endswith(valid_exts):
-                                    try:
-                                        print(f"👉 Checking image: {img_path}")
-                                        with Image.open(img_path) as im:
-                                            im.verify()
-                                        with Image.open(img_path) as im:
-                                            buf = BytesIO()
-                                            if img_path.lower().endswith(".webp"):
-                                                print(f"🔄 Converting unsupported format to JPEG: {img_path}")
-                                                rgb_im = im.convert("RGB")
-                                                rgb_im.save(buf, format="JPEG")
-                                            else:
-                                                im.save(buf, format=im.format)
-                                            buf.seek(0)
-                                        run = cell.paragraphs[0].add_run()
-                                        run.add_picture(buf, width=Inches(1.5))
-                                    except Exception as e:
-                                        print(f"❌ Invalid image file skipped: {img_path}")
-                                        import traceback
-                                        traceback.print_exc()
-                                        cell.text = "[Invalid image file]"
-                                        continue
-                                else:
-                                    print(f"❌ Skipping unsupported image format: {img_path}")
-                                    cell.text = "[Unsupported image format]"
-                            else:
-                                cell.text = "[Image fetch failed]"
-                        else:
-                            # Replace text placeholders
-                            cell.text = cell.text.replace(placeholder, str(value))
-
-
-def fill_template(template_path, csv_path, output_folder="monographs"):
+                replace_in_cell(cell, row_data)
+
+
+def replace_placeholders_in_paragraphs(doc, row_data):
+    """
+    Replace placeholders in normal paragraphs (outside of tables).
+    """
+    for para in doc.paragraphs:
+        replace_in_paragraph(para, row_data)
+
+
+def replace_placeholders(doc, row_data):
+    """
+    Replace placeholders anywhere in a loaded document (scans every paragraph and cell).
+    """
+    replace_placeholders_in_paragraphs(doc, row_data)
+    replace_placeholders_in_table(doc, row_data)
+
+
+def package_parts(doc):
+    """
+    Return the parts python-docx would save for doc as {zip name: bytes} (the same
+    parts, relationships and content types as Document.save), without zipping them.
+    """
+    from docx.opc.pkgwriter import _ContentTypesItem
+
+    package = doc.part.package
+    parts = list(package.parts)
+    for part in parts:
+        part.before_marshal()
+    files = {"[Content_Types].xml": _ContentTypesItem.from_parts(parts).blob,
+             "_rels/.rels": package.rels.xml}
+    for part in parts:
+        files[part.partname.lstrip("/")] = part.blob
+        if len(part.rels):
+            files[part.partname.rels_uri.lstrip("/")] = part.rels.xml
+    return files
+
+
+class MonographTemplate(object):
+    """
+    The monograph template loaded and scanned once, filled once per CSV row.
+
+    Scanning records which body paragraphs and table cells contain a {{...}}
+    placeholder (matched on the paragraph/cell text, so placeholders split across
+    runs are found; merged cells are recorded once). Filling a row restores the
+    pristine body and only visits those locations, so the cost per row no longer
+    grows with cells x columns.
+    """
+
+    def __init__(self, template_path):
+        from docx import Document  # imported here so --help does not load python-docx
+
+        self.doc = Document(template_path)
+        self._body = [deepcopy(child) for child in self.doc.element.body]
+        self._rels = set(self.doc.part.rels)
+        self._image_parts = list(self.doc.part.package.image_parts)
+        self.paragraphs = []  # indexes into doc.paragraphs
+        self.cells = []       # (table, row, column) indexes into doc.tables
+        for i, para in enumerate(self.doc.paragraphs):
+            if PLACEHOLDER_RE.search(para.text):
+                self.paragraphs.append(i)
+        for t, table in enumerate(self.doc.tables):
+            seen = set()
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    if cell._tc in seen:  # merged cell already visited
+                        continue
+                    seen.add(cell._tc)
+                    if PLACEHOLDER_RE.search(cell.text):
+                        self.cells.append((t, r, c))
+
+    def fill(self, row_data, output_file):
+        """
+        Save a copy of the template filled with row_data to output_file (a path or
+        a file object). With output_file=None the filled package is returned
+        unzipped instead (see package_parts).
+        """
+        with span("template_restore"):
+            body = self.doc.element.body
+            for child in list(body):
+                body.remove(child)
+            body.extend(deepcopy(child) for child in self._body)
+        try:
+            with span("replace_placeholders"):
+                paragraphs = self.doc.paragraphs
+                for i in self.paragraphs:
+                    replace_in_paragraph(paragraphs[i], row_data)
+                tables = self.doc.tables
+                for t, r, c in self.cells:
+                    replace_in_cell(tables[t].rows[r].cells[c], row_data)
+            if output_file is None:
+                with span("docx_parts"):
+                    return package_parts(self.doc)
+            with span("docx_save") as ev:
+                self.doc.save(output_file)
+                if isinstance(output_file, str):
+                    ev["bytes"] = os.path.getsize(output_file)
+        finally:
+            # Drop the images of this row so they are not saved with the next one
+            rels = self.doc.part.rels
+            for r_id in set(rels) - self._rels:
+                rels.pop(r_id)
+                rels.related_parts.pop(r_id, None)
+            self.doc.part.package.image_parts._image_parts[:] = self._image_parts
+
+
+# Template of the current process, loaded once by init_worker
+_worker_template = None
+
+
+def init_worker(template_path, profile=False):
+    """
+    Load and index the template in the current process (a pool worker, or the main
+    process for serial builds). With profile=True (workers of a --profile run)
+    stage timings are buffered and returned with each row.
+    """
+    global _worker_template
+    if profile:
+        tracing.start_buffer()
+    _worker_template = MonographTemplate(template_path)
+
+
+def fill_row(task):
+    """
+    Fill and save one monograph.
+
+    Parameters:
+    - task (tuple): (row index, row dict, output file path reserved for it, mode).
+      mode is "file" (save to output file), "bytes" (return the .docx bytes, for
+      --archive) or "parts" (return the unzipped parts, for --book); in the last
+      two nothing is written and output file is only the name the row asked for.
+
+    Returns:
+    - tuple: (index, output file, docx bytes / parts dict or None, error message or
+      None, image cache stats, profile events). Errors are returned instead of raised so one bad
+      row does not stop the batch; a partly written file is removed.
+    """
+    index, row_data, output_file, mode = task
+    cache = imagecache.get_cache()
+    before = dict(cache.stats)
+    data = None
+    with tracing.row(os.path.basename(output_file)):
+        try:
+            if mode == "parts":
+                data = _worker_template.fill(row_data, None)
+            elif mode == "bytes":
+                buffer = BytesIO()
+                _worker_template.fill(row_data, buffer)
+                data = buffer.getvalue()
+            else:
+                _worker_template.fill(row_data, output_file)
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if mode == "file" and os.path.exists(output_file):
+                os.remove(output_file)
+    stats = {k: v - before[k] for k, v in cache.stats.items()}
+    return index, output_file, data, error, stats, tracing.take_events()
+
+
+def fill_template(template_path, csv_path, output_folder="monographs", incremental=False,
+                  csv_backend="csv", workers=1, archive=None, book=None, pdf=False):
     """
     Main function:
-    - Reads the CSV data.
+    - Streams the CSV rows (see csvrows.py).
     - Creates a unique output folder (monographs, monographs1, etc.).
+    - Loads the template once and indexes its placeholders (MonographTemplate).
     - For each row in the CSV:
-        * Load the template
-        * Replace placeholders with row values
+        * Replace the indexed placeholders with row values
         * Save the filled document with the filename from the CSV
+
+    With incremental=True the same output folder is reused: rows whose values,
+    template and image are unchanged since the last run are skipped, and documents
+    of rows removed from the CSV are deleted (see buildmanifest.py).
+
+    With workers > 1 the rows are filled in that many processes. Output names are
+    still reserved here, in CSV order, so they are the same as in a serial run.
+
+    With archive (a .zip/.tar path) no folder is created: each document is written
+    from memory into the archive, with a manifest entry (see docarchive.py).
+
+    With book (a .docx path) every monograph is appended to that one document, a
+    page break between rows, as its parts arrive (see docxmerge.py); pdf=True then
+    converts the book to PDF in the 'final' folder.
+
+    Returns the list of failed rows as (row number, file name, error message).
     """
-    # Load CSV into DataFrame
-    df = pd.read_csv(csv_path)
+    if archive:
+        # Names are given out by the archive, in CSV order, as documents arrive
+        writer = ArchiveWriter(archive)
+        manifest = None
+        names = None
+    elif book:
+        from docxmerge import DOCUMENT_ERRORS, DocxMerger
+        from docxzip import PackageParts
 
-    # Create a unique output folder
-    output_folder = get_unique_folder(output_folder)
+        merger = DocxMerger(book)
+        manifest = None
+        names = None
+    elif incremental:
+        # Reuse the output folder and name files from the CSV alone
+        os.makedirs(output_folder, exist_ok=True)
+        manifest = BuildManifest(output_folder)
+        names = NameAllocator(output_folder, taken=set())
+        template_hash = optional_file_hash(template_path)
+        image_settings = (imagecache.get_cache().width_px, imagecache.CACHE_VERSION)
+    else:
+        # Create a unique output folder
+        output_folder = get_unique_folder(output_folder)
+        manifest = None
+        names = NameAllocator(output_folder)
 
-    # Ensure filename column exists in CSV
-    if "filename" not in df.columns:
-        raise ValueError("CSV must have a column named 'filename' for output file names.")
+    fingerprints = {}  # row index -> fingerprint, until the row is saved
+    counts = {"total": 0}
 
-    # Process each row of the CSV
-    for _, row in df.iterrows():
-        doc = Document(template_path)
-        replace_placeholders(doc, row.to_dict())
+    def tasks():
+        """
+        Yield (index, row, output file) for every row that needs to be built.
+        """
+        for index, row_data in enumerate(read_rows(csv_path, csv_backend)):
+            # Ensure filename column exists in CSV
+            if "filename" not in row_data:
+                raise ValueError("CSV must have a column named 'filename' for output file names.")
+            counts["total"] += 1
 
-        # Generate safe file name
-        raw_filename = str(row["filename"]).strip()
-        unique_filename = get_unique_filename(output_folder, raw_filename)
-        output_file = os.path.join(output_folder, unique_filename)
+            # Generate safe file name
+            raw_filename = str(row_data["filename"]).strip()
+            if archive or book:
+                yield index, row_data, raw_filename, "bytes" if archive else "parts"
+                continue
+            unique_filename = names.allocate(raw_filename)
+            output_file = os.path.join(output_folder, unique_filename)
 
-        # Save the filled document
-        doc.save(output_file)
-        print(f"✅ Saved: {output_file}")
+            if incremental:
+                image_hash = None
+                if "image" in row_data:
+                    image_hash = optional_file_hash(os.path.join("images", str(row_data["image"]).strip()))
+                fp = fingerprint(row_data, template_hash, image_hash, image_settings)
+                if manifest.is_current(unique_filename, fp):
+                    continue
+                fingerprints[index] = fp
+            yield index, row_data, output_file, "file"
 
-def replace_placeholders_in_paragraphs(doc, row_data):
-    """
-    Replace placeholders in normal paragraphs (outside of tables).
-    """
-    for para in doc.paragraphs:
-        for col, value in row_data.items():
-            placeholder = f"{{{{{col}}}}}"
-            if placeholder in para.text:
-                if col.lower() == "image":
-                    # Insert image inline instead of text
-                    img_path = fetch_image(str(value).strip())
-                    para.clear()  # Clear existing text
-                    if img_path:
-                        valid_exts = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
-                        if img_path.lower().endswith(valid_exts):
-                            try:
-                                print(f"👉 Checking image: {img_path}")
-                                with Image.open(img_path) as im:
-                                    im.verify()
-                                with Image.open(img_path) as im:
-                                    buf = BytesIO()
-                                    if img_path.lower().endswith(".webp"):
-                                        print(f"🔄 Converting unsupported format to JPEG: {img_path}")
-                                        rgb_im = im.convert("RGB")
-                                        rgb_im.save(buf, format="JPEG")
-                                    else:
-                                        im.save(buf, format=im.format)
-                                    buf.seek(0)
-                                run = para.add_run()
-                                run.add_picture(buf, width=Inches(1.5))
-                            except Exception as e:
-                                print(f"❌ Invalid image file skipped: {img_path}")
-                                import traceback
-                                traceback.print_exc()
-                                para.add_run("[Invalid image file]")
-                                continue
-                        else:
-                            print(f"❌ Skipping unsupported image format: {img_path}")
-                            para.add_run("[Unsupported image format]")
-                    else:
-                        para.add_run("[Image fetch failed]")
-                else:
-                    para.text = para.text.replace(placeholder, str(value))
+    # Load and index the template once per process
+    pool = None
+    if workers > 1:
+        from multiprocessing import Pool
 
-def replace_placeholders(doc, row_data):
-    replace_placeholders_in_paragraphs(doc, row_data)
-    replace_placeholders_in_table(doc, row_data)
+        tracing.flush()  # workers must not inherit unwritten profile events
+        pool = Pool(workers, initializer=init_worker,
+                    initargs=(template_path, tracing.get_tracer() is not None))
+        results = pool.imap(fill_row, tasks(), chunksize=2)
+    else:
+        init_worker(template_path)
+        results = map(fill_row, tasks())
 
-if __name__ == "__main__":
-    # Expecting: python script.py template.docx data.csv
-    if len(sys.argv) < 3:
-        print("Usage: python script.py <template.docx> <data.csv>")
+    # Process each row of the CSV as it is read
+    completed = False
+    saved = 0
+    failures = []
+    image_stats = {"hits": 0, "misses": 0}
+    try:
+        for index, output_file, data, error, stats, events in results:
+            for k, v in stats.items():
+                image_stats[k] += v
+            tracing.add_events(events)
+            unique_filename = os.path.basename(output_file)
+            if error:
+                failures.append((index + 1, unique_filename, error))
+                print(f"❌ Row {index + 1} ({unique_filename}): {error}")
+                if incremental:
+                    fingerprints.pop(index, None)
+                    manifest.forget(unique_filename)
+                continue
+            if archive:
+                with span("write", unique_filename) as ev:
+                    output_file = f"{archive}:{writer.add(unique_filename, data, key=unique_filename)}"
+                    ev["bytes"] = len(data)
+            elif book:
+                try:
+                    with span("book_append", unique_filename):
+                        merger.append_package(unique_filename, PackageParts(data))
+                except DOCUMENT_ERRORS as e:
+                    # The row filled to a broken document; leave it out of the book
+                    failures.append((index + 1, unique_filename, f"{type(e).__name__}: {e}"))
+                    print(f"❌ Row {index + 1} ({unique_filename}): {type(e).__name__}: {e}")
+                    continue
+                output_file = f"{book}:{unique_filename}"
+            saved += 1
+            if incremental:
+                manifest.record(unique_filename, fingerprints.pop(index))
+            print(f"✅ Saved: {output_file}")
+        completed = True
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if archive:
+            writer.close(completed)
+        if book:
+            if completed and saved:
+                merger.close()
+            else:
+                merger.abort()
+        if incremental:
+            # Only drop documents of deleted rows after a full pass over the CSV
+            removed = manifest.remove_stale(names.names) if completed else []
+            for name in removed:
+                print(f"🗑️ Removed: {os.path.join(output_folder, name)}")
+            manifest.save()
+            print(f"Incremental build: {saved + len(failures)} of {counts['total']} rows changed, "
+                  f"{len(removed)} removed")
+    print(imagecache.format_stats(image_stats))
+
+    # --book: the single output document, optionally converted to PDF
+    if book and completed and saved:
+        print(f"✅ Book saved as {book}: {merger.stats['documents']} monographs, "
+              f"{merger.stats['media_deduplicated']} duplicate images stored once, "
+              f"{os.path.getsize(book) / 1024:.0f} KB")
+        if merger.style_conflicts:
+            print(f"⚠️ Styles defined differently by later monographs, first one's kept: "
+                  f"{', '.join(sorted(merger.style_conflicts))}")
+        if pdf:
+            from DocxToPdf import convert_files
+
+            try:
+                error = "PDF conversion failed" if convert_files([book], "final") else None
+            except RuntimeError as e:
+                error = str(e)
+            if error:
+                failures.append((0, book, error))
+            else:
+                print(f"✅ PDF saved as final/{os.path.splitext(os.path.basename(book))[0]}.pdf")
+
+    # Summary of failed rows
+    print(f"Done: {saved} saved, {len(failures)} failed")
+    for row_number, name, error in failures:
+        print(f"  Row {row_number} ({name}): {error}" if row_number else f"  {name}: {error}")
+    return failures
+
+
+def main():
+    # Expecting: python monograph.py template.docx data.csv [--incremental] [--workers N]
+    #            [--archive out.zip | --book out.docx [--pdf]] [--profile [FILE]]
+    parser = argparse.ArgumentParser(description="Fill the monograph template for every row of a CSV file.")
+    parser.add_argument("template_path", help="Word template with {{column}} placeholders")
+    parser.add_argument("csv_path", help="CSV file with a 'filename' column")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Reuse monographs/ and only rebuild rows that changed")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes filling rows in parallel (default 1)")
+    parser.add_argument("--archive", metavar="FILE",
+                        help="Write the monographs into one .zip or .tar archive (with a manifest) "
+                             "instead of a monographs folder")
+    parser.add_argument("--book", metavar="FILE",
+                        help="Write all monographs into one .docx, a page break between rows, "
+                             "instead of a monographs folder")
+    parser.add_argument("--pdf", action="store_true",
+                        help="With --book: also convert the book to PDF in the 'final' folder")
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+    if args.archive and not is_archive(args.archive):
+        parser.error(f"--archive must end in {', '.join(ARCHIVE_EXTENSIONS)}")
+    if args.archive and args.incremental:
+        parser.error("--incremental works on the monographs folder and cannot be combined with --archive")
+    if args.book and (args.archive or args.incremental or not args.book.lower().endswith(".docx")):
+        parser.error("--book needs a .docx file name and cannot be combined with --archive or --incremental")
+    if args.pdf and not args.book:
+        parser.error("--pdf converts the --book document; use DocxToPdf.py for a folder")
+    if args.pdf:
+        # Check for a PDF converter before filling, not after the book is written
+        from DocxToPdf import resolve_backend
+
+        try:
+            resolve_backend()
+        except RuntimeError as e:
+            parser.error(f"--pdf: {e}")
+
+    tracing.configure(args.profile, args.profile_format)
+    failures = fill_template(args.template_path, args.csv_path, "monographs",
+                             incremental=args.incremental, workers=args.workers, archive=args.archive,
+                             book=args.book, pdf=args.pdf)
+    tracing.finish()
+    if failures:
         sys.exit(1)
 
-    template_path = sys.argv[1]
-    csv_path = sys.argv[2]
 
-    fill_template(template_path, csv_path, "monographs")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
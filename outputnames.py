@@ -0,0 +1,47 @@
+"""
+outputnames.py
+--------------
+Unique output file names for batch runs (monograph.py, and documents written into
+archives by main.py and monograph.py).
+"""
+import os
+
+
+class NameAllocator(object):
+    """
+    Reserves unique output file names up front from one listing of the output
+    folder: if 'file.docx' is taken, 'file(1).docx', then 'file(2).docx', etc.
+
+    Names are handed out by the process reading the CSV before rows are sent to
+    workers, so parallel builds get the same names as a serial run without racing
+    on the file system. The next counter tried for each base name is remembered, so
+    many duplicates of a name do not probe all earlier ones again.
+    """
+
+    def __init__(self, folder=None, taken=None):
+        # With a set of taken names (incremental builds, archives) the folder is not
+        # listed: names then depend on the CSV alone
+        if taken is None:
+            taken = set(os.listdir(folder)) if folder else set()
+        self.names = taken
+        self._next = {}  # base name + extension -> next counter to try
+
+    def allocate(self, filename):
+        """
+        Return a free name for filename (.docx added if it has no extension) and reserve it.
+        """
+        base, ext = os.path.splitext(filename)
+        if not ext:  # If no extension is given, default to .docx
+            ext = ".docx"
+        unique_name = base + ext
+        counter = self._next.get(unique_name, 1)
+        if unique_name in self.names:
+            unique_name = f"{base}({counter}){ext}"
+        # Keep checking until a free name is available
+        while unique_name in self.names:
+            counter += 1
+            unique_name = f"{base}({counter}){ext}"
+        if unique_name != base + ext:
+            self._next[base + ext] = counter + 1
+        self.names.add(unique_name)
+        return unique_name
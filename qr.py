@@ -1,44 +1,36 @@
-import qrcode
-from qrcode import constants
-from qrcode.image.styledpil import StyledPilImage
-from qrcode.image.styles.moduledrawers import CircleModuleDrawer
-from qrcode.image.styles.colormasks import SolidFillColorMask
+from qrmatrix import encode
 from PIL import Image
+from qrraster import rasterize_circles
+from qrcache import cached_png
+from io import BytesIO
 import sys, os
 
-def generate_simple_qr(url, size_cm=4):
+def generate_simple_qr(url, size_cm=4, version=None, ecl="H"):
     """
     Generate a sharp QR code (no logo) at exact size (cm) for 300 DPI print.
+    version and ecl set the smallest QR version and the error correction level
+    (see qrplan.py).
     """
     # Target pixels for given cm at 300 DPI
     target_px = int(size_cm / 2.54 * 300)
 
     # Make QR
-    qr = qrcode.QRCode(
-        version=None,
-        error_correction=constants.ERROR_CORRECT_H,
-        box_size=1,   # start small
-        border=4,
-    )
-    qr.add_data(url)
-    qr.make(fit=True)
+    return draw_simple_qr(encode(url, version, ecl), target_px)
 
+
+def draw_simple_qr(matrix, target_px):
+    """
+    The drawing half of generate_simple_qr, for an already encoded QRMatrix (see qrmatrix.py).
+    """
     # Find how many modules wide the QR is
-    num_modules = qr.modules_count + 2 * qr.border
+    num_modules = matrix.total
 
     # Compute best box_size to reach ~target_px
     box_size = max(1, target_px // num_modules)
-    qr.box_size = box_size  # adjust dynamically
 
     # Rebuild image
-    img = qr.make_image(
-        image_factory=StyledPilImage,
-        module_drawer=CircleModuleDrawer(),
-        color_mask=SolidFillColorMask(
-            front_color=(0, 0, 0),
-            back_color=(255, 255, 255)
-        )
-    ).convert("RGB")
+    img = rasterize_circles(matrix.modules, box_size, (0, 0, 0), (255, 255, 255), matrix.border,
+                            matrix.layout)
 
     # Final size in pixels
     final_px = img.size[0]
@@ -57,7 +49,9 @@ def main():
     output_file = sys.argv[1] + ".jpg"
     url = sys.argv[2]
 
-    img = generate_simple_qr(url)
+    # Rendered PNG, reused from the QR cache when QR_CACHE_DIR is set
+    data = cached_png(lambda: generate_simple_qr(url), url, "simple", size=4)
+    img = Image.open(BytesIO(data))
 
     # Save as JPEG with DPI
     img.save(output_file, format="JPEG", dpi=(300, 300), quality=95, optimize=True)
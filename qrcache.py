@@ -0,0 +1,256 @@
+"""
+qrcache.py
+----------
+Content-addressed on-disk cache for rendered QR code images.
+
+Each entry is the final PNG of one QR code, stored under a SHA-256 of everything
+that affects its pixels: payload, style (its name, colors and size, so a style
+registered again with other colors gets new entries), logo file contents, size,
+DPI, error correction level and render mode. Entries are evicted least-recently-used once the
+cache grows past its size cap (a hit refreshes the file's modification time).
+
+The cache is enabled by setting the QR_CACHE_DIR environment variable (optionally
+QR_CACHE_MAX_MB) or by main.py's --cache-dir option. Maintenance:
+
+    python qrcache.py stats
+    python qrcache.py prune --max-mb 200
+    python qrcache.py clear
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+from io import BytesIO
+
+from tracing import span
+
+DEFAULT_MAX_MB = 500
+
+_file_hashes = {}
+_default_cache = None
+
+
+def file_hash(path):
+    """
+    Return the SHA-256 hex digest of a file, memoized on (path, mtime, size).
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    digest = _file_hashes.get(key)
+    if digest is None:
+        with open(path, "rb") as fh:
+            digest = hashlib.sha256(fh.read()).hexdigest()
+        _file_hashes[key] = digest
+    return digest
+
+
+class QRCache(object):
+    """
+    Directory of PNG files named by content key, with an LRU size cap.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._total_bytes = None  # computed lazily on first write
+
+    def key(self, payload, style, logo_path=None, size=None, dpi=300,
+            error_correction="H", render="legacy", version=None):
+        """
+        Return the cache key for one rendered QR code. style is a style name or a
+        styles.Style, whose fields then all go into the key.
+        """
+        if isinstance(style, tuple):
+            logo_path = logo_path or style.logo_path
+            style = repr((style.name, style.front_color, style.back_color, style.final_size,
+                          style.output_format))
+        logo = file_hash(logo_path) if logo_path else ""
+        fields = (str(payload), style, logo, str(size), str(dpi), error_correction, render)
+        if version:
+            # Only added when set, so keys of best-fit codes stay the same
+            fields += (f"v{version}",)
+        return hashlib.sha256("\0".join(fields).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".png")
+
+    def get(self, key):
+        """
+        Return the cached PNG bytes for key, or None.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                data = fh.read()
+        except OSError:
+            self.stats["misses"] += 1
+            return None
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats["hits"] += 1
+        return data
+
+    def put(self, key, data):
+        """
+        Store PNG bytes under key (atomically), evicting old entries if over the cap.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+        else:
+            self._total_bytes += len(data)
+        if self._total_bytes > self.max_bytes:
+            self.prune()
+
+    def _entries(self):
+        """
+        Yield (path, size, mtime) for every cached file.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".png"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def prune(self, max_bytes=None):
+        """
+        Delete least recently used entries until the cache is at most max_bytes
+        (default: the cache's own cap). Returns the number of files removed.
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._total_bytes = total
+        self.stats["evictions"] += removed
+        return removed
+
+    def clear(self):
+        """
+        Delete every cached entry. Returns the number of files removed.
+        """
+        return self.prune(0)
+
+    def usage(self):
+        """
+        Return (number of entries, total bytes) currently on disk.
+        """
+        entries = list(self._entries())
+        return len(entries), sum(size for _, size, _ in entries)
+
+    def summary(self):
+        """
+        One-line hit/miss summary for the end of a batch.
+        """
+        return format_stats(self.stats)
+
+
+def format_stats(stats):
+    """
+    Format a {'hits', 'misses', 'evictions'} dict as a one-line summary.
+    """
+    lookups = stats["hits"] + stats["misses"]
+    rate = 100.0 * stats["hits"] / lookups if lookups else 0.0
+    return (f"QR cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({rate:.0f}% hit rate), {stats['evictions']} evicted")
+
+
+def configure(directory, max_mb=DEFAULT_MAX_MB):
+    """
+    Enable the default cache in directory (None disables it). Returns the cache.
+    """
+    global _default_cache
+    _default_cache = QRCache(directory, int(max_mb * 1024 * 1024)) if directory else None
+    return _default_cache
+
+
+def get_cache():
+    """
+    Return the default cache, configured from QR_CACHE_DIR on first use, or None.
+    """
+    global _default_cache
+    if _default_cache is None and os.environ.get("QR_CACHE_DIR"):
+        configure(os.environ["QR_CACHE_DIR"], float(os.environ.get("QR_CACHE_MAX_MB", DEFAULT_MAX_MB)))
+    return _default_cache
+
+
+def cached_png(render_fn, payload, style, logo_path=None, size=None, dpi=300,
+               error_correction="H", render="legacy", version=None):
+    """
+    Return the PNG bytes of a QR code, from the default cache when it is enabled.
+
+    render_fn() is only called on a cache miss and must return the PIL image; the
+    PNG is saved with the given DPI.
+    """
+    cache = get_cache()
+    key = None
+    if cache:
+        with span("qr_cache_lookup"):
+            key = cache.key(payload, style, logo_path, size, dpi, error_correction, render, version)
+            data = cache.get(key)
+        if data is not None:
+            return data
+
+    image = render_fn()
+    with span("png_encode") as ev:
+        buf = BytesIO()
+        image.save(buf, format="PNG", dpi=(dpi, dpi))
+        data = buf.getvalue()
+        ev["bytes"] = len(data)
+    if cache:
+        cache.put(key, data)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clean the on-disk QR image cache.")
+    parser.add_argument("command", choices=("stats", "prune", "clear"))
+    parser.add_argument("--dir", default=os.environ.get("QR_CACHE_DIR"),
+                        help="Cache directory (default: $QR_CACHE_DIR)")
+    parser.add_argument("--max-mb", type=float,
+                        default=float(os.environ.get("QR_CACHE_MAX_MB", DEFAULT_MAX_MB)),
+                        help="Size cap in MB used by 'prune'")
+    args = parser.parse_args()
+
+    if not args.dir:
+        print("Error: pass --dir or set QR_CACHE_DIR")
+        sys.exit(1)
+
+    cache = QRCache(args.dir, int(args.max_mb * 1024 * 1024))
+    if args.command == "stats":
+        count, total = cache.usage()
+        print(f"{args.dir}: {count} entries, {total / (1024 * 1024):.1f} MB")
+    elif args.command == "prune":
+        print(f"Removed {cache.prune()} entries")
+    else:
+        print(f"Removed {cache.clear()} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+qrclient.py
+-----------
+Thin client for qrserver.py, used by the CLIs to forward work to a running server.
+
+The server address comes from $QR_SERVER (default http://127.0.0.1:8765); set
+QR_SERVER=off to always render locally. When no server answers, available()
+returns False after one quick connection attempt and the CLIs render as before.
+
+Only the standard library is imported here (http.client on first use), so
+checking for the server costs next to nothing when it is not running.
+"""
+import json
+import os
+from urllib.parse import urlsplit
+
+DEFAULT_SERVER = "http://127.0.0.1:8765"
+PROBE_TIMEOUT = 0.3   # seconds to wait for /health
+RENDER_TIMEOUT = 300  # seconds to wait for a render
+
+_health = None
+
+
+class ServerError(Exception):
+    """
+    The server answered with an error (message from its JSON body).
+    """
+
+
+def server_address():
+    """
+    Return (host, port) of the configured server, or None if forwarding is off.
+    """
+    value = os.environ.get("QR_SERVER", DEFAULT_SERVER).strip()
+    if not value or value.lower() in ("0", "off", "no", "false"):
+        return None
+    parts = urlsplit(value if "://" in value else "http://" + value)
+    return parts.hostname or "127.0.0.1", parts.port or 80
+
+
+def _request(method, path, payload=None, timeout=RENDER_TIMEOUT):
+    """
+    Send one request; return (status, content type, body bytes).
+    """
+    import http.client
+
+    host, port = server_address()
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.getheader("Content-Type", ""), response.read()
+    finally:
+        conn.close()
+
+
+def health():
+    """
+    Return the server's /health answer as a dict, or {} if no server is running
+    (checked once per process).
+    """
+    import http.client
+
+    global _health
+    if _health is None:
+        _health = {}
+        if server_address():
+            try:
+                status, _, data = _request("GET", "/health", timeout=PROBE_TIMEOUT)
+                if status == 200:
+                    _health = json.loads(data)
+            except (OSError, ValueError, http.client.HTTPException):
+                pass
+    return _health
+
+
+def available():
+    """
+    True if a server answers GET /health.
+    """
+    return bool(health())
+
+
+def _post(path, payload):
+    status, content_type, data = _request("POST", path, payload)
+    if status != 200:
+        try:
+            message = json.loads(data)["error"]
+        except (ValueError, KeyError, TypeError):
+            message = data.decode("utf-8", "replace")[:200]
+        raise ServerError(message)
+    return data
+
+
+def render_qr(url, style, qr_format="png", render="legacy", version=None, ecl="H", compact_urls=""):
+    """
+    Return the PNG/SVG bytes of a QR code rendered by the server.
+    """
+    return _post("/qr", {"url": url, "style": style, "format": qr_format, "render": render,
+                         "version": version, "ecl": ecl, "compact_urls": compact_urls})
+
+
+def render_document(template_file, row, style, engine="compiled", render="legacy", qr_format="png",
+                    version=None, ecl="H", compact_urls=""):
+    """
+    Return the .docx bytes of the template filled with row by the server.
+    """
+    return _post("/document", {"template": os.path.abspath(template_file), "row": row, "style": style,
+                               "engine": engine, "render": render, "qr_format": qr_format,
+                               "version": version, "ecl": ecl, "compact_urls": compact_urls})
+
+
+def metrics():
+    """
+    Return the server's /metrics as a dict.
+    """
+    _, _, data = _request("GET", "/metrics")
+    return json.loads(data)
@@ -0,0 +1,280 @@
+"""
+qrmatrix.py
+-----------
+Encode once, render many.
+
+Each generator used to run qrcode's encoding (version search, error correction,
+mask selection) and a full styled render for every image it produced. encode() does
+the encoding once and returns a QRMatrix: the module matrix packed one bit per
+module, small enough to keep, pickle or send to a worker. Every rendition is drawn
+from it, and its padded module layout (which modules become circles and which the
+finder squares) is also worked out only once.
+
+    matrix = encode("https://example.com")
+    jignasa_png, vishwanath_jpg, thumbnail = matrix.render_many([
+        Target("jignasa", "1in", "png"),
+        Target("vishwanath", "2cm", "jpg"),
+        Target("plain", "96px", "png", dpi=96),
+    ])
+
+A target is (style, size, format, DPI): style is 'plain' (black, no logo, as qr.py)
+or a style registered in styles.py; size is pixels ("300", "300px") or a print size
+("1in", "2cm", "20mm") converted at the target's DPI; format is png, jpg or svg.
+Targets that differ only in format share one raster render.
+
+On the command line, qrtool.py qr takes the same targets as --formats:
+
+    python qrtool.py qr jignasa mycode https://example.com --formats 1in:png,vishwanath:2cm:jpg,plain:96px:png:96
+"""
+import os
+import re
+from collections import namedtuple
+from io import BytesIO
+
+import numpy as np
+
+from qrplan import BORDER, ECL_LEVELS
+from tracing import span
+
+PLAIN_STYLE = "plain"  # black circles on white, no logo (qr.generate_simple_qr)
+TARGET_FORMATS = ("png", "jpg", "svg")
+# Inches per unit of a print size
+SIZE_UNITS = {"in": 1.0, "cm": 1 / 2.54, "mm": 1 / 25.4}
+
+Target = namedtuple("Target", "style size qr_format dpi", defaults=("png", 300))
+
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(px|in|cm|mm)?\s*$", re.IGNORECASE)
+
+
+def size_to_px(size, dpi=300):
+    """
+    Return the pixel width for a size given as pixels (int, "300", "300px") or as a
+    print size ("1in", "2cm", "20mm") at dpi. Raises ValueError for other values.
+    """
+    if isinstance(size, int):
+        px = size
+    else:
+        match = _SIZE_RE.match(str(size))
+        if not match:
+            raise ValueError(f"Invalid size '{size}'. Use pixels (300px) or in/cm/mm (1in, 2cm).")
+        value, unit = float(match.group(1)), (match.group(2) or "px").lower()
+        px = value if unit == "px" else value * SIZE_UNITS[unit] * dpi
+    px = int(round(px))
+    if px < 1:
+        raise ValueError(f"Invalid size '{size}': less than one pixel.")
+    return px
+
+
+def parse_targets(value, default_style=PLAIN_STYLE):
+    """
+    Turn a comma-separated target list into Targets. Each target is
+    [style:]size[:format[:dpi]], e.g. '1in:png,vishwanath:2cm:jpg,plain:96px:png:96';
+    targets without a style use default_style.
+    """
+    import styles
+
+    targets = []
+    for spec in (value or "").split(","):
+        fields = [f.strip() for f in spec.split(":")]
+        if not fields[0]:
+            continue
+        style = default_style
+        if fields[0].lower() == PLAIN_STYLE or fields[0].lower() in styles.STYLES:
+            style = fields.pop(0).lower()
+        if not fields or len(fields) > 3:
+            raise ValueError(f"Invalid target '{spec}'. Use [style:]size[:format[:dpi]].")
+        size = fields[0]
+        if not _SIZE_RE.match(size):
+            raise ValueError(f"Invalid size or unknown style '{size}' in '{spec}'. "
+                             f"Styles: {', '.join((PLAIN_STYLE,) + tuple(styles.STYLES))}.")
+        qr_format = fields[1].lower() if len(fields) > 1 else "png"
+        if qr_format not in TARGET_FORMATS:
+            raise ValueError(f"Invalid format '{qr_format}' in '{spec}'. Use one of: {', '.join(TARGET_FORMATS)}.")
+        try:
+            dpi = int(fields[2]) if len(fields) > 2 else 300
+        except ValueError:
+            raise ValueError(f"Invalid DPI in '{spec}'.")
+        size_to_px(size, dpi)  # reject sizes below one pixel before anything is rendered
+        targets.append(Target(style, size, qr_format, dpi))
+    if not targets:
+        raise ValueError("No output targets given.")
+    return targets
+
+
+class QRMatrix(object):
+    """
+    An encoded QR code: the dark modules (without quiet zone) packed 1 bit per
+    module, plus the version and error correction level it was encoded with.
+    """
+
+    def __init__(self, modules, version, ecl="H", border=BORDER):
+        dark = np.asarray(modules, dtype=bool)
+        self.size = dark.shape[0]
+        self.version = version
+        self.ecl = ecl
+        self.border = border
+        self.packed = np.packbits(dark).tobytes()
+        self._modules = dark
+        self._layout = None
+
+    def __getstate__(self):
+        # Only the packed bits travel; the unpacked views are rebuilt on demand
+        return {"size": self.size, "version": self.version, "ecl": self.ecl,
+                "border": self.border, "packed": self.packed}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._modules = None
+        self._layout = None
+
+    @property
+    def total(self):
+        """
+        Modules per side including the quiet zone.
+        """
+        return self.size + 2 * self.border
+
+    @property
+    def modules(self):
+        """
+        (size, size) boolean array, True for dark modules.
+        """
+        if self._modules is None:
+            bits = np.unpackbits(np.frombuffer(self.packed, dtype=np.uint8), count=self.size * self.size)
+            self._modules = bits.reshape(self.size, self.size).astype(bool)
+        return self._modules
+
+    @property
+    def layout(self):
+        """
+        The padded (dots, squares) masks of qrraster.module_layout, computed once.
+        """
+        if self._layout is None:
+            from qrraster import module_layout
+
+            self._layout = module_layout(self.modules, self.border)
+        return self._layout
+
+    def render(self, target, render="legacy"):
+        """
+        Return the image bytes of one Target (see render_many).
+        """
+        return render_many(self, [target], render)[0]
+
+    def render_many(self, targets, render="legacy"):
+        return render_many(self, targets, render)
+
+
+def encode(payload, version=None, ecl="H"):
+    """
+    Encode payload once (best fit from the smallest version given) and return a QRMatrix.
+    """
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=version,
+        error_correction=ECL_LEVELS[ecl],
+        box_size=1,
+        border=BORDER,
+    )
+    with span("qr_encode"):
+        qr.add_data(payload)
+        qr.make(fit=True)
+    return QRMatrix(qr.modules, qr.version, ecl, qr.border)
+
+
+def _draw(matrix, style, size_px, render):
+    """
+    Draw a raster rendition of matrix (PIL.Image) for style at size_px.
+    """
+    if style == PLAIN_STYLE:
+        from qr import draw_simple_qr
+
+        return draw_simple_qr(matrix, size_px)
+
+    import styles
+    from qrrender import check_render_mode, draw_branded_qr, draw_legacy_qr
+
+    style = styles.get_style(style)
+    check_render_mode(render)
+    if render == "direct":
+        return draw_branded_qr(matrix, style.front_color, style.back_color, style.logo_path, size_px)
+    return draw_legacy_qr(matrix, style.front_color, style.back_color, style.logo_path, size_px)
+
+
+def _draw_svg(matrix, style, size_px):
+    """
+    Return the SVG bytes of matrix for style; size_px sets the embedded logo resolution.
+    """
+    from qrvector import draw_branded_svg, modules_svg
+
+    if style == PLAIN_STYLE:
+        return modules_svg(matrix.modules, (0, 0, 0), (255, 255, 255), matrix.border).encode("utf-8")
+
+    import styles
+
+    style = styles.get_style(style)
+    return draw_branded_svg(matrix, style.front_color, style.back_color, style.logo_path, size_px)
+
+
+def render_many(matrix, targets, render="legacy"):
+    """
+    Render a list of Targets from one QRMatrix.
+
+    Parameters:
+    - matrix (QRMatrix): The encoded code (see encode()).
+    - targets (list): Target(style, size, format, dpi) tuples.
+    - render (str): Raster mode of the branded styles, 'legacy' or 'direct'.
+
+    Returns:
+    - list: Image bytes (PNG, JPEG or SVG) in the order of targets.
+    """
+    import styles
+
+    # Check every target before the first render
+    for target in targets:
+        if target.qr_format not in TARGET_FORMATS:
+            raise ValueError(f"Invalid format '{target.qr_format}'. Use one of: {', '.join(TARGET_FORMATS)}.")
+        if target.style != PLAIN_STYLE:
+            logo_path = styles.get_style(target.style).logo_path
+            if not os.path.exists(logo_path):
+                raise FileNotFoundError(f"Logo file not found at {logo_path}")
+
+    images = {}  # (style, size_px) -> raster shared by the formats of that rendition
+    outputs = []
+    for target in targets:
+        size_px = size_to_px(target.size, target.dpi)
+        with span("target_render", f"{target.style}-{size_px}px.{target.qr_format}") as ev:
+            if target.qr_format == "svg":
+                data = _draw_svg(matrix, target.style, size_px)
+            else:
+                key = (target.style, size_px)
+                if key not in images:
+                    images[key] = _draw(matrix, target.style, size_px, render)
+                img = images[key]
+                buf = BytesIO()
+                if target.qr_format == "jpg":
+                    img.convert("RGB").save(buf, format="JPEG", dpi=(target.dpi, target.dpi),
+                                            quality=95, optimize=True)
+                else:
+                    img.save(buf, format="PNG", dpi=(target.dpi, target.dpi))
+                data = buf.getvalue()
+            ev["bytes"] = len(data)
+        outputs.append(data)
+    return outputs
+
+
+def write_targets(url, targets, output_base, render="legacy", version=None, ecl="H"):
+    """
+    Encode url once, render every Target and save each as
+    <output_base>-<style>-<size>.<format> (with -<dpi>dpi if not 300). Returns the paths.
+    """
+    outputs = encode(url, version, ecl).render_many(targets, render)
+    paths = []
+    for target, data in zip(targets, outputs):
+        dpi = "" if target.dpi == 300 else f"-{target.dpi}dpi"
+        path = f"{output_base}-{target.style}-{str(target.size).replace(' ', '')}{dpi}.{target.qr_format}"
+        with open(path, "wb") as fh:
+            fh.write(data)
+        paths.append(path)
+    return paths
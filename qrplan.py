@@ -0,0 +1,237 @@
+"""
+qrplan.py
+---------
+Payload compaction and version planning for batch QR encoding.
+
+Before a batch is rendered, every URL can be rewritten by a set of safe rules:
+
+- strip-tracking : drop tracking query parameters (usp=drivesdk, usp=sharing,
+                   utm_*, fbclid, gclid, ...); the link opens the same page
+- upper-host     : write the scheme and host in capitals, which QR alphanumeric
+                   mode stores in 5.5 bits per character instead of 8 (scheme and
+                   host are case-insensitive; the path is left untouched)
+
+The pre-pass then works out the QR version each row needs at the chosen error
+correction level, prints how the versions are distributed (and how big a module is
+on the printed code), and can pick one uniform version for the whole print run, so
+every code on a sheet has the same module size.
+
+    python qrplan.py books.csv --compact-urls strip-tracking,upper-host
+"""
+import argparse
+import sys
+from collections import Counter
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+# qrcode.constants.ERROR_CORRECT_* values (qrcode itself is imported when needed)
+ECL_LEVELS = {
+    "L": 1,
+    "M": 0,
+    "Q": 3,
+    "H": 2,
+}
+COMPACT_RULES = ("strip-tracking", "upper-host")
+TRACKING_PARAMS = {"usp", "fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid", "ref_src"}
+MAX_VERSION = 40
+BORDER = 4
+
+
+def parse_rules(value):
+    """
+    Turn a comma-separated rule list ('' or None = no rules) into a tuple of rules.
+    """
+    rules = tuple(r.strip() for r in (value or "").split(",") if r.strip())
+    unknown = set(rules) - set(COMPACT_RULES)
+    if unknown:
+        raise ValueError(f"Unknown URL rule(s): {', '.join(sorted(unknown))}. "
+                         f"Use: {', '.join(COMPACT_RULES)}")
+    return rules
+
+
+def is_tracking_param(piece):
+    """
+    Return True if one key=value piece of a query string is a tracking parameter.
+    """
+    key = unquote_plus(piece.partition("=")[0]).lower()
+    return key in TRACKING_PARAMS or key.startswith("utm_")
+
+
+def compact_url(url, rules=COMPACT_RULES):
+    """
+    Apply the compaction rules to one payload. Values that are not http(s) URLs
+    are returned unchanged.
+    """
+    url = str(url).strip()
+    if not rules:
+        return url
+    parts = urlsplit(url)
+    if parts.scheme.lower() not in ("http", "https") or not parts.netloc:
+        return url
+    scheme, netloc, path, query, fragment = parts
+    if "strip-tracking" in rules and query:
+        # Drop whole key=value pieces and keep the others byte for byte: re-encoding
+        # them would turn '?foo' into '?foo=' or change how values are escaped
+        query = "&".join(piece for piece in query.split("&") if not is_tracking_param(piece))
+    if "upper-host" in rules and "@" not in netloc:
+        scheme, netloc = scheme.upper(), netloc.upper()
+    return urlunsplit((scheme, netloc, path, query, fragment))
+
+
+def needed_version(payload, ecl="H"):
+    """
+    Return the smallest QR version that holds payload at error correction ecl,
+    or None if it does not fit in version 40.
+    """
+    import qrcode
+    from qrcode.exceptions import DataOverflowError
+
+    qr = qrcode.QRCode(error_correction=ECL_LEVELS[ecl])
+    qr.add_data(payload)
+    try:
+        return qr.best_fit()
+    except DataOverflowError:
+        return None
+
+
+def best_ecl(payload, version):
+    """
+    Return the highest error correction level at which payload fits in version, or None.
+    """
+    import qrcode
+    from qrcode.exceptions import DataOverflowError
+
+    for ecl in ("H", "Q", "M", "L"):
+        qr = qrcode.QRCode(version=version, error_correction=ECL_LEVELS[ecl])
+        qr.add_data(payload)
+        try:
+            if qr.best_fit(start=version) == version:
+                return ecl
+        except DataOverflowError:
+            continue
+    return None
+
+
+class QRPlan(object):
+    """
+    Payload rules, error correction and (optionally uniform) version of a batch.
+
+    Rows are added one at a time, in CSV order (plan.add(label, url); labels may
+    repeat, e.g. duplicate names); afterwards plan.version is
+    the version to encode every row with (None = each row's own best fit) and
+    plan.report() describes the batch.
+    """
+
+    def __init__(self, rules=(), ecl="H", version=None):
+        if ecl not in ECL_LEVELS:
+            raise ValueError("Invalid error correction level. Use L, M, Q or H.")
+        if version not in (None, "auto") and not 1 <= int(version) <= MAX_VERSION:
+            raise ValueError(f"QR version must be between 1 and {MAX_VERSION}, or 'auto'.")
+        self.rules = tuple(rules)
+        self.ecl = ecl
+        self.requested = version
+        self.rows = []  # (row label, needed version at ecl, original length, compact length)
+        self._versions = {}
+        self._payloads = []  # compact payload of each row, by row index
+
+    def payload(self, url):
+        return compact_url(url, self.rules)
+
+    def add(self, label, url):
+        payload = self.payload(url)
+        version = self._versions.get(payload, 0)
+        if version == 0:
+            version = self._versions[payload] = needed_version(payload, self.ecl)
+        self.rows.append((label, version, len(str(url).strip()), len(payload)))
+        self._payloads.append(payload)
+        return version
+
+    @property
+    def version(self):
+        """
+        Version used for all rows: the requested one, the largest needed one for
+        'auto', or None when each row keeps its own best fit.
+        """
+        if self.requested == "auto":
+            versions = [v for _, v, _, _ in self.rows if v]
+            return max(versions) if versions else None
+        return int(self.requested) if self.requested else None
+
+    def too_large(self):
+        """
+        Rows that do not fit in the uniform version (they are encoded larger).
+        """
+        uniform = self.version
+        if not uniform:
+            return [label for label, v, _, _ in self.rows if v is None]
+        return [label for label, v, _, _ in self.rows if v is None or v > uniform]
+
+    def row_report(self):
+        """
+        Return one line per row: needed version and the highest error correction
+        level that still fits in the version it is encoded with.
+        """
+        lines = [f"{'Version':>8}{'Max ECL':>9}{'Chars':>7}  Row"]
+        for (label, version, _, length), payload in zip(self.rows, self._payloads):
+            encoded = max(version, self.version or 0) if version else None
+            ecl = best_ecl(payload, encoded) if encoded else "-"
+            lines.append(f"{encoded or '>40':>8}{ecl or '-':>9}{length:>7}  {label}")
+        return "\n".join(lines)
+
+    def report(self, width_mm=20):
+        """
+        Return the version distribution as a printable table.
+        """
+        counts = Counter(v for _, v, _, _ in self.rows)
+        total = len(self.rows) or 1
+        saved = sum(orig - new for _, _, orig, new in self.rows)
+        lines = [f"QR plan: {len(self.rows)} rows, error correction {self.ecl}, "
+                 f"URL rules: {', '.join(self.rules) or 'none'} ({saved} characters removed)",
+                 f"{'Version':>8}{'Modules':>9}{'Module mm':>11}{'Rows':>7}"]
+        for version in sorted(counts, key=lambda v: (v is None, v)):
+            if version is None:
+                lines.append(f"{'>40':>8}{'':>9}{'':>11}{counts[version]:>7}")
+                continue
+            modules = 17 + 4 * version
+            module_mm = width_mm / (modules + 2 * BORDER)
+            bar = "#" * max(1, round(40 * counts[version] / total))
+            lines.append(f"{version:>8}{modules:>9}{module_mm:>11.3f}{counts[version]:>7}  {bar}")
+        if self.version:
+            lines.append(f"Uniform version: {self.version}")
+            too_large = self.too_large()
+            if too_large:
+                lines.append(f"  ⚠️ {len(too_large)} row(s) do not fit and are encoded larger: "
+                             + ", ".join(map(str, too_large[:5])) + (", ..." if len(too_large) > 5 else ""))
+        return "\n".join(lines)
+
+
+def main():
+    from csvrows import read_rows
+
+    parser = argparse.ArgumentParser(description="Report the QR versions a CSV batch needs.")
+    parser.add_argument("csv_file", help="CSV file with a 'url' column")
+    parser.add_argument("--compact-urls", default="", metavar="RULES",
+                        help=f"Comma-separated URL rules: {', '.join(COMPACT_RULES)}")
+    parser.add_argument("--qr-ecl", choices=tuple(ECL_LEVELS), default="H", help="Error correction level")
+    parser.add_argument("--qr-version", help="Uniform version (1-40) or 'auto' (largest needed)")
+    parser.add_argument("--width-mm", type=float, default=20, help="Printed QR width for the module size column")
+    parser.add_argument("--rows", action="store_true",
+                        help="Also list every row with its version and the highest ECL that fits it")
+    args = parser.parse_args()
+
+    try:
+        plan = QRPlan(parse_rules(args.compact_urls), args.qr_ecl, args.qr_version)
+        for index, row in enumerate(read_rows(args.csv_file)):
+            plan.add(row.get("name", index + 1), row["url"])
+    except (ValueError, FileNotFoundError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except KeyError as e:
+        print(f"Error: {args.csv_file} has no {e} column")
+        sys.exit(1)
+    print(plan.report(args.width_mm))
+    if args.rows:
+        print(plan.row_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+qrraster.py
+-----------
+NumPy rasterizer for the circle-module QR look used by all generators.
+
+qrcode's StyledPilImage + CircleModuleDrawer pastes one circle per module and then
+SolidFillColorMask recolours the image pixel by pixel in Python. Here a single
+anti-aliased dot sprite is rendered per (box size, colors) and stamped onto a NumPy
+canvas for all dark modules at once. Finder patterns are drawn as solid squares,
+exactly as StyledPilImage does with its default eye drawer.
+"""
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Same oversampling the qrcode circle drawer uses for its anti-aliasing
+ANTIALIASING_FACTOR = 4
+
+
+@lru_cache(maxsize=32)
+def circle_sprite(box_size, front_color, back_color):
+    """
+    Return a read-only (box_size, box_size, 3) uint8 array with one anti-aliased
+    front_color dot on a back_color square.
+    """
+    # Draw the dot coverage at 4x and shrink it, like CircleModuleDrawer
+    fake_size = box_size * ANTIALIASING_FACTOR
+    coverage = Image.new("L", (fake_size, fake_size), 0)
+    ImageDraw.Draw(coverage).ellipse((0, 0, fake_size, fake_size), fill=255)
+    coverage = coverage.resize((box_size, box_size), Image.Resampling.LANCZOS)
+
+    # Blend the two colors by coverage
+    alpha = np.asarray(coverage, dtype=np.float32)[..., None] / 255.0
+    front = np.array(front_color[:3], dtype=np.float32)
+    back = np.array(back_color[:3], dtype=np.float32)
+    sprite = np.rint(back + alpha * (front - back)).astype(np.uint8)
+    sprite.setflags(write=False)
+    return sprite
+
+
+def eye_mask(size):
+    """
+    Return a (size, size) boolean array that is True inside the three 7x7 finder patterns.
+    """
+    eyes = np.zeros((size, size), dtype=bool)
+    eyes[:7, :7] = True
+    eyes[:7, size - 7:] = True
+    eyes[size - 7:, :7] = True
+    return eyes
+
+
+def module_layout(modules, border=4):
+    """
+    Return (dots, squares): boolean matrices of (size + 2 * border) modules per side,
+    True where a circle module or a finder-pattern square is drawn. They depend only
+    on the modules, so one layout serves every size and color of the same code.
+    """
+    dark = np.asarray(modules, dtype=bool)
+    size = dark.shape[0]
+    eyes = eye_mask(size)
+
+    # Pad the matrices with the quiet zone
+    total = size + 2 * border
+    dots = np.zeros((total, total), dtype=bool)
+    squares = np.zeros((total, total), dtype=bool)
+    dots[border:border + size, border:border + size] = dark & ~eyes
+    squares[border:border + size, border:border + size] = dark & eyes
+    return dots, squares
+
+
+def rasterize_circles(modules, box_size, front_color, back_color, border=4, layout=None):
+    """
+    Rasterize a QR module matrix with circle modules and square finder patterns.
+
+    Parameters:
+    - modules (list of lists or ndarray): qr.modules, True for dark modules (no border).
+    - box_size (int): Pixels per module.
+    - front_color, back_color (tuple): RGB colors of the modules and background.
+    - border (int): Quiet-zone width in modules.
+    - layout (tuple): module_layout(modules, border), if already computed.
+
+    Returns:
+    - PIL.Image: RGB image of (size + 2 * border) * box_size pixels per side.
+    """
+    dots, squares = layout if layout is not None else module_layout(modules, border)
+    total = dots.shape[0]
+
+    # View the canvas as a grid of (box_size x box_size) tiles and stamp in bulk
+    canvas = np.empty((total * box_size, total * box_size, 3), dtype=np.uint8)
+    canvas[...] = back_color[:3]
+    tiles = canvas.reshape(total, box_size, total, box_size, 3).swapaxes(1, 2)
+    tiles[dots] = circle_sprite(box_size, tuple(front_color), tuple(back_color))
+    tiles[squares] = front_color[:3]
+
+    return Image.fromarray(canvas, "RGB")
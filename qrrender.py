@@ -0,0 +1,123 @@
+"""
+qrrender.py
+-----------
+Raster renderers for the branded QR styles (see styles.py for the styles).
+
+The original "legacy" renderer draws every module at box_size=25, upscales the
+result 4x and shrinks it back down to the print size, which builds an intermediate
+image of several thousand pixels per side. The "direct" mode draws the modules and
+the logo at a small supersample of the final pixel size instead and downsamples once.
+
+Each renderer is split into encoding (qrmatrix.encode) and drawing (draw_*), so
+several renditions of one code can be drawn from a single encoding.
+"""
+import math
+
+from PIL import Image
+from qrmatrix import encode
+from qrraster import rasterize_circles
+from logocache import prepare_logo
+from tracing import span
+from styles import RENDER_MODES
+
+LEGACY_BOX_SIZE = 25  # pixels per module of the legacy render, before the upscale
+
+
+def check_render_mode(render):
+    """
+    Raise ValueError if render is not one of RENDER_MODES.
+    """
+    if render not in RENDER_MODES:
+        raise ValueError(f"Invalid render mode '{render}'. Use one of: {', '.join(RENDER_MODES)}.")
+
+
+def render_branded_qr(url, front_color, back_color, logo_path, final_px, supersample=2,
+                      version=None, ecl="H"):
+    """
+    Render a circle-module QR code with a centred logo directly at final_px x final_px.
+
+    Parameters:
+    - url (str): The data or URL to encode.
+    - front_color, back_color (tuple): RGB colors of the modules and background.
+    - logo_path (str): Logo pasted at the centre (1/5 of the code width).
+    - final_px (int): Output width/height in pixels.
+    - supersample (int): Render at this multiple of final_px before the final
+      LANCZOS downsample, to keep the circle edges smooth.
+    - version (int): Smallest QR version to use (None = best fit, see qrplan.py).
+    - ecl (str): Error correction level, "L", "M", "Q" or "H".
+
+    Returns:
+    - PIL.Image: RGBA image of size final_px x final_px.
+    """
+    return draw_branded_qr(encode(url, version, ecl), front_color, back_color, logo_path,
+                           final_px, supersample)
+
+
+def draw_branded_qr(matrix, front_color, back_color, logo_path, final_px, supersample=2):
+    """
+    The drawing half of render_branded_qr, for an already encoded QRMatrix (see qrmatrix.py).
+    """
+    # Smallest box size that reaches the supersampled target
+    box_size = max(1, math.ceil(final_px * max(1, supersample) / matrix.total))
+
+    with span("qr_rasterize"):
+        img = rasterize_circles(matrix.modules, box_size, front_color, back_color, matrix.border,
+                                matrix.layout).convert("RGBA")
+
+    # Center logo on QR, same proportion as the legacy renderer
+    with span("logo_composite"):
+        logo = prepare_logo(logo_path, img.size[0] // 5)
+        pos = ((img.size[0] - logo.size[0]) // 2,
+               (img.size[1] - logo.size[1]) // 2)
+        img.paste(logo, pos, mask=logo)
+
+    if img.size[0] != final_px:
+        with span("resize"):
+            img = img.resize((final_px, final_px), Image.Resampling.LANCZOS)
+    return img
+
+
+def render_legacy_qr(url, front_color, back_color, logo_path, final_px, scale_factor=4,
+                     version=None, ecl="H"):
+    """
+    Render a circle-module QR code with a centred logo the original way: box_size=25,
+    upscaled scale_factor times, logo pasted, then resized to final_px x final_px.
+
+    Returns:
+    - PIL.Image: RGBA image of size final_px x final_px.
+    """
+    return draw_legacy_qr(encode(url, version, ecl), front_color, back_color, logo_path,
+                          final_px, scale_factor)
+
+
+def draw_legacy_qr(matrix, front_color, back_color, logo_path, final_px, scale_factor=4):
+    """
+    The drawing half of render_legacy_qr, for an already encoded QRMatrix (see qrmatrix.py).
+    """
+    # Base QR image with rounded dots + colors
+    with span("qr_rasterize"):
+        img = rasterize_circles(matrix.modules, LEGACY_BOX_SIZE, front_color, back_color, matrix.border,
+                                matrix.layout).convert("RGBA")
+
+    # Upscale for high-res
+    with span("resize"):
+        high_res = img.resize(
+            (img.size[0] * scale_factor, img.size[1] * scale_factor),
+            Image.Resampling.LANCZOS
+        )
+
+    # Load, resize and mask the logo (cached across calls)
+    with span("logo_composite"):
+        max_logo_size = high_res.size[0] // 5
+        logo = prepare_logo(logo_path, max_logo_size)
+
+        # Center logo on QR
+        pos = ((high_res.size[0] - logo.size[0]) // 2,
+               (high_res.size[1] - logo.size[1]) // 2)
+        high_res.paste(logo, pos, mask=logo)
+
+    # Resize final output to the print size
+    with span("resize"):
+        high_res = high_res.resize((final_px, final_px), Image.Resampling.LANCZOS)
+
+    return high_res
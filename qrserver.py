@@ -0,0 +1,408 @@
+"""
+qrserver.py
+-----------
+Local rendering service that keeps the QR and document stack warm.
+
+Every run of jignasaQR.py, vishwanathQR.py or main.py pays for importing docx,
+docxtpl, PIL and qrcode and for loading logos and templates again. This server
+does that once per worker process and then answers small JSON requests:
+
+    POST /qr        {"url": ..., "style": "jignasa", "format": "png"|"svg",
+                     "render": "legacy"|"direct", "version": null, "ecl": "H",
+                     "compact_urls": ""}
+                    -> the PNG or SVG image
+    POST /document  {"template": "/abs/path/template.docx", "style": "jignasa",
+                     "row": {"url": ..., "title": ...}, "engine": "compiled"|"docxtpl",
+                     "render": ..., "qr_format": ..., "version": ..., "ecl": ...,
+                     "compact_urls": ...}
+                    -> the filled .docx
+    GET  /health    -> {"status": "ok", ...}
+    GET  /metrics   -> request counts, errors, in-flight requests and latencies
+
+Requests are handled by an asyncio HTTP server and rendered concurrently on a pool
+of worker processes. Templates are parsed once per worker (again when the file
+changes), and the logo and QR caches stay filled between requests. Errors are
+returned as JSON: {"error": "..."} with status 400 for bad input and 500 otherwise.
+
+If a worker process dies (out of memory, a crash in PIL or lxml), the pool is
+started again and the request is retried once; GET /health counts the restarts,
+and answers 503 with "status": "broken" while no working pool is left, so the
+CLIs render locally instead of sending rows to a dead server.
+
+    python qrserver.py --port 8765 --workers 4
+
+The server only listens on 127.0.0.1 by default; template paths in requests are
+paths on this machine. The existing CLIs forward to it through qrclient.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from http import HTTPStatus
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY = 1024 * 1024  # bytes of JSON accepted per request
+LATENCY_WINDOW = 1000   # requests kept for the latency percentiles
+
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# Parsed templates of this worker process: abs path -> (mtime, CompiledTemplate)
+_templates = {}
+
+
+class RequestError(Exception):
+    """
+    Invalid request; reported to the client with status 400.
+    """
+
+
+# ---------------------------------------------------------------------------
+# Worker processes
+
+
+def init_worker(cache_dir=None, cache_max_mb=None, preload=()):
+    """
+    Import the rendering stack and parse the preloaded templates once per worker.
+    """
+    import main
+    import qrcache
+    import qrrender  # noqa: F401 -- pays the PIL/qrcode/numpy imports up front
+    import docxengine  # noqa: F401 -- and docx/docxtpl
+
+    if cache_dir:
+        qrcache.configure(cache_dir, cache_max_mb or qrcache.DEFAULT_MAX_MB)
+    for template_file in preload:
+        get_template(template_file)
+
+
+def get_template(template_file):
+    """
+    Return the CompiledTemplate for template_file, parsed again if the file changed.
+    """
+    from docxengine import CompiledTemplate
+
+    path = os.path.abspath(template_file)
+    mtime = os.stat(path).st_mtime_ns
+    entry = _templates.get(path)
+    if entry is None or entry[0] != mtime:
+        entry = _templates[path] = (mtime, CompiledTemplate(path))
+    return entry[1]
+
+
+def _qr_options(payload):
+    """
+    Return (url rules, version, ecl) of a request, validated.
+    """
+    from qrplan import ECL_LEVELS, MAX_VERSION, parse_rules
+
+    ecl = payload.get("ecl") or "H"
+    if ecl not in ECL_LEVELS:
+        raise ValueError("Invalid error correction level. Use L, M, Q or H.")
+    version = payload.get("version")
+    if version is not None and not 1 <= int(version) <= MAX_VERSION:
+        raise ValueError(f"QR version must be between 1 and {MAX_VERSION}.")
+    return parse_rules(payload.get("compact_urls")), version and int(version), ecl
+
+
+def render_qr_job(payload):
+    """
+    Render the image of a /qr request. Returns (bytes, content type).
+    """
+    import main
+    import styles
+    from qrplan import compact_url
+    from qrvector import SVG_CONTENT_TYPE
+
+    style = styles.get_style(payload.get("style", "jignasa"))
+    qr_format = payload.get("format", "png")
+    if qr_format not in main.QR_FORMATS:
+        raise ValueError("Invalid QR format. Use 'png' or 'svg'.")
+    render = payload.get("render", "legacy")
+    rules, version, ecl = _qr_options(payload)
+    url = compact_url(payload["url"], rules)
+
+    if qr_format == "svg":
+        return styles.generate_svg(url, style, version=version, ecl=ecl), SVG_CONTENT_TYPE
+    return styles.cached_qr_png(url, style, render, version, ecl), "image/png"
+
+
+def render_document_job(payload):
+    """
+    Fill the template of a /document request. Returns (bytes, content type).
+    """
+    import main
+
+    template_file = payload["template"]
+    row = payload["row"]
+    if not isinstance(row, dict) or "url" not in row:
+        raise ValueError("'row' must be an object with a 'url' field.")
+    style = payload.get("style", "jignasa")
+    engine = payload.get("engine", "compiled")
+    if engine not in ("compiled", "docxtpl"):
+        raise ValueError("Invalid engine. Use 'compiled' or 'docxtpl'.")
+    rules, version, ecl = _qr_options(payload)
+    compiled = get_template(template_file) if engine == "compiled" else None
+    data = main.render_document(template_file, row, style, compiled,
+                                payload.get("render", "legacy"), payload.get("qr_format", "png"),
+                                rules, version, ecl)
+    return data, DOCX_CONTENT_TYPE
+
+
+def run_job(job, payload):
+    """
+    Run a render job in a worker. Input errors are returned as ("error", message)
+    so they can be told apart from failures of the service itself.
+    """
+    try:
+        return "ok", JOBS[job](payload)
+    except (KeyError, TypeError, ValueError, FileNotFoundError) as e:
+        if isinstance(e, KeyError):
+            return "error", f"Missing field {e}"
+        return "error", f"{type(e).__name__}: {e}"
+
+
+JOBS = {
+    "/qr": render_qr_job,
+    "/document": render_document_job,
+}
+
+
+# ---------------------------------------------------------------------------
+# HTTP server
+
+
+class Metrics(object):
+    """
+    Request counters and recent latencies for GET /metrics.
+    """
+
+    def __init__(self, workers):
+        self.started = time.time()
+        self.workers = workers
+        self.requests = {}
+        self.errors = {}
+        self.in_flight = 0
+        self.pool_restarts = 0
+        self.latencies = {}  # path -> deque of seconds
+
+    def record(self, path, seconds, failed):
+        self.requests[path] = self.requests.get(path, 0) + 1
+        if failed:
+            self.errors[path] = self.errors.get(path, 0) + 1
+        self.latencies.setdefault(path, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def snapshot(self):
+        latency = {}
+        for path, values in self.latencies.items():
+            ordered = sorted(values)
+            pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+            latency[path] = {"p50_ms": round(pick(0.5) * 1000, 1), "p95_ms": round(pick(0.95) * 1000, 1),
+                             "max_ms": round(ordered[-1] * 1000, 1)}
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "pid": os.getpid(),
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "pool_restarts": self.pool_restarts,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency": latency,
+        }
+
+
+class QRServer(object):
+    """
+    Minimal HTTP/1.1 server (keep-alive, Content-Length bodies) on asyncio streams.
+
+    make_pool, if given, builds a new worker pool when a worker process dies;
+    without it a broken pool stays broken and /health reports it.
+    """
+
+    def __init__(self, pool, workers, make_pool=None):
+        self.pool = pool
+        self.make_pool = make_pool
+        self.broken = False
+        self.metrics = Metrics(workers)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                start = time.perf_counter()
+                status, content_type, data = await self.dispatch(method, path, body)
+                if path in JOBS:
+                    self.metrics.record(path, time.perf_counter() - start, status != HTTPStatus.OK)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, content_type, data, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except RequestError as e:
+            self._write_response(writer, HTTPStatus.BAD_REQUEST, *self._json({"error": str(e)}), False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """
+        Return (method, path, headers, body) of the next request, or None at EOF.
+        """
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise RequestError("Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise RequestError("Invalid Content-Length header")
+        if length < 0:
+            raise RequestError("Invalid Content-Length header")
+        if length > MAX_BODY:
+            raise RequestError(f"Request body larger than {MAX_BODY} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    @staticmethod
+    def _json(obj):
+        return "application/json", json.dumps(obj).encode("utf-8")
+
+    async def dispatch(self, method, path, body):
+        """
+        Return (status, content type, body bytes) for one request.
+        """
+        if path in ("/health", "/metrics"):
+            if method != "GET":
+                return (HTTPStatus.METHOD_NOT_ALLOWED,) + self._json({"error": "Use GET"})
+            if path == "/health":
+                status = HTTPStatus.SERVICE_UNAVAILABLE if self.broken else HTTPStatus.OK
+                return (status,) + self._json({"status": "broken" if self.broken else "ok",
+                                               "pid": os.getpid(), "workers": self.metrics.workers,
+                                               "pool_restarts": self.metrics.pool_restarts})
+            return (HTTPStatus.OK,) + self._json(self.metrics.snapshot())
+        if path not in JOBS:
+            return (HTTPStatus.NOT_FOUND,) + self._json({"error": f"Unknown endpoint {path}"})
+        if method != "POST":
+            return (HTTPStatus.METHOD_NOT_ALLOWED,) + self._json({"error": "Use POST"})
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            return (HTTPStatus.BAD_REQUEST,) + self._json({"error": f"Invalid JSON: {e}"})
+
+        self.metrics.in_flight += 1
+        try:
+            outcome, result = await self.run_job(path, payload)
+        except Exception as e:
+            return (HTTPStatus.INTERNAL_SERVER_ERROR,) + self._json({"error": f"{type(e).__name__}: {e}"})
+        finally:
+            self.metrics.in_flight -= 1
+        if outcome == "error":
+            return (HTTPStatus.BAD_REQUEST,) + self._json({"error": result})
+        data, content_type = result
+        return HTTPStatus.OK, content_type, data
+
+    async def run_job(self, path, payload):
+        """
+        Run a job on the pool; if a worker died, start a new pool and try once more.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = self.pool
+            try:
+                return await loop.run_in_executor(pool, run_job, path, payload)
+            except BrokenProcessPool:
+                self.restart_pool(pool)
+                if attempt or self.broken:
+                    raise
+
+    def restart_pool(self, pool):
+        """
+        Replace a broken pool (once, however many requests saw it fail).
+        """
+        if pool is not self.pool:
+            return  # another request already started a new one
+        pool.shutdown(wait=False)
+        if self.make_pool is None:
+            self.broken = True
+            return
+        print("⚠️ A worker process died; starting the worker pool again")
+        self.pool = self.make_pool()
+        self.metrics.pool_restarts += 1
+
+    @staticmethod
+    def _write_response(writer, status, content_type, data, keep_alive):
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + data)
+
+
+async def serve(host, port, workers, cache_dir=None, cache_max_mb=None, preload=()):
+    make_pool = partial(ProcessPoolExecutor, workers, initializer=init_worker,
+                        initargs=(cache_dir, cache_max_mb, tuple(preload)))
+    app = QRServer(make_pool(), workers, make_pool)
+    try:
+        server = await asyncio.start_server(app.handle, host, port)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:  # Windows
+                pass
+        print(f"🚀 QR server on http://{host}:{port} ({workers} workers), Ctrl+C to stop")
+        async with server:
+            await stop.wait()
+        print("QR server stopped")
+    finally:
+        app.pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve QR images and filled documents over local HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on (default {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default {DEFAULT_PORT})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="Worker processes rendering requests (default: CPU count)")
+    parser.add_argument("--preload", action="append", default=[], metavar="TEMPLATE",
+                        help="Parse this Word template in every worker at startup (repeatable)")
+    parser.add_argument("--cache-dir", default=os.environ.get("QR_CACHE_DIR"),
+                        help="Directory of the on-disk QR image cache (default: $QR_CACHE_DIR)")
+    parser.add_argument("--cache-max-mb", type=float, default=None,
+                        help="Size cap of the QR cache in MB")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, max(1, args.workers), args.cache_dir,
+                          args.cache_max_mb, args.preload))
+    except OSError as e:
+        print(f"Error: cannot listen on {args.host}:{args.port}: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
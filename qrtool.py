@@ -0,0 +1,129 @@
+"""
+qrtool.py
+---------
+One command-line entry point for the whole pipeline:
+
+    python qrtool.py qr jignasa mycode https://example.com [--format svg]
+    python qrtool.py qr jignasa mycode https://example.com --formats 1in:png,vishwanath:2cm:jpg
+    python qrtool.py batch data.csv template.docx jignasa [main.py options]
+    python qrtool.py monograph MonographTemplate.docx monographData.csv
+    python qrtool.py combine docs
+    python qrtool.py convert docs final
+    python qrtool.py labels data.csv labels.pdf --style jignasa --caption name
+    python qrtool.py plan data.csv --compact-urls strip-tracking,upper-host
+    python qrtool.py serve --workers 4
+    python qrtool.py styles
+
+Only the standard library is imported until a subcommand runs, and each subcommand
+imports just the modules it needs, so usage messages, --help and a single QR code
+start quickly. The other subcommands run the existing scripts (main.py, monograph.py,
+combinedocx.py, DocxToPdf.py, labelsheet.py, qrplan.py, qrserver.py) with the remaining arguments.
+Check the start-up cost with:
+
+    python -X importtime qrtool.py qr --help
+    python benchmark.py --stages startup
+"""
+import argparse
+import importlib
+import sys
+
+# Subcommand -> (module whose main() runs it, description)
+COMMANDS = {
+    "qr": (None, "Render one branded QR code (PNG, JPG or SVG)"),
+    "batch": ("main", "Fill a Word template with a QR code for every CSV row (main.py)"),
+    "monograph": ("monograph", "Fill the monograph template for every CSV row (monograph.py)"),
+    "combine": ("combinedocx", "Combine a folder of .docx files into one (combinedocx.py)"),
+    "convert": ("DocxToPdf", "Convert a folder of .docx files to PDF (DocxToPdf.py)"),
+    "labels": ("labelsheet", "Tile the QR codes of a CSV onto label sheets (labelsheet.py)"),
+    "plan": ("qrplan", "Report the QR versions a CSV batch needs (qrplan.py)"),
+    "serve": ("qrserver", "Run the local rendering service (qrserver.py)"),
+    "styles": (None, "List the registered QR styles"),
+}
+
+
+def qr_command(argv):
+    """
+    qrtool.py qr <style> <output_file_name> <URL> [options]
+    """
+    import styles
+
+    parser = argparse.ArgumentParser(prog="qrtool.py qr", description=COMMANDS["qr"][1])
+    parser.add_argument("style", type=str.lower, choices=tuple(styles.STYLES), help="QR style")
+    parser.add_argument("output", help="Output file name without extension")
+    parser.add_argument("url", help="Data or URL to encode")
+    parser.add_argument("--format", choices=("png", "jpg", "svg"),
+                        help="Image format (default: the style's, PNG or JPG)")
+    parser.add_argument("--render", choices=styles.RENDER_MODES, default="legacy",
+                        help="QR render mode: 'legacy' (upscale) or 'direct' (render at print size)")
+    parser.add_argument("--qr-version", type=int, help="Smallest QR version (1-40)")
+    parser.add_argument("--qr-ecl", choices=("L", "M", "Q", "H"), default="H",
+                        help="QR error correction level (default H)")
+    parser.add_argument("--formats", metavar="TARGETS",
+                        help="Several renditions from one encoding: comma-separated [style:]size[:format[:dpi]], "
+                             "e.g. 1in:png,vishwanath:2cm:jpg,plain:96px:png:96 (saved as <output>-<style>-<size>.<format>)")
+    args = parser.parse_args(argv)
+
+    if args.formats:
+        from qrmatrix import parse_targets, write_targets
+
+        try:
+            paths = write_targets(args.url, parse_targets(args.formats, args.style), args.output,
+                                  args.render, args.qr_version, args.qr_ecl)
+        except Exception as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        for path in paths:
+            print(f"QR code saved to {path}")
+        return
+
+    try:
+        output_file = styles.write_qr(args.url, args.style, args.output, args.format, args.render,
+                                      args.qr_version, args.qr_ecl)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"High-resolution QR code saved to {output_file} at 300 DPI")
+
+
+def styles_command(argv):
+    """
+    qrtool.py styles: print the registered styles.
+    """
+    import styles
+
+    argparse.ArgumentParser(prog="qrtool.py styles", description=COMMANDS["styles"][1]).parse_args(argv)
+    for style in styles.STYLES.values():
+        print(f"{style.name:<12} front {'#%02x%02x%02x' % style.front_color}  "
+              f"back {'#%02x%02x%02x' % style.back_color}  {style.final_size}px  "
+              f"{style.output_format}  {style.logo_path}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = "\n".join(f"  {name:<11}{text}" for name, (_, text) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog="qrtool.py",
+        description=f"QR code and Word document pipeline.\n\ncommands:\n{commands}",
+        epilog="Run 'qrtool.py <command> --help' for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=tuple(COMMANDS), metavar="command", help="One of the commands above")
+    if not argv or argv[0] in ("-h", "--help"):
+        parser.print_help()
+        sys.exit(0 if argv else 2)
+    args = parser.parse_args(argv[:1])
+    rest = argv[1:]
+
+    if args.command == "qr":
+        return qr_command(rest)
+    if args.command == "styles":
+        return styles_command(rest)
+
+    # The scripts parse sys.argv themselves; make their usage read "qrtool.py <command>"
+    module = importlib.import_module(COMMANDS[args.command][0])
+    sys.argv = [f"qrtool.py {args.command}"] + rest
+    return module.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+qrvector.py
+-----------
+SVG renderer for the branded QR styles, for vector output in Word documents.
+
+The SVG has the same look as the raster generators: the quiet-zone background,
+one circle per dark module, solid square finder patterns and the masked logo at the
+centre (1/5 of the code width). Only the logo stays a bitmap, embedded as PNG; the
+modules are paths, so the code prints sharp at any size and the file size does not
+depend on the print resolution.
+
+Word 2016+ and LibreOffice show the SVG; older readers fall back to a PNG stored
+next to it (see docxengine.py).
+"""
+import base64
+from io import BytesIO
+
+import numpy as np
+
+from logocache import prepare_logo
+from qrmatrix import encode
+from qrraster import eye_mask
+
+SVG_CONTENT_TYPE = "image/svg+xml"
+
+
+def _hex(color):
+    return "#%02x%02x%02x" % tuple(color[:3])
+
+
+def _logo_data_uri(logo_path, logo_px):
+    """
+    Return (data URI, width, height) of the prepared logo as PNG.
+    """
+    logo = prepare_logo(logo_path, logo_px)
+    buf = BytesIO()
+    logo.save(buf, format="PNG", optimize=True)
+    uri = "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+    return uri, logo.size[0], logo.size[1]
+
+
+def modules_svg(modules, front_color, back_color, border=4, logo=None):
+    """
+    Return an SVG document (str) drawing a QR module matrix in module units.
+
+    Parameters:
+    - modules (list of lists or ndarray): qr.modules, True for dark modules (no border).
+    - front_color, back_color (tuple): RGB colors of the modules and background.
+    - border (int): Quiet-zone width in modules.
+    - logo (tuple): Optional (data URI, width, height in modules) centred on the code.
+    """
+    dark = np.asarray(modules, dtype=bool)
+    size = dark.shape[0]
+    total = size + 2 * border
+    dots = dark & ~eye_mask(size)
+
+    # One path for all dots: two arcs per module, circle diameter = module size
+    d = []
+    for y, x in zip(*np.nonzero(dots)):
+        d.append("M%d,%ga.5,.5 0 1 0 1,0a.5,.5 0 1 0 -1,0" % (x + border, y + border + 0.5))
+    # Finder patterns: 7x7 ring around a 3x3 square (even-odd fill, no seams)
+    eyes = []
+    for ex, ey in ((0, 0), (size - 7, 0), (0, size - 7)):
+        x, y = ex + border, ey + border
+        eyes.append("M%d,%dh7v7h-7zM%d,%dv5h5v-5zM%d,%dh3v3h-3z" % (x, y, x + 1, y + 1, x + 2, y + 2))
+
+    parts = [
+        '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        'version="1.1" viewBox="0 0 %d %d" width="%d" height="%d">' % (total, total, total, total),
+        '<rect width="%d" height="%d" fill="%s"/>' % (total, total, _hex(back_color)),
+        '<path fill="%s" d="%s"/>' % (_hex(front_color), "".join(d)),
+        '<path fill="%s" fill-rule="evenodd" d="%s"/>' % (_hex(front_color), "".join(eyes)),
+    ]
+    if logo:
+        uri, w, h = logo
+        parts.append('<image x="%g" y="%g" width="%g" height="%g" xlink:href="%s"/>'
+                     % ((total - w) / 2, (total - h) / 2, w, h, uri))
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def render_branded_svg(url, front_color, back_color, logo_path, final_px, version=None, ecl="H"):
+    """
+    Render a circle-module QR code with a centred logo as SVG.
+
+    Parameters:
+    - url (str): The data or URL to encode.
+    - front_color, back_color (tuple): RGB colors of the modules and background.
+    - logo_path (str): Logo placed at the centre (1/5 of the code width).
+    - final_px (int): Pixel size of the raster version; the embedded logo bitmap has
+      the logo's size at that resolution (1/5 of final_px).
+    - version (int): Smallest QR version to use (None = best fit, see qrplan.py).
+    - ecl (str): Error correction level, "L", "M", "Q" or "H".
+
+    Returns:
+    - bytes: UTF-8 encoded SVG document.
+    """
+    return draw_branded_svg(encode(url, version, ecl), front_color, back_color, logo_path, final_px)
+
+
+def draw_branded_svg(matrix, front_color, back_color, logo_path, final_px):
+    """
+    The drawing half of render_branded_svg, for an already encoded QRMatrix (see qrmatrix.py).
+    """
+    logo_px = max(1, final_px // 5)
+    uri, w, h = _logo_data_uri(logo_path, logo_px)
+    # Same proportion as the raster renderers: the logo fits in 1/5 of the width
+    scale = matrix.total / 5.0 / logo_px
+    svg = modules_svg(matrix.modules, front_color, back_color, matrix.border, (uri, w * scale, h * scale))
+    return svg.encode("utf-8")
@@ -0,0 +1,169 @@
+"""
+styles.py
+---------
+Registry of the branded QR styles.
+
+A style is only data: module and background colors, the logo and the print size.
+Rendering is shared (qrrender.py for PNG, qrvector.py for SVG), so a new style is
+one register_style() call:
+
+    register_style("mystyle", front_color=(0, 0, 0), back_color=(255, 255, 255),
+                   logo_path="assets/mystyle.png", final_size=300)
+
+The rendering modules (qrcode, PIL, numpy) are imported on first use, so looking
+up a style or listing them for a command-line usage message stays cheap.
+"""
+import os
+from collections import namedtuple
+
+# final_size is the PNG width in pixels at 300 DPI; output_format is the file type
+# written by the single-QR command ("png" or "jpg")
+Style = namedtuple("Style", "name front_color back_color logo_path final_size output_format")
+
+# "legacy" = box_size=25 render + 4x upscale, "direct" = render near final size
+RENDER_MODES = ("legacy", "direct")
+
+# Pixels per module of the PNG stored next to an SVG for readers without SVG support
+SVG_FALLBACK_BOX = 3
+
+STYLES = {}
+
+
+def register_style(name, front_color, back_color, logo_path, final_size=300, output_format="png"):
+    """
+    Add a QR style (or replace one with the same name) and return it.
+    """
+    if output_format not in ("png", "jpg"):
+        raise ValueError("Invalid output format. Use 'png' or 'jpg'.")
+    style = Style(name.lower(), tuple(front_color), tuple(back_color), logo_path,
+                  int(final_size), output_format)
+    STYLES[style.name] = style
+    return style
+
+
+def get_style(name):
+    """
+    Return the registered style called name; raises ValueError for unknown styles.
+    """
+    style = STYLES.get(str(name).lower())
+    if style is None:
+        raise ValueError(f"Invalid QR style '{name}'. Use one of: {', '.join(STYLES)}.")
+    return style
+
+
+register_style("jignasa", front_color=(131, 174, 69), back_color=(254, 252, 222),
+               logo_path="assets/jignasa.png", final_size=300)  # 1 inch at 300 DPI
+register_style("vishwanath", front_color=(212, 223, 73), back_color=(37, 89, 46),
+               logo_path="assets/vishwanath.jpg", final_size=int(2 / 2.54 * 300),  # 2 cm at 300 DPI
+               output_format="jpg")
+
+
+def generate_qr(url, style, logo_path=None, scale_factor=4, render="legacy", supersample=2,
+                version=None, ecl="H"):
+    """
+    Generate a branded QR code with the logo at the centre.
+
+    Parameters:
+    - url (str): The data or URL to encode.
+    - style (str or Style): Registered style name, or a Style.
+    - logo_path (str): Logo to use instead of the style's.
+    - render (str): 'legacy' (box_size=25 + upscale) or 'direct' (render at print size).
+    - version, ecl: Smallest QR version and error correction level (see qrplan.py).
+
+    Returns:
+    - PIL.Image: RGBA image of style.final_size x style.final_size.
+    """
+    from qrrender import check_render_mode, render_branded_qr, render_legacy_qr
+
+    style = style if isinstance(style, Style) else get_style(style)
+    logo_path = logo_path or style.logo_path
+    check_render_mode(render)
+    if not os.path.exists(logo_path):
+        raise FileNotFoundError(f"Logo file not found at {logo_path}")
+
+    if render == "direct":
+        return render_branded_qr(url, style.front_color, style.back_color, logo_path, style.final_size,
+                                 supersample, version, ecl)
+    return render_legacy_qr(url, style.front_color, style.back_color, logo_path, style.final_size,
+                            scale_factor, version, ecl)
+
+
+def generate_svg(url, style, logo_path=None, version=None, ecl="H"):
+    """
+    Generate the branded QR code as vector graphics (see qrvector.py).
+    Returns the SVG document as bytes.
+    """
+    from qrvector import render_branded_svg
+
+    style = style if isinstance(style, Style) else get_style(style)
+    logo_path = logo_path or style.logo_path
+    if not os.path.exists(logo_path):
+        raise FileNotFoundError(f"Logo file not found at {logo_path}")
+    return render_branded_svg(url, style.front_color, style.back_color, logo_path, style.final_size,
+                              version, ecl)
+
+
+def generate_svg_with_fallback(url, style, version=None, ecl="H"):
+    """
+    Encode url once and return (SVG bytes, PNG bytes) for a document image. The PNG
+    is only shown by readers without SVG support, so it is drawn small
+    (SVG_FALLBACK_BOX pixels per module) and does not add much to the document.
+    """
+    from qrmatrix import Target, encode
+    from qrvector import draw_branded_svg
+
+    style = style if isinstance(style, Style) else get_style(style)
+    if not os.path.exists(style.logo_path):
+        raise FileNotFoundError(f"Logo file not found at {style.logo_path}")
+    matrix = encode(url, version, ecl)
+    svg = draw_branded_svg(matrix, style.front_color, style.back_color, style.logo_path, style.final_size)
+    png = matrix.render(Target(style.name, matrix.total * SVG_FALLBACK_BOX, "png", dpi=96), render="direct")
+    return svg, png
+
+
+def cached_qr_png(url, style, render="legacy", version=None, ecl="H"):
+    """
+    Return the PNG bytes (300 DPI) of a branded QR code, from the QR cache when enabled.
+    """
+    from qrcache import cached_png
+
+    style = style if isinstance(style, Style) else get_style(style)
+    return cached_png(lambda: generate_qr(url, style, render=render, version=version, ecl=ecl), url,
+                      style, style.logo_path, style.final_size, error_correction=ecl,
+                      render=render, version=version)
+
+
+def write_qr(url, style, output_base, qr_format=None, render="legacy", version=None, ecl="H"):
+    """
+    Render a branded QR code and save it as output_base + ".png", ".jpg" or ".svg"
+    (default: the style's output format), at 300 DPI. A running qrserver.py renders
+    it when available. Returns the path written.
+    """
+    import qrclient
+
+    style = style if isinstance(style, Style) else get_style(style)
+    qr_format = qr_format or style.output_format
+    if qr_format not in ("png", "jpg", "svg"):
+        raise ValueError("Invalid QR format. Use 'png', 'jpg' or 'svg'.")
+    image_format = "svg" if qr_format == "svg" else "png"
+
+    # Forward to a running qrserver.py (logos already loaded there)
+    if qrclient.available():
+        data = qrclient.render_qr(url, style.name, image_format, render, version, ecl)
+    elif qr_format == "svg":
+        data = generate_svg(url, style, version=version, ecl=ecl)
+    else:
+        # PNG with 300 DPI, reused from the QR cache when QR_CACHE_DIR is set
+        data = cached_qr_png(url, style, render, version, ecl)
+
+    output_file = f"{output_base}.{qr_format}"
+    if qr_format == "jpg":
+        from io import BytesIO
+        from PIL import Image
+
+        img = Image.open(BytesIO(data)).convert("RGB")
+        img.save(output_file, format="JPEG", dpi=(300, 300), quality=95, optimize=True)
+    else:
+        with open(output_file, "wb") as fh:
+            fh.write(data)
+    return output_file
@@ -0,0 +1,53 @@
+"""
+Shared fixtures. The modules live at the top of the repository, so it is put on
+sys.path; run the tests with `python -m pytest` from the repository root.
+"""
+import os
+import sys
+from io import BytesIO
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def make_docx(tmp_path):
+    """
+    Return a function writing a small .docx (one paragraph per text) into tmp_path.
+    """
+    def make(name, *paragraphs):
+        from docx import Document
+
+        doc = Document()
+        for text in paragraphs:
+            doc.add_paragraph(text)
+        path = str(tmp_path / name)
+        doc.save(path)
+        return path
+    return make
+
+
+@pytest.fixture
+def docx_text():
+    """
+    Return a function giving the paragraph texts of a .docx (path, bytes or file object).
+    """
+    def text(source):
+        from docx import Document
+
+        if isinstance(source, bytes):
+            source = BytesIO(source)
+        return [p.text for p in Document(source).paragraphs]
+    return text
+
+
+@pytest.fixture
+def png_bytes():
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new("RGB", (20, 20), (200, 30, 30)).save(buf, format="PNG")
+    return buf.getvalue()
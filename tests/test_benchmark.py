@@ -0,0 +1,29 @@
+import multiprocessing
+import os
+import time
+
+from benchmark import wait_for_stage
+
+
+def start(target, *args):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=target, args=args)
+    proc.start()
+    return proc, queue
+
+
+def test_crashed_stage_is_reported_not_awaited():
+    proc, queue = start(os._exit, 3)
+    raw = wait_for_stage(proc, queue, timeout=60)
+    proc.join()
+    assert raw == {"error": "stage process exited with code 3 without a result"}
+
+
+def test_hung_stage_times_out():
+    proc, queue = start(time.sleep, 60)
+    began = time.monotonic()
+    raw = wait_for_stage(proc, queue, timeout=0.5)
+    proc.join()
+    assert raw == {"error": "stage timed out after 0.5 s"}
+    assert time.monotonic() - began < 10
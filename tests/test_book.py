@@ -0,0 +1,98 @@
+"""
+End-to-end --book runs of main.py and monograph.py.
+"""
+import csv
+import os
+import sys
+import zipfile
+from io import BytesIO
+
+import pytest
+
+import main
+import monograph
+from conftest import ROOT
+
+FIELDS = ["name", "url", "title"]
+
+
+def _write_csv(path, rows, fields=FIELDS):
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def _run_main(monkeypatch, *argv):
+    monkeypatch.chdir(ROOT)  # the styles' logos are relative to the repository
+    monkeypatch.setattr(sys, "argv", ["main.py", *argv, "--no-server"])
+    try:
+        main.main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+@pytest.mark.parametrize("engine", ["compiled", "docxtpl"])
+def test_book_skips_failed_first_row(monkeypatch, tmp_path, make_docx, docx_text, engine):
+    template = make_docx("template.docx", "{{ title }}", "{{ qrcode }}")
+    rows = [
+        {"name": "toolong", "url": "https://example.com/" + "x" * 4000, "title": "Too long"},
+        {"name": "a", "url": "https://example.com/a", "title": "Tom & Jerry"},
+        {"name": "b", "url": "https://example.com/b", "title": "Second"},
+    ]
+    book = tmp_path / "book.docx"
+    code = _run_main(monkeypatch, _write_csv(tmp_path / "rows.csv", rows), template, "jignasa",
+                     "--engine", engine, "--book", str(book))
+    assert code == 1  # the failed row is reported
+    texts = [t for t in docx_text(str(book)) if t.strip()]
+    expected = "Tom & Jerry" if engine == "compiled" else "Tom  Jerry"  # docxtpl drops the '&'
+    assert texts == [expected, "Second"]
+
+
+def test_book_skips_document_that_cannot_be_merged(monkeypatch, tmp_path, make_docx, docx_text):
+    template = make_docx("template.docx", "{{ title }}")
+    render_document = main.render_document
+
+    def broken_first(template_file, row, *args, **kwargs):
+        data = render_document(template_file, row, *args, **kwargs)
+        if row["title"] != "broken":
+            return data
+        # A valid zip whose document part is not well-formed XML
+        out = BytesIO()
+        with zipfile.ZipFile(BytesIO(data)) as zin, zipfile.ZipFile(out, "w") as zout:
+            for info in zin.infolist():
+                content = zin.read(info)
+                zout.writestr(info, content[:-20] if info.filename == "word/document.xml" else content)
+        return out.getvalue()
+
+    monkeypatch.setattr(main, "render_document", broken_first)
+    rows = [{"name": n, "url": f"https://example.com/{n}", "title": t}
+            for n, t in (("x", "broken"), ("a", "first"), ("b", "second"))]
+    book = tmp_path / "book.docx"
+    code = _run_main(monkeypatch, _write_csv(tmp_path / "rows.csv", rows), template, "jignasa",
+                     "--book", str(book))
+    assert code == 1
+    assert [t for t in docx_text(str(book)) if t.strip()] == ["first", "second"]
+
+
+def test_book_with_every_row_failed_writes_nothing(monkeypatch, tmp_path, make_docx):
+    template = make_docx("template.docx", "{{ title }}")
+    rows = [{"name": "x", "url": "https://example.com/" + "x" * 4000, "title": "x"}]
+    book = tmp_path / "book.docx"
+    code = _run_main(monkeypatch, _write_csv(tmp_path / "rows.csv", rows), template, "jignasa",
+                     "--engine", "compiled", "--book", str(book))
+    assert code == 1
+    assert not book.exists()
+
+
+def test_monograph_book(monkeypatch, tmp_path, make_docx, docx_text):
+    monkeypatch.chdir(tmp_path)
+    template = make_docx("template.docx", "{{filename}}: {{sanskritname}}")
+    rows = [{"filename": n, "sanskritname": s} for n, s in (("Palasa", "Palasha"), ("Nimba", "Neem & co"))]
+    csv_path = _write_csv(tmp_path / "plants.csv", rows, ["filename", "sanskritname"])
+    failures = monograph.fill_template(template, csv_path, book=str(tmp_path / "plants.docx"))
+    assert failures == []
+    assert [t for t in docx_text(str(tmp_path / "plants.docx")) if t] == ["Palasa: Palasha", "Nimba: Neem & co"]
+    assert not os.path.exists(tmp_path / "monographs")
@@ -0,0 +1,55 @@
+import math
+import sys
+
+import pytest
+
+from conftest import ROOT
+from csvrows import read_rows
+
+CSV = ('\ufeffname,url,title\r\n'
+       'Tom,https://ex.am/1,"two\nlines, quoted"\r\n'
+       'Jerry,https://ex.am/2,\r\n'
+       'Short,https://ex.am/3\r\n')
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "rows.csv"
+    path.write_bytes(CSV.encode("utf-8"))
+    return str(path)
+
+
+def test_csv_backend(csv_path):
+    assert list(read_rows(csv_path)) == [
+        {"name": "Tom", "url": "https://ex.am/1", "title": "two\nlines, quoted"},
+        # empty and missing cells both come back as ''
+        {"name": "Jerry", "url": "https://ex.am/2", "title": ""},
+        {"name": "Short", "url": "https://ex.am/3", "title": ""},
+    ]
+
+
+def test_pandas_backend_same_rows(csv_path):
+    pandas_rows = list(read_rows(csv_path, "pandas", chunksize=2))
+    csv_rows = list(read_rows(csv_path))
+    assert [list(row) for row in pandas_rows] == [list(row) for row in csv_rows]  # BOM stripped
+    for row, expected in zip(pandas_rows, csv_rows):
+        assert {k: ("" if isinstance(v, float) and math.isnan(v) else v) for k, v in row.items()} == expected
+
+
+def test_csv_backend_does_not_import_pandas(csv_path, monkeypatch):
+    monkeypatch.delitem(sys.modules, "pandas", raising=False)
+    list(read_rows(csv_path))
+    assert "pandas" not in sys.modules
+
+
+def test_sample_data_matches_pandas():
+    path = f"{ROOT}/monographData.csv"
+    csv_rows = list(read_rows(path))
+    pandas_rows = list(read_rows(path, "pandas"))
+    assert len(csv_rows) == len(pandas_rows) > 0
+    assert [r["filename"] for r in csv_rows] == [str(r["filename"]) for r in pandas_rows]
+
+
+def test_unknown_backend(csv_path):
+    with pytest.raises(ValueError):
+        list(read_rows(csv_path, "polars"))
@@ -0,0 +1,63 @@
+import os
+import time
+import zipfile
+
+import pytest
+
+from docarchive import (MANIFEST_NAME, ArchiveWriter, extract_documents, is_archive,
+                        iter_documents, read_manifest)
+
+
+@pytest.mark.parametrize("name", ["out.zip", "out.tar", "out.tar.gz"])
+def test_round_trip_with_manifest(tmp_path, name):
+    path = str(tmp_path / "sub" / name)
+    with ArchiveWriter(path) as archive:
+        assert archive.add("Alice.docx", b"first", key="Alice") == "Alice.docx"
+        assert archive.add("Alice.docx", b"second", key="Alice") == "Alice(1).docx"
+        archive.add("notes.txt", b"other")
+
+    documents = list(iter_documents(path))
+    assert [(n, data) for n, data, _ in documents] == [("Alice.docx", b"first"), ("Alice(1).docx", b"second")]
+    manifest = read_manifest(path)
+    assert manifest["complete"] is True
+    assert [(d["name"], d["key"], d["size"]) for d in manifest["documents"]] == [
+        ("Alice.docx", "Alice", 5), ("Alice(1).docx", "Alice", 6), ("notes.txt", None, 5)]
+
+
+def test_manifest_marks_an_interrupted_run(tmp_path):
+    path = str(tmp_path / "out.zip")
+    with pytest.raises(RuntimeError):
+        with ArchiveWriter(path) as archive:
+            archive.add("a.docx", b"x")
+            raise RuntimeError("stopped")
+    assert read_manifest(path)["complete"] is False
+
+
+def test_manifest_name_is_never_handed_to_a_document(tmp_path):
+    path = str(tmp_path / "out.zip")
+    with ArchiveWriter(path) as archive:
+        assert archive.add(MANIFEST_NAME, b"{}") == "manifest(1).json"
+    with zipfile.ZipFile(path) as zin:
+        assert zin.namelist() == ["manifest(1).json", MANIFEST_NAME]
+
+
+def test_archive_without_manifest(tmp_path):
+    path = str(tmp_path / "plain.zip")
+    with zipfile.ZipFile(path, "w") as zout:
+        zout.writestr("a.docx", b"x")
+    assert read_manifest(path) == {"documents": []}
+
+
+def test_extract_keeps_mtimes_and_flattens_paths(tmp_path):
+    path = str(tmp_path / "in.zip")
+    with zipfile.ZipFile(path, "w") as zout:
+        zout.writestr(zipfile.ZipInfo("docs/a.docx", date_time=(2020, 1, 2, 3, 4, 6)), b"x")
+    [target] = extract_documents(path, str(tmp_path / "out"))
+    assert target == str(tmp_path / "out" / "a.docx")
+    assert os.path.getmtime(target) == time.mktime((2020, 1, 2, 3, 4, 6, 0, 0, -1))
+
+
+def test_unsupported_extension(tmp_path):
+    assert is_archive("x.TGZ") and not is_archive("x.7z")
+    with pytest.raises(ValueError):
+        ArchiveWriter(str(tmp_path / "out.7z"))
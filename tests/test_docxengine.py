@@ -0,0 +1,33 @@
+import zipfile
+from io import BytesIO
+
+import pytest
+from lxml import etree
+from markupsafe import Markup
+
+from docxengine import CompiledTemplate
+
+
+def test_render_matches_template_text(make_docx, docx_text):
+    tpl = CompiledTemplate(make_docx("t.docx", "Title: {{ title }}", "Fixed text"))
+    assert docx_text(tpl.render({"title": "Ashtanga Hridayam"})) == ["Title: Ashtanga Hridayam", "Fixed text"]
+
+
+def test_special_characters_are_escaped(make_docx, docx_text):
+    tpl = CompiledTemplate(make_docx("t.docx", "{{ title }} by {{ author }}"))
+    data = tpl.render({"title": "Tom & Jerry", "author": "<Hanna> & Barbera"})
+    etree.fromstring(zipfile.ZipFile(BytesIO(data)).read("word/document.xml"))
+    assert docx_text(data) == ["Tom & Jerry by <Hanna> & Barbera"]
+
+
+def test_images_are_inserted_as_markup(make_docx, png_bytes):
+    tpl = CompiledTemplate(make_docx("t.docx", "{{ qrcode }}"))
+    parts = tpl.render_parts({"qrcode": tpl.inline_image(BytesIO(png_bytes))})
+    assert "word/media/compiled_image1.png" in parts
+    assert b"<w:drawing>" in parts["word/document.xml"]
+
+
+def test_broken_markup_fails_the_render(make_docx):
+    tpl = CompiledTemplate(make_docx("t.docx", "{{ title }}"))
+    with pytest.raises(etree.XMLSyntaxError):
+        tpl.render({"title": Markup("<w:r>unclosed")})
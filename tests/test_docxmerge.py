@@ -0,0 +1,93 @@
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from docxmerge import DocxMerger, merge_docx
+
+
+def _with_picture(make_docx, tmp_path, name, text, png_bytes):
+    from docx import Document
+
+    doc = Document(make_docx(name, text))
+    doc.add_picture(BytesIO(png_bytes))
+    path = str(tmp_path / name)
+    doc.save(path)
+    return path
+
+
+def _rewrite(path, target, drop=(), replace=None):
+    """
+    Copy the .docx at path to target without the entries in drop, and with
+    replace = {entry: new bytes}.
+    """
+    with zipfile.ZipFile(path) as zin, zipfile.ZipFile(target, "w") as zout:
+        for info in zin.infolist():
+            if info.filename in drop:
+                continue
+            zout.writestr(info, (replace or {}).get(info.filename, zin.read(info)))
+    return str(target)
+
+
+def test_merge_in_order_with_shared_media(make_docx, docx_text, tmp_path, png_bytes):
+    files = [_with_picture(make_docx, tmp_path, f"{n}.docx", n, png_bytes) for n in ("one", "two", "three")]
+    stats = merge_docx(files, str(tmp_path / "out.docx"))
+    texts = [t for t in docx_text(str(tmp_path / "out.docx")) if t]
+    assert texts == ["one", "two", "three"]
+    assert stats["documents"] == 3
+    assert stats["media_deduplicated"] == 2
+    media = [n for n in zipfile.ZipFile(tmp_path / "out.docx").namelist() if "/media/" in n]
+    assert len(media) == 1
+
+
+def test_bad_first_file_is_skipped(make_docx, docx_text, tmp_path):
+    bad = tmp_path / "bad.docx"
+    bad.write_bytes(b"not a zip file")
+    broken_xml = _rewrite(make_docx("x.docx", "x"), tmp_path / "broken.docx",
+                          replace={"word/document.xml": b"<w:document"})
+    files = [str(bad), broken_xml, make_docx("a.docx", "alpha"), make_docx("b.docx", "beta")]
+    skipped = []
+    stats = merge_docx(files, str(tmp_path / "out.docx"), on_error=lambda path, e: skipped.append(path))
+    assert skipped == [str(bad), broken_xml]
+    assert stats["documents"] == 2
+    assert [t for t in docx_text(str(tmp_path / "out.docx")) if t] == ["alpha", "beta"]
+
+
+def test_bad_middle_file_leaves_nothing_behind(make_docx, docx_text, tmp_path, png_bytes):
+    picture = _with_picture(make_docx, tmp_path, "pic.docx", "missing picture", png_bytes)
+    media = [n for n in zipfile.ZipFile(picture).namelist() if "/media/" in n]
+    missing_media = _rewrite(picture, tmp_path / "missing.docx", drop=media)
+    files = [make_docx("a.docx", "alpha"), missing_media, make_docx("b.docx", "beta")]
+    skipped = []
+    merge_docx(files, str(tmp_path / "out.docx"), on_error=lambda path, e: skipped.append(type(e)))
+    assert skipped == [KeyError]
+    out = zipfile.ZipFile(tmp_path / "out.docx")
+    assert [t for t in docx_text(str(tmp_path / "out.docx")) if t] == ["alpha", "beta"]
+    assert not [n for n in out.namelist() if "/media/" in n]
+    assert out.read("word/document.xml").count(b'w:type="page"') == 1
+
+
+def test_no_documents(tmp_path):
+    merger = DocxMerger(str(tmp_path / "out.docx"))
+    with pytest.raises(ValueError):
+        merger.close()
+
+
+def test_conflicting_style_ids_are_reported(make_docx, tmp_path):
+    from docx import Document
+    from docx.shared import Pt
+
+    same = make_docx("same.docx", "Same styles")
+    first = make_docx("first.docx", "Master")
+    other = tmp_path / "other.docx"
+    doc = Document()
+    doc.add_heading("Own heading", 1)
+    doc.styles["Heading 1"].font.size = Pt(40)
+    doc.save(str(other))
+
+    stats = merge_docx([first, same, str(other)], str(tmp_path / "out.docx"))
+    assert stats["style_conflicts"] == 1
+    with DocxMerger(str(tmp_path / "out2.docx")) as merger:
+        for path in (first, str(other)):
+            merger.append(path)
+    assert merger.style_conflicts == {"Heading1"}
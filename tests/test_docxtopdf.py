@@ -0,0 +1,49 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+import DocxToPdf
+
+
+@pytest.fixture
+def no_converter(monkeypatch):
+    monkeypatch.setattr(DocxToPdf, "find_soffice", lambda: None)
+    real_find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec",
+                        lambda name, *a: None if name == "docx2pdf" else real_find_spec(name, *a))
+
+
+def test_auto_prefers_libreoffice(monkeypatch):
+    monkeypatch.setattr(DocxToPdf, "find_soffice", lambda: "/usr/bin/soffice")
+    assert DocxToPdf.resolve_backend("auto") == "libreoffice"
+
+
+def test_no_converter_is_a_clear_error(no_converter):
+    with pytest.raises(RuntimeError, match="Install LibreOffice or set SOFFICE_PATH"):
+        DocxToPdf.resolve_backend("auto")
+    with pytest.raises(RuntimeError, match="SOFFICE_PATH"):
+        DocxToPdf.resolve_backend("libreoffice")
+    with pytest.raises(RuntimeError, match="docx2pdf is not installed"):
+        DocxToPdf.resolve_backend("docx2pdf")
+
+
+def test_cli_exits_without_traceback(no_converter, monkeypatch, tmp_path, make_docx, capsys):
+    make_docx("a.docx", "a")
+    monkeypatch.setattr(sys, "argv", ["DocxToPdf.py", str(tmp_path), str(tmp_path / "final")])
+    with pytest.raises(SystemExit) as exit_info:
+        DocxToPdf.main()
+    assert exit_info.value.code == 1
+    assert "Error: No PDF converter found" in capsys.readouterr().out
+    assert not os.path.exists(tmp_path / "final")
+
+
+def test_up_to_date_files_are_skipped(monkeypatch, tmp_path, make_docx):
+    docx = make_docx("a.docx", "a")
+    final = tmp_path / "final"
+    final.mkdir()
+    (final / "a.pdf").write_bytes(b"%PDF")
+    os.utime(docx, (0, 0))
+    monkeypatch.setattr(DocxToPdf, "find_soffice", lambda: "/usr/bin/soffice")
+    assert DocxToPdf.convert_folder(str(tmp_path), str(final)) == (0, 1, [])
@@ -0,0 +1,52 @@
+from io import BytesIO
+
+from PIL import Image
+
+import imagecache
+
+
+def _save(path, mode, color, fmt, size=(900, 600)):
+    Image.new(mode, size, color).save(path, format=fmt)
+    return str(path)
+
+
+def test_transparent_webp_becomes_white_backed_jpeg(tmp_path):
+    src = _save(tmp_path / "leaf.webp", "RGBA", (0, 128, 0, 0), "WEBP")
+    data, ext = imagecache.normalize_image(src, 450)
+    assert ext == "jpg"
+    img = Image.open(BytesIO(data))
+    assert img.size == (450, 300)
+    assert all(c > 245 for c in img.getpixel((10, 10)))
+
+
+def test_lossless_sources_stay_png(tmp_path):
+    src = _save(tmp_path / "diagram.png", "RGBA", (10, 20, 30, 128), "PNG", (200, 100))
+    data, ext = imagecache.normalize_image(src, 450)
+    assert ext == "png"
+    assert Image.open(BytesIO(data)).size == (200, 100)  # never upscaled
+
+
+def test_cache_reuses_conversions(tmp_path):
+    src = _save(tmp_path / "photo.jpg", "RGB", (200, 100, 50), "JPEG")
+    cache = imagecache.ImageCache(str(tmp_path / "cache"))
+    first = cache.get(src)
+    assert cache.get(src) == first
+    assert imagecache.ImageCache(str(tmp_path / "cache")).get(src) == first  # from disk
+    assert cache.stats == {"hits": 1, "misses": 1}
+
+    _save(src, "RGB", (0, 0, 255), "JPEG")  # edited image is converted again
+    assert cache.get(src) != first
+    assert cache.stats["misses"] == 2
+
+
+def test_memory_keeps_only_recent_images(tmp_path, monkeypatch):
+    monkeypatch.setattr(imagecache, "MAX_ENTRIES", 2)
+    cache = imagecache.ImageCache(str(tmp_path / "cache"))
+    paths = [_save(tmp_path / f"p{i}.jpg", "RGB", (100 * i, 50, 0), "JPEG", (40, 30)) for i in range(3)]
+    for path in paths:
+        cache.get(path)
+    assert len(cache._memory) == 2
+    # The dropped image comes back from disk, not from a new conversion
+    cache.get(paths[0])
+    assert cache.stats == {"hits": 1, "misses": 3}
+    assert list(cache._memory) == [cache.key(paths[2]), cache.key(paths[0])]
@@ -0,0 +1,64 @@
+"""
+The build manifest (buildmanifest.py) and main.py --incremental.
+"""
+import csv
+import os
+import sys
+
+import pytest
+
+import main
+from buildmanifest import BuildManifest, fingerprint
+from conftest import ROOT
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.symlink(os.path.join(ROOT, "assets"), tmp_path / "assets")
+    return tmp_path
+
+
+def _run(monkeypatch, workdir, template, title, *options):
+    with open(workdir / "rows.csv", "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["name", "url", "title"])
+        writer.writerow(["a", "https://example.com/a", title])
+    monkeypatch.setattr(sys, "argv", ["main.py", "rows.csv", template, "jignasa", "--engine", "compiled",
+                                      "--no-server", *options])
+    main.main()
+
+
+def test_fingerprint_is_stable():
+    assert fingerprint({"b": 1, "a": 2}, "x") == fingerprint({"a": 2, "b": 1}, "x")
+    assert fingerprint({"a": 1}) != fingerprint({"a": 2})
+
+
+def test_manifest_remove_stale_only_touches_known_files(tmp_path):
+    for name in ("known.docx", "gone.docx", "foreign.docx"):
+        (tmp_path / name).write_bytes(b"x")
+    manifest = BuildManifest(str(tmp_path))
+    manifest.record("known.docx", "1")
+    manifest.record("gone.docx", "2")
+    assert manifest.remove_stale({"known.docx"}) == ["gone.docx"]
+    assert sorted(os.listdir(tmp_path)) == ["foreign.docx", "known.docx"]
+    manifest.save()
+    assert BuildManifest(str(tmp_path)).outputs == {"known.docx": "1"}
+
+
+def test_incremental_after_full_run_uses_current_inputs(monkeypatch, workdir, make_docx, docx_text, capsys):
+    template = make_docx("template.docx", "{{ title }}")
+    _run(monkeypatch, workdir, template, "First", "--incremental")
+    # A normal run rewrites docs/a.docx from other inputs...
+    _run(monkeypatch, workdir, template, "Second")
+    assert docx_text("docs/a.docx") == ["Second"]
+    capsys.readouterr()
+
+    # ...so an incremental run with the first inputs again must rebuild it
+    _run(monkeypatch, workdir, template, "First", "--incremental")
+    assert "1 of 1 rows changed" in capsys.readouterr().out
+    assert docx_text("docs/a.docx") == ["First"]
+
+    # and one with unchanged inputs skips it
+    _run(monkeypatch, workdir, template, "First", "--incremental")
+    assert "0 of 1 rows changed" in capsys.readouterr().out
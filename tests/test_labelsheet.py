@@ -0,0 +1,53 @@
+import sys
+
+import pytest
+from PIL import Image
+
+import labelsheet
+from labelsheet import iter_pages, plan_layout
+
+
+def test_default_a4_grid():
+    layout = plan_layout("a4")
+    assert layout.page_px == (2480, 3508)
+    # 244 mm x 277 mm usable, 20 mm codes 3 mm apart
+    assert (layout.rows, layout.cols) == (12, 8)
+    assert layout.origin_px == (118, 118) and layout.code_px == 236
+    right = layout.origin_px[0] + layout.cols * layout.cell_px[0] + (layout.cols - 1) * layout.gap_px
+    assert right <= layout.page_px[0] - 118
+
+
+def test_captions_and_fixed_grid():
+    assert plan_layout("a4", caption_pt=8).rows < plan_layout("a4").rows
+    layout = plan_layout("letter", rows=3, cols=2, size_mm=40)
+    assert (layout.rows, layout.cols) == (3, 2)
+    assert layout.cell_px[0] >= layout.code_px and layout.cell_px[1] >= layout.code_px
+
+
+@pytest.mark.parametrize("options", [{"size_mm": 300}, {"rows": 40}, {"paper": "a3"}])
+def test_codes_that_do_not_fit(options):
+    with pytest.raises(ValueError):
+        plan_layout(**options)
+
+
+def _codes(count, size):
+    code = Image.new("RGB", (size, size), (0, 0, 0))
+    return [(i, f"c{i}", (code.mode, code.size, code.tobytes()), []) for i in range(count)]
+
+
+@pytest.mark.parametrize("count, pages", [(0, 0), (1, 1), (6, 1), (7, 2), (13, 3)])
+def test_page_count(count, pages):
+    layout = plan_layout("a4", rows=3, cols=2, size_mm=40)
+    sheets = list(iter_pages(_codes(count, layout.code_px), layout))
+    assert len(sheets) == pages
+    assert all(sheet.size == layout.page_px for sheet in sheets)
+
+
+def test_cli_writes_one_png_per_sheet(tmp_path, monkeypatch):
+    csv_path = tmp_path / "rows.csv"
+    csv_path.write_text("name,url\n" + "".join(f"n{i},https://ex.am/{i}\n" for i in range(5)), encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["labelsheet.py", str(csv_path), str(tmp_path / "labels.png"),
+                                      "--style", "plain", "--rows", "2", "--cols", "1", "--size-mm", "30"])
+    labelsheet.main()
+    assert sorted(p.name for p in tmp_path.glob("labels-*.png")) == [
+        "labels-001.png", "labels-002.png", "labels-003.png"]
@@ -0,0 +1,43 @@
+import os
+
+from PIL import Image
+
+import logocache
+
+
+def _logo(path, color=(200, 0, 0)):
+    image = Image.new("RGB", (200, 100), (255, 255, 255))
+    image.paste(color, (50, 25, 150, 75))
+    image.save(path)
+    return str(path)
+
+
+def test_prepared_once_and_white_made_transparent(tmp_path):
+    logocache.clear_cache()
+    path = _logo(tmp_path / "logo.png")
+    logo = logocache.prepare_logo(path, 60)
+    assert logocache.prepare_logo(path, 60) is logo
+    assert logocache.cache_info() == {"hits": 1, "misses": 1, "size": 1}
+    assert logo.size == (60, 30)
+    assert logo.getpixel((0, 0))[3] == 0
+    assert logo.getpixel((30, 15)) == (200, 0, 0, 255)
+
+
+def test_edited_logo_is_prepared_again(tmp_path):
+    logocache.clear_cache()
+    path = _logo(tmp_path / "logo.png")
+    first = logocache.prepare_logo(path, 60)
+    _logo(path, (0, 0, 200))
+    os.utime(path, (1, 1))
+    second = logocache.prepare_logo(path, 60)
+    assert second is not first
+    assert second.getpixel((30, 15)) == (0, 0, 200, 255)
+
+
+def test_least_recently_used_are_dropped(tmp_path, monkeypatch):
+    logocache.clear_cache()
+    monkeypatch.setattr(logocache, "MAX_ENTRIES", 2)
+    path = _logo(tmp_path / "logo.png")
+    for size in (10, 20, 30):
+        logocache.prepare_logo(path, size)
+    assert logocache.cache_info()["size"] == 2
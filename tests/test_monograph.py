@@ -0,0 +1,53 @@
+from io import BytesIO
+
+from docx import Document
+
+from monograph import MonographTemplate, replace_placeholders
+
+
+def _template(tmp_path):
+    doc = Document()
+    doc.add_paragraph("No placeholder here")
+    para = doc.add_paragraph()
+    para.add_run("Name: {{sanskrit")  # placeholder split across runs
+    para.add_run("name}} ({{familyname}})")
+    table = doc.add_table(rows=2, cols=3)
+    table.cell(0, 0).text = "{{englishname}}"
+    table.cell(0, 1).text = "plain"
+    merged = table.cell(1, 0).merge(table.cell(1, 2))
+    merged.text = "Uses: {{benefit}}"
+    path = str(tmp_path / "template.docx")
+    doc.save(path)
+    return path
+
+
+def _texts(doc):
+    return ([p.text for p in doc.paragraphs],
+            [[cell.text for cell in row.cells] for table in doc.tables for row in table.rows])
+
+
+ROWS = [
+    {"sanskritname": "Tulasi", "familyname": "Lamiaceae", "englishname": "Holy basil", "benefit": "Cough"},
+    {"sanskritname": "Nimba", "familyname": "Meliaceae", "englishname": "Neem", "benefit": "Skin"},
+]
+
+
+def test_index_finds_split_runs_and_tables_once(tmp_path):
+    template = MonographTemplate(_template(tmp_path))
+    assert template.paragraphs == [1]
+    # The merged cell spans three grid cells but is recorded once
+    assert template.cells == [(0, 0, 0), (0, 1, 0)]
+
+
+def test_fill_matches_full_scan_for_every_row(tmp_path):
+    path = _template(tmp_path)
+    template = MonographTemplate(path)
+    for row in ROWS:
+        out = BytesIO()
+        template.fill(row, out)
+        expected = Document(path)
+        replace_placeholders(expected, row)
+        assert _texts(Document(out)) == _texts(expected)
+    paragraphs, cells = _texts(Document(out))
+    assert paragraphs[1] == "Name: Nimba (Meliaceae)"
+    assert cells == [["Neem", "plain", ""], ["Uses: Skin"] * 3]
@@ -0,0 +1,28 @@
+from outputnames import NameAllocator
+
+
+def test_duplicates_get_counters():
+    names = NameAllocator()
+    assert [names.allocate(n) for n in ("a", "a", "a.docx", "b.pdf", "b.pdf")] == [
+        "a.docx", "a(1).docx", "a(2).docx", "b.pdf", "b(1).pdf"]
+
+
+def test_existing_files_in_folder_are_skipped(tmp_path):
+    for name in ("a.docx", "a(1).docx", "a(3).docx"):
+        (tmp_path / name).write_bytes(b"")
+    names = NameAllocator(str(tmp_path))
+    assert [names.allocate("a") for _ in range(3)] == ["a(2).docx", "a(4).docx", "a(5).docx"]
+
+
+def test_taken_set_replaces_the_folder_listing(tmp_path):
+    (tmp_path / "a.docx").write_bytes(b"")
+    names = NameAllocator(str(tmp_path), taken={"manifest.json"})
+    assert names.allocate("a") == "a.docx"
+    assert names.allocate("manifest.json") == "manifest(1).json"
+
+
+def test_counter_name_already_used_as_a_base():
+    names = NameAllocator()
+    assert names.allocate("a(1)") == "a(1).docx"
+    assert names.allocate("a") == "a.docx"
+    assert names.allocate("a") == "a(2).docx"
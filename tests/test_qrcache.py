@@ -0,0 +1,57 @@
+import os
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import qrcache
+import styles
+from conftest import ROOT
+from qrcache import QRCache, cached_png
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(qrcache, "_default_cache", None)
+    return qrcache.configure(str(tmp_path / "cache"))
+
+
+def test_hit_and_miss(cache, png_bytes):
+    calls = []
+
+    def render():
+        calls.append(1)
+        return Image.open(BytesIO(png_bytes))
+
+    first = cached_png(render, "https://ex.am/a", "simple", size=4)
+    second = cached_png(render, "https://ex.am/a", "simple", size=4)
+    cached_png(render, "https://ex.am/b", "simple", size=4)
+    assert first == second and len(calls) == 2
+    assert cache.stats == {"hits": 1, "misses": 2, "evictions": 0}
+
+
+def test_prune_removes_least_recently_used(tmp_path):
+    cache = QRCache(str(tmp_path), max_bytes=250)
+    keys = [cache.key(f"p{i}", "simple") for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, b"x" * 100)
+        os.utime(cache._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get(keys[0])  # now the most recently used
+    cache.put(keys[2], b"x" * 100)
+    assert cache.stats["evictions"] == 1
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert cache.usage() == (2, 200)
+    assert cache.clear() == 2
+
+
+def test_key_covers_the_style_not_just_its_name(tmp_path, monkeypatch):
+    monkeypatch.setattr(styles, "STYLES", dict(styles.STYLES))
+    logo = os.path.join(ROOT, styles.get_style("jignasa").logo_path)
+    cache = QRCache(str(tmp_path))
+    red = styles.register_style("mine", (200, 0, 0), (255, 255, 255), logo)
+    blue = styles.register_style("mine", (0, 0, 200), (255, 255, 255), logo)
+    assert cache.key("u", red) != cache.key("u", blue)
+    assert cache.key("u", blue) == cache.key("u", styles.get_style("mine"))
+    assert cache.key("u", red) != cache.key("u", red._replace(final_size=600))
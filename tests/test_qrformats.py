@@ -0,0 +1,51 @@
+"""
+QR image formats embedded in the documents (main.py --qr-format).
+"""
+import csv
+import glob
+import os
+import sys
+import zipfile
+from io import BytesIO
+
+from PIL import Image
+
+import main
+import styles
+from conftest import ROOT
+
+URL = "https://example.com/books/ashtanga-hridayam"
+
+
+def test_svg_fallback_is_small(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    svg, png = styles.generate_svg_with_fallback(URL, "jignasa")
+    size = Image.open(BytesIO(png)).size[0]
+    modules = int(svg.split(b'viewBox="0 0 ')[1].split(b" ")[0])
+    assert size == modules * styles.SVG_FALLBACK_BOX
+    assert svg.count(b"<image ") == 1
+
+
+def test_svg_documents_are_smaller_than_png(monkeypatch, tmp_path, make_docx):
+    template = make_docx("template.docx", "{{ title }}", "{{ qrcode }}")
+    rows = tmp_path / "rows.csv"
+    with open(rows, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["name", "url", "title"])
+        writer.writerows([["a", URL + "?a", "A"], ["b", URL + "?b", "B"]])
+    sizes = {}
+    for qr_format in ("png", "svg"):
+        out = tmp_path / qr_format
+        out.mkdir()
+        monkeypatch.chdir(out)
+        os.symlink(os.path.join(ROOT, "assets"), out / "assets")
+        monkeypatch.setattr(sys, "argv", ["main.py", str(rows), template, "jignasa", "--engine", "compiled",
+                                          "--qr-format", qr_format, "--no-server"])
+        main.main()
+        files = glob.glob(str(out / "docs" / "*.docx"))
+        assert len(files) == 2
+        sizes[qr_format] = sum(os.path.getsize(f) for f in files)
+        if qr_format == "svg":
+            names = zipfile.ZipFile(files[0]).namelist()
+            assert any(n.endswith(".svg") for n in names)
+    assert sizes["svg"] < sizes["png"]
@@ -0,0 +1,45 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from qrmatrix import Target, encode, parse_targets, size_to_px
+
+
+@pytest.mark.parametrize("size, dpi, px", [(300, 300, 300), ("96px", 300, 96), ("1in", 300, 300),
+                                           ("2.54cm", 100, 100), ("10mm", 254, 100)])
+def test_size_to_px(size, dpi, px):
+    assert size_to_px(size, dpi) == px
+
+
+@pytest.mark.parametrize("size", ["", "1ft", "-3px", "0.1px"])
+def test_size_to_px_rejects(size):
+    with pytest.raises(ValueError):
+        size_to_px(size)
+
+
+def test_parse_targets():
+    assert parse_targets("1in:png,vishwanath:2cm:jpg,plain:96px:png:96", "jignasa") == [
+        Target("jignasa", "1in", "png", 300), Target("vishwanath", "2cm", "jpg", 300),
+        Target("plain", "96px", "png", 96)]
+
+
+@pytest.mark.parametrize("value", ["", "nostyle:1in", "1in:gif", "1in:png:x", "1in:png:300:extra"])
+def test_parse_targets_rejects(value):
+    with pytest.raises(ValueError):
+        parse_targets(value)
+
+
+def test_matrix_pickles_packed_bits_only():
+    matrix = encode("https://example.com/x", ecl="M")
+    copy = pickle.loads(pickle.dumps(matrix))
+    assert copy._modules is None
+    assert (copy.version, copy.ecl, copy.total) == (matrix.version, "M", matrix.size + 2 * matrix.border)
+    assert np.array_equal(copy.modules, matrix.modules)
+
+
+def test_render_many_formats():
+    matrix = encode("https://example.com/x")
+    png, jpg, svg = matrix.render_many([Target("plain", "64px", "png", 96), Target("plain", "64px", "jpg", 96),
+                                        Target("plain", "64px", "svg", 96)])
+    assert png.startswith(b"\x89PNG") and jpg.startswith(b"\xff\xd8") and b"<svg" in svg[:500]
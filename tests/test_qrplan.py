@@ -0,0 +1,64 @@
+import sys
+
+import pytest
+
+import qrplan
+from qrplan import QRPlan, compact_url, parse_rules
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://ex.am/p?usp=sharing", "https://ex.am/p"),
+    ("https://ex.am/p?id=7&utm_source=x&fbclid=abc", "https://ex.am/p?id=7"),
+    ("https://ex.am/p?UTM_Medium=x&id=7#top", "https://ex.am/p?id=7#top"),
+    # bare keys and blank values stay as written
+    ("https://ex.am/p?foo&usp=drivesdk", "https://ex.am/p?foo"),
+    ("https://ex.am/p?foo=&bar", "https://ex.am/p?foo=&bar"),
+    # already percent-encoded values are not encoded a second time or decoded
+    ("https://ex.am/p?q=a%20b%2Fc&gclid=1", "https://ex.am/p?q=a%20b%2Fc"),
+    ("https://ex.am/p?q=a+b&name=%E0%A4%85", "https://ex.am/p?q=a+b&name=%E0%A4%85"),
+    # an encoded tracking key is still recognised
+    ("https://ex.am/p?utm%5Fsource=x&id=1", "https://ex.am/p?id=1"),
+])
+def test_strip_tracking_keeps_other_params_verbatim(url, expected):
+    assert compact_url(url, ("strip-tracking",)) == expected
+
+
+def test_upper_host_leaves_path_and_query():
+    assert (compact_url("https://ex.am/Path?a=B", ("upper-host",))
+            == "HTTPS://EX.AM/Path?a=B")
+    assert compact_url("https://user@ex.am/", ("upper-host",)) == "https://user@ex.am/"
+
+
+def test_non_urls_and_no_rules_unchanged():
+    assert compact_url("  plain text  ") == "plain text"
+    assert compact_url("https://ex.am/?usp=sharing", ()) == "https://ex.am/?usp=sharing"
+
+
+def test_parse_rules():
+    assert parse_rules(None) == ()
+    assert parse_rules("strip-tracking, upper-host") == ("strip-tracking", "upper-host")
+    with pytest.raises(ValueError):
+        parse_rules("shorten")
+
+
+def test_rows_with_the_same_name_are_kept_apart():
+    plan = QRPlan(ecl="L")
+    plan.add("dup", "https://ex.am/a")
+    plan.add("dup", "https://ex.am/" + "b" * 300)
+    lines = plan.row_report().splitlines()[1:]
+    assert len(lines) == 2
+    # Each row's highest ECL is worked out from its own payload, not the last 'dup'
+    assert [line.split()[:2] for line in lines] == [
+        [str(version), qrplan.best_ecl(payload, version)]
+        for (_, version, _, _), payload in zip(plan.rows, ("https://ex.am/a", "https://ex.am/" + "b" * 300))]
+    assert plan.rows[0][1] < plan.rows[1][1]
+
+
+def test_main_reports_a_missing_url_column(tmp_path, monkeypatch, capsys):
+    csv_path = tmp_path / "rows.csv"
+    csv_path.write_text("name,link\nTom,https://ex.am\n", encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["qrplan.py", str(csv_path)])
+    with pytest.raises(SystemExit) as exit_info:
+        qrplan.main()
+    assert exit_info.value.code == 1
+    assert capsys.readouterr().out.strip() == f"Error: {csv_path} has no 'url' column"
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+import qrcode
+from qrcode.image.styledpil import StyledPilImage
+from qrcode.image.styles.colormasks import SolidFillColorMask
+from qrcode.image.styles.moduledrawers import CircleModuleDrawer
+
+from qrraster import module_layout, rasterize_circles
+
+FRONT = (0, 102, 51)
+BACK = (255, 250, 240)
+
+
+def _qrcode_image(box_size):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=box_size, border=4)
+    qr.add_data("https://example.com/raster")
+    qr.make(fit=True)
+    image = qr.make_image(image_factory=StyledPilImage, module_drawer=CircleModuleDrawer(),
+                          color_mask=SolidFillColorMask(front_color=FRONT, back_color=BACK))
+    return qr.modules, np.asarray(image.convert("RGB"), dtype=np.int16)
+
+
+@pytest.mark.parametrize("box_size", [4, 10, 25])
+def test_matches_styled_pil_image(box_size):
+    modules, expected = _qrcode_image(box_size)
+    actual = np.asarray(rasterize_circles(modules, box_size, FRONT, BACK), dtype=np.int16)
+    assert actual.shape == expected.shape
+    diff = np.abs(actual - expected)
+    # Same modules and eyes; only the anti-aliased dot edges may round differently
+    assert diff.mean() < 1.0
+    assert (diff.max(axis=-1) > 32).mean() < 0.01
+
+
+def test_layout_keeps_quiet_zone_and_eyes():
+    modules, _ = _qrcode_image(1)
+    dots, squares = module_layout(modules)
+    assert dots.shape == (len(modules) + 8, len(modules) + 8)
+    assert not dots[:4].any() and not squares[:4].any()
+    assert squares[4:11, 4:11].sum() == 33  # 7x7 finder: 24 ring + 9 centre modules
+    assert not (dots & squares).any()
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+import styles
+from conftest import ROOT
+
+
+@pytest.fixture(autouse=True)
+def in_repo(monkeypatch):
+    monkeypatch.chdir(ROOT)  # styles name their logos relative to the repository
+
+
+def _pixels(image):
+    return np.asarray(image.convert("RGB"), dtype=np.int16)
+
+
+@pytest.mark.parametrize("style", ["jignasa", "vishwanath"])
+def test_direct_matches_legacy(style):
+    legacy = styles.generate_qr("https://example.com/render", style, render="legacy")
+    direct = styles.generate_qr("https://example.com/render", style, render="direct")
+    assert direct.size == legacy.size == (styles.get_style(style).final_size,) * 2
+    assert direct.mode == legacy.mode
+    diff = np.abs(_pixels(direct) - _pixels(legacy))
+    # Same modules, logo and colors; only resampling differs
+    assert diff.mean() < 3.0
+    assert (diff.max(axis=-1) > 64).mean() < 0.005
+
+
+def test_direct_honours_version_and_ecl():
+    small = styles.generate_qr("https://example.com/render", "jignasa", render="direct")
+    fixed = styles.generate_qr("https://example.com/render", "jignasa", render="direct", version=10)
+    assert fixed.size == small.size
+    assert np.abs(_pixels(fixed) - _pixels(small)).mean() > 5  # finer modules
+
+
+def test_unknown_render_mode():
+    with pytest.raises(ValueError):
+        styles.generate_qr("https://example.com/render", "jignasa", render="fast")
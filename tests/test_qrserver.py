@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from conftest import ROOT
+
+from qrserver import QRServer
+
+
+def exchange(raw, pool=None, app=None):
+    """
+    Send raw request bytes to a QRServer on a free port and return (status line, JSON body).
+    """
+    app = app or QRServer(pool, 1)
+
+    async def run():
+        server = await asyncio.start_server(app.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        return response
+
+    head, _, body = asyncio.run(run()).partition(b"\r\n\r\n")
+    return head.split(b"\r\n")[0].decode(), body
+
+
+def post_qr(url):
+    payload = json.dumps({"url": url}).encode()
+    return (b"POST /qr HTTP/1.1\r\nConnection: close\r\nContent-Length: %d\r\n\r\n" % len(payload)) + payload
+
+
+def broken_pool():
+    """
+    A process pool whose only worker has died.
+    """
+    pool = ProcessPoolExecutor(1)
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+    return pool
+
+
+def test_bad_content_length_is_400():
+    status, body = exchange(b"POST /qr HTTP/1.1\r\nContent-Length: abc\r\n\r\n")
+    assert status == "HTTP/1.1 400 Bad Request"
+    assert json.loads(body) == {"error": "Invalid Content-Length header"}
+
+
+def test_negative_content_length_is_400():
+    status, _ = exchange(b"POST /qr HTTP/1.1\r\nContent-Length: -5\r\n\r\n")
+    assert status == "HTTP/1.1 400 Bad Request"
+
+
+def test_health_and_unknown_endpoint():
+    status, body = exchange(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert status == "HTTP/1.1 200 OK"
+    assert json.loads(body)["status"] == "ok"
+
+    status, _ = exchange(b"GET /nope HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert status == "HTTP/1.1 404 Not Found"
+
+
+def test_invalid_json_is_400():
+    status, body = exchange(b"POST /qr HTTP/1.1\r\nContent-Length: 3\r\nConnection: close\r\n\r\n{x}")
+    assert status == "HTTP/1.1 400 Bad Request"
+    assert json.loads(body)["error"].startswith("Invalid JSON")
+
+
+def test_qr_job_renders_png(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    with ThreadPoolExecutor(1) as pool:
+        status, body = exchange(post_qr("https://example.com/a"), pool)
+    assert status == "HTTP/1.1 200 OK"
+    assert body.startswith(b"\x89PNG")
+
+
+def test_dead_worker_pool_is_restarted(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    with ThreadPoolExecutor(1) as spare:
+        app = QRServer(broken_pool(), 1, make_pool=lambda: spare)
+        status, body = exchange(post_qr("https://example.com/a"), app=app)
+        assert status == "HTTP/1.1 200 OK"
+        assert body.startswith(b"\x89PNG")
+        status, body = exchange(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n", app=app)
+    assert status == "HTTP/1.1 200 OK"
+    assert json.loads(body)["pool_restarts"] == 1
+
+
+def test_dead_worker_pool_without_restart_is_reported():
+    app = QRServer(broken_pool(), 1)
+    status, body = exchange(post_qr("https://example.com/a"), app=app)
+    assert status == "HTTP/1.1 500 Internal Server Error"
+    assert json.loads(body)["error"].startswith("BrokenProcessPool")
+    status, body = exchange(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n", app=app)
+    assert status == "HTTP/1.1 503 Service Unavailable"
+    assert json.loads(body)["status"] == "broken"
+
+
+def test_qr_job_input_error_is_400(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    payload = json.dumps({"url": "https://example.com/a", "ecl": "Z"}).encode()
+    raw = (b"POST /qr HTTP/1.1\r\nConnection: close\r\nContent-Length: %d\r\n\r\n" % len(payload)) + payload
+    with ThreadPoolExecutor(1) as pool:
+        status, body = exchange(raw, pool)
+    assert status == "HTTP/1.1 400 Bad Request"
+    assert "error correction" in json.loads(body)["error"]
+
+
+def test_forwarded_row_reports_a_dropped_response(monkeypatch):
+    import http.client
+
+    import main
+    import qrclient
+
+    def dropped(*args):
+        raise http.client.IncompleteRead(b"PK")
+
+    monkeypatch.setattr(qrclient, "render_document", dropped)
+    index, name, data, error, _, _ = main.forward_row((3, {"name": "Tom", "url": "https://ex.am"}), "t.docx",
+                                                      "jignasa", "compiled", "legacy", "png", (), None, "H")
+    assert (index, name, data) == (3, "Tom", None)
+    assert error.startswith("IncompleteRead")
@@ -0,0 +1,55 @@
+import subprocess
+import sys
+
+import pytest
+
+import qrtool
+import styles
+from conftest import ROOT
+
+HEAVY = ("PIL", "numpy", "qrcode", "docx", "docxtpl", "lxml", "pandas")
+
+
+@pytest.mark.parametrize("argv", [["--help"], ["qr", "--help"], ["batch", "--help"]])
+def test_help_does_not_import_the_rendering_stack(argv):
+    code = ("import sys, qrtool\n"
+            "try:\n    qrtool.main(%r)\nexcept SystemExit:\n    pass\n"
+            "print('imported:' + ','.join(m for m in %r if m in sys.modules))" % (argv, HEAVY))
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines()[-1] == "imported:"
+
+
+def test_register_and_replace_style(monkeypatch):
+    monkeypatch.setattr(styles, "STYLES", dict(styles.STYLES))
+    style = styles.register_style("Mine", [1, 2, 3], (4, 5, 6), "logo.png", "120", "jpg")
+    assert styles.get_style("MINE") == style == ("mine", (1, 2, 3), (4, 5, 6), "logo.png", 120, "jpg")
+    replaced = styles.register_style("mine", (9, 9, 9), (0, 0, 0), "logo.png")
+    assert styles.get_style("mine") is replaced
+    with pytest.raises(ValueError):
+        styles.register_style("bad", (0, 0, 0), (1, 1, 1), "logo.png", output_format="gif")
+    with pytest.raises(ValueError):
+        styles.get_style("nope")
+
+
+def test_styles_command_lists_registered_styles(monkeypatch, capsys):
+    monkeypatch.setattr(styles, "STYLES", dict(styles.STYLES))
+    styles.register_style("mine", (255, 0, 16), (0, 0, 0), "logo.png", 90)
+    qrtool.main(["styles"])
+    out = capsys.readouterr().out
+    assert "jignasa" in out and "vishwanath" in out
+    assert "mine" in out and "#ff0010" in out and "90px" in out
+
+
+def test_qr_command_writes_the_file(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv("QR_SERVER", "off")
+    monkeypatch.setattr("qrclient._health", None)
+    qrtool.main(["qr", "jignasa", str(tmp_path / "code"), "https://example.com/tool", "--render", "direct"])
+    assert (tmp_path / "code.png").read_bytes().startswith(b"\x89PNG")
+    assert "saved to" in capsys.readouterr().out
+
+
+def test_unknown_command_exits_2():
+    with pytest.raises(SystemExit) as exit_info:
+        qrtool.main(["frobnicate"])
+    assert exit_info.value.code == 2
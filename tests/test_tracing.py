@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture(autouse=True)
+def no_tracer():
+    tracing.configure(None)
+    yield
+    tracing.configure(None)
+
+
+def test_spans_are_free_when_off():
+    with tracing.row("a"):
+        with tracing.span("qr_encode") as ev:
+            ev["bytes"] = 1
+    assert tracing.get_tracer() is None
+    assert tracing.take_events() == []
+
+
+def test_jsonl_events_and_summary(tmp_path, capsys):
+    path = str(tmp_path / "profile.jsonl")
+    tracing.configure(path)
+    with tracing.row("Tom"):
+        with tracing.span("docx_save") as ev:
+            ev["bytes"] = 2048
+    tracing.finish()
+
+    with open(path, encoding="utf-8") as fh:
+        events = [json.loads(line) for line in fh]
+    assert [(e["stage"], e["row"]) for e in events] == [("docx_save", "Tom"), ("row", "Tom")]
+    assert events[0]["bytes"] == 2048 and events[0]["dur"] >= 0
+    out = capsys.readouterr().out
+    assert "docx_save" in out and "Slowest rows:" in out and "Tom" in out
+
+
+def test_worker_events_reach_the_chrome_trace(tmp_path):
+    # A worker buffers its spans and hands them to the parent with its result
+    tracing.start_buffer()
+    with tracing.row(3):
+        with tracing.span("qr_render"):
+            pass
+    events = tracing.take_events()
+    assert tracing.take_events() == []
+
+    path = str(tmp_path / "trace.json")
+    tracing.configure(path)
+    tracing.add_events(events)
+    tracing.finish()
+    with open(path, encoding="utf-8") as fh:
+        trace = json.load(fh)
+    assert [(e["name"], e["args"]["row"], e["ph"]) for e in trace] == [("qr_render", 3, "X"), ("row", 3, "X")]
+
+
+def test_invalid_format(tmp_path):
+    with pytest.raises(ValueError):
+        tracing.configure(str(tmp_path / "p.txt"), "csv")
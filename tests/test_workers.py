@@ -0,0 +1,52 @@
+"""
+main.py --workers: rows rendered on several processes come out as in a serial run.
+"""
+import csv
+import os
+import sys
+
+import pytest
+
+import main
+from conftest import ROOT
+from docarchive import iter_documents
+
+ROWS = 6  # more than one chunk of pool.imap per worker
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.symlink(os.path.join(ROOT, "assets"), tmp_path / "assets")
+    with open(tmp_path / "rows.csv", "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["name", "url", "title"])
+        for i in range(ROWS):
+            # Duplicate names too: the archive numbers them in CSV order
+            writer.writerow([f"row{i % 4}", f"https://example.com/{i}", f"Title {i}"])
+    return tmp_path
+
+
+def _run(monkeypatch, template, engine, archive, *options):
+    monkeypatch.setattr(sys, "argv", ["main.py", "rows.csv", template, "jignasa", "--engine", engine,
+                                      "--no-server", "--render", "direct", "--archive", archive, *options])
+    main.main()
+    return list(iter_documents(archive))
+
+
+def test_compiled_workers_match_serial_run_byte_for_byte(monkeypatch, workdir, make_docx):
+    template = make_docx("template.docx", "{{ title }}")
+    serial = _run(monkeypatch, template, "compiled", "serial.zip")
+    parallel = _run(monkeypatch, template, "compiled", "parallel.zip", "--workers", "3")
+    assert [name for name, _, _ in serial] == [f"row{i}.docx" for i in range(4)] + [
+        "row0(1).docx", "row1(1).docx"]
+    assert [(name, data) for name, data, _ in parallel] == [(name, data) for name, data, _ in serial]
+
+
+def test_docxtpl_workers_match_serial_content(monkeypatch, workdir, make_docx, docx_text):
+    template = make_docx("template.docx", "{{ title }}")
+    serial = _run(monkeypatch, template, "docxtpl", "serial.zip")
+    parallel = _run(monkeypatch, template, "docxtpl", "parallel.zip", "--workers", "3")
+    assert ([(name, docx_text(data)) for name, data, _ in parallel]
+            == [(name, docx_text(data)) for name, data, _ in serial])
+    assert docx_text(serial[-1][1]) == [f"Title {ROWS - 1}"]
@@ -0,0 +1,245 @@
+"""
+tracing.py
+----------
+Per-row, per-stage timing for the batch scripts (enabled with --profile).
+
+Code marks its stages with spans:
+
+    with tracing.row(name):
+        with tracing.span("qr_encode"):
+            ...
+        with tracing.span("docx_save") as ev:
+            doc.save(buf)
+            ev["bytes"] = buf.tell()
+
+When profiling is off (the default) a span does nothing beyond entering a shared
+no-op context. When it is on, every span becomes an event with its stage name, the
+current row, start time, duration and optional byte count. Events are written as
+they happen, either as JSON lines or in Chrome's trace-event format (open it in
+chrome://tracing or https://ui.perfetto.dev), and a summary of the slowest stages
+and rows is printed at the end of the run.
+
+Worker processes use a buffering tracer (see start_buffer/take_events); their
+events are handed back to the parent with each result and written there.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+FORMATS = ("jsonl", "chrome")
+ROW_STAGE = "row"  # span covering a whole row; used for the slowest-rows table
+
+_tracer = None
+_local = threading.local()
+
+
+class _NullSpan(object):
+    """
+    Context manager used for every span while profiling is off.
+    """
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer(object):
+    """
+    Collects span events. With a path they are streamed to that file, otherwise
+    they are kept in memory until take_events() is called.
+    """
+
+    def __init__(self, path=None, fmt="jsonl"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Invalid profile format '{fmt}'. Use 'jsonl' or 'chrome'.")
+        self.path = path
+        self.fmt = fmt
+        self.epoch = time.perf_counter()
+        self.buffer = []
+        self.stages = {}  # stage -> [calls, total seconds, max seconds, bytes]
+        self.rows = {}    # row -> seconds spent in its "row" span
+        self._fh = None
+        self._first = True
+        if path:
+            self._fh = open(path, "w", encoding="utf-8")
+            if fmt == "chrome":
+                self._fh.write("[\n")
+
+    @contextmanager
+    def span(self, stage, row=None):
+        event = {"stage": stage, "row": row if row is not None else getattr(_local, "row", None)}
+        start = time.perf_counter()
+        try:
+            yield event
+        finally:
+            event["start"] = start
+            event["dur"] = time.perf_counter() - start
+            event["pid"] = os.getpid()
+            self.add(event)
+
+    def add(self, event):
+        """
+        Record one finished event (also used for events received from workers).
+        """
+        if not self._fh:
+            self.buffer.append(event)
+            return
+        stats = self.stages.setdefault(event["stage"], [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += event["dur"]
+        stats[2] = max(stats[2], event["dur"])
+        stats[3] += event.get("bytes") or 0
+        if event["stage"] == ROW_STAGE and event["row"] is not None:
+            self.rows[event["row"]] = self.rows.get(event["row"], 0.0) + event["dur"]
+        self._write(event)
+
+    def _write(self, event):
+        if self.fmt == "jsonl":
+            record = dict(event, start=round(event["start"] - self.epoch, 6), dur=round(event["dur"], 6))
+            self._fh.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+            return
+        args = {"row": event["row"]}
+        if event.get("bytes") is not None:
+            args["bytes"] = event["bytes"]
+        record = {
+            "name": event["stage"], "cat": "pipeline", "ph": "X",
+            "ts": round((event["start"] - self.epoch) * 1e6, 1),
+            "dur": round(event["dur"] * 1e6, 1),
+            "pid": event["pid"], "tid": event["pid"], "args": args,
+        }
+        self._fh.write(("" if self._first else ",\n") + json.dumps(record, default=str, ensure_ascii=False))
+        self._first = False
+
+    def take_events(self):
+        events, self.buffer = self.buffer, []
+        return events
+
+    def summary(self, top=10):
+        """
+        Return the end-of-run table of the slowest stages and rows as a string.
+        """
+        lines = [f"Profile ({self.fmt}) written to {self.path}",
+                 f"{'Stage':<20}{'Calls':>8}{'Total s':>10}{'Mean ms':>10}{'Max ms':>10}{'MB':>9}"]
+        stages = sorted(self.stages.items(), key=lambda kv: kv[1][1], reverse=True)
+        for stage, (calls, total, longest, nbytes) in stages[:top]:
+            lines.append(f"{stage:<20}{calls:>8}{total:>10.2f}{total / calls * 1000:>10.1f}"
+                         f"{longest * 1000:>10.1f}{nbytes / (1024 * 1024):>9.1f}")
+        if self.rows:
+            lines.append("Slowest rows:")
+            for row, seconds in sorted(self.rows.items(), key=lambda kv: kv[1], reverse=True)[:5]:
+                lines.append(f"  {seconds * 1000:9.1f} ms  {row}")
+        return "\n".join(lines)
+
+    def close(self):
+        if self._fh:
+            if self.fmt == "chrome":
+                self._fh.write("\n]\n")
+            self._fh.close()
+            self._fh = None
+
+
+def configure(path, fmt=None):
+    """
+    Start profiling to path (format from fmt, or 'chrome' for a .json path and
+    'jsonl' otherwise). None turns profiling off. Returns the tracer.
+    """
+    global _tracer
+    if _tracer:
+        _tracer.close()
+    if not path:
+        _tracer = None
+        return None
+    if fmt is None:
+        fmt = "chrome" if path.lower().endswith(".json") else "jsonl"
+    _tracer = Tracer(path, fmt)
+    return _tracer
+
+
+def flush():
+    """
+    Write out buffered profile events; call before starting worker processes so
+    they do not inherit (and write again) unflushed data.
+    """
+    if _tracer and _tracer._fh:
+        _tracer._fh.flush()
+
+
+def start_buffer():
+    """
+    Record spans in memory (used in worker processes when the parent profiles).
+    """
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+def take_events():
+    """
+    Return and clear the buffered events of a worker process ([] when not profiling).
+    """
+    return _tracer.take_events() if _tracer else []
+
+
+def add_events(events):
+    """
+    Record events received from a worker process.
+    """
+    if _tracer:
+        for event in events:
+            _tracer.add(event)
+
+
+def span(stage, row=None):
+    """
+    Time a stage: `with span("docx_save") as ev: ...; ev["bytes"] = n`.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(stage, row)
+
+
+@contextmanager
+def row(key):
+    """
+    Attribute the spans inside the block to a row, and time the whole row.
+    """
+    previous = getattr(_local, "row", None)
+    _local.row = key
+    try:
+        with span(ROW_STAGE, key):
+            yield
+    finally:
+        _local.row = previous
+
+
+def finish():
+    """
+    Close the profile file and print the summary (no-op when not profiling).
+    """
+    global _tracer
+    if _tracer and _tracer.path:
+        _tracer.close()
+        print(_tracer.summary())
+    _tracer = None
+
+
+def add_arguments(parser):
+    """
+    Add --profile [FILE] and --profile-format to an argparse parser.
+    """
+    parser.add_argument("--profile", nargs="?", const="profile.jsonl", metavar="FILE",
+                        help="Record per-row stage timings to FILE (default profile.jsonl; "
+                             "a .json name writes Chrome trace format)")
+    parser.add_argument("--profile-format", choices=FORMATS,
+                        help="Profile format: 'jsonl' or 'chrome' (default: from the file name)")